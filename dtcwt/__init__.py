@@ -35,7 +35,7 @@ _AVAILABLE_BACKENDS = {
     'opencl': {
         'Transform1d': dtcwt.numpy.Transform1d,
         'Transform2d': dtcwt.opencl.Transform2d,
-        'Transform3d': dtcwt.numpy.Transform3d,
+        'Transform3d': dtcwt.opencl.Transform3d,
         'Pyramid': dtcwt.opencl.Pyramid,
     },
 }
@@ -45,6 +45,7 @@ def _update_from_current_backend():
     for k,v in _BACKEND_STACK[-1][1].items():
         setattr(dtcwt, k, v)
     dtcwt.backend_name = _BACKEND_STACK[-1][0]
+    dtcwt.opencl.lowlevel._set_default_queue(_BACKEND_STACK[-1][2])
 
 class _BackendGuard(object):
     def __init__(self, stack):
@@ -87,12 +88,13 @@ def preserve_backend_stack():
     """
     return _BackendGuard(_BACKEND_STACK)
 
-def push_backend(name):
+def push_backend(name, queue=None):
     """Switch backend implementation to *name*. Push the previous backend onto
     the backend stack. The previous backend may be restored via
     :py:func:`dtcwt.pop_backend`.
 
     :param name: string identifying which backend to switch to
+    :param queue: *(OpenCL only)* queue or queue pool used by transforms which are not given one
     :raises ValueError: if *name* does not correspond to a known backend
 
     *name* may take one of the following values:
@@ -101,11 +103,25 @@ def push_backend(name):
     * ``opencl``: a backend which uses OpenCL where available. See
       :py:mod:`dtcwt.opencl`.
 
+    For the ``opencl`` backend, *queue* may be a
+    :py:class:`pyopencl.CommandQueue` or a
+    :py:class:`dtcwt.opencl.lowlevel.QueuePool`. Transforms created while the
+    backend is current without an explicit queue use it. For example, to spread
+    transforms over every OpenCL device:
+
+    .. code-block:: python
+
+        from dtcwt.opencl.lowlevel import queue_pool_for_devices
+        dtcwt.push_backend('opencl', queue=queue_pool_for_devices())
+
     """
     try:
-        _BACKEND_STACK.append((name, _AVAILABLE_BACKENDS[name]))
+        backend = _AVAILABLE_BACKENDS[name]
     except KeyError:
         raise ValueError('No such backend: {0}'.format(name))
+    if queue is not None and name != 'opencl':
+        raise ValueError('Backend {0} does not accept a queue'.format(name))
+    _BACKEND_STACK.append((name, backend, queue))
     _update_from_current_backend()
 
 def pop_backend():
@@ -55,6 +55,9 @@ def colfilter(X, h):
     :param h: the filter coefficients.
     :returns Y: the filtered image.
 
+    If *X* has more than two dimensions, each column along the first axis is
+    filtered independently.
+
     .. codeauthor:: Rich Wareham <rjw57@cantab.net>, August 2013
     .. codeauthor:: Cian Shaffrey, Cambridge University, August 2000
     .. codeauthor:: Nick Kingsbury, Cambridge University, August 2000
@@ -65,7 +68,7 @@ def colfilter(X, h):
     X = asfarray(X)
     h = as_column_vector(h)
 
-    r, c = X.shape
+    r = X.shape[0]
     m = h.shape[0]
     m2 = np.fix(m*0.5)
 
@@ -79,7 +82,7 @@ def colfilter(X, h):
 
     return Y
 
-def coldfilt(X, ha, hb):
+def coldfilt(X, ha, hb, pad=0):
     """Filter the columns of image X using the two filters ha and hb =
     reverse(ha).  ha operates on the odd samples of X and hb on the even
     samples.  Both filters should be even length, and h should be approx linear
@@ -104,6 +107,12 @@ def coldfilt(X, ha, hb):
     Raises ValueError if the number of rows in X is not a multiple of 4, the
     length of ha does not match hb or the lengths of ha or hb are non-even.
 
+    As with :py:func:`colfilter`, *X* may have more than two dimensions.
+
+    If *pad* is non-zero, *X* is filtered as if it had first been extended by
+    *pad* repeats of its first and last rows. The extension is performed by
+    indexing and so no extended copy of *X* is made.
+
     .. codeauthor:: Rich Wareham <rjw57@cantab.net>, August 2013
     .. codeauthor:: Cian Shaffrey, Cambridge University, August 2000
     .. codeauthor:: Nick Kingsbury, Cambridge University, August 2000
@@ -114,7 +123,7 @@ def coldfilt(X, ha, hb):
     ha = asfarray(ha)
     hb = asfarray(hb)
 
-    r, c = X.shape
+    r = X.shape[0] + 2*pad
     if r % 4 != 0:
         raise ValueError('No. of rows in X must be a multiple of 4')
 
@@ -129,6 +138,8 @@ def coldfilt(X, ha, hb):
 
     # Set up vector for symmetric extension of X with repeated end samples.
     xe = reflect(np.arange(-m, r+m), -0.5, r-0.5)
+    if pad != 0:
+        xe = np.clip(xe - pad, 0, X.shape[0]-1)
 
     # Select odd and even samples from ha and hb. Note that due to 0-indexing
     # 'odd' and 'even' are not perhaps what you might expect them to be.
@@ -138,7 +149,7 @@ def coldfilt(X, ha, hb):
     hbe = as_column_vector(hb[1:m:2])
     t = np.arange(5, r+2*m-2, 4)
     r2 = r//2;
-    Y = np.zeros((r2,c), dtype=X.dtype)
+    Y = np.zeros((r2,) + X.shape[1:], dtype=X.dtype)
 
     if np.sum(ha*hb) > 0:
        s1 = slice(0, r2, 2)
@@ -173,7 +184,8 @@ def colifilt(X, ha, hb):
     The output is interpolated by two from the input sample rate and the
     results from the two filters, Ya and Yb, are interleaved to give Y.
     Symmetric extension with repeated end samples is used on the composite X
-    columns before each filter is applied.
+    columns before each filter is applied. As with :py:func:`colfilter`, *X*
+    may have more than two dimensions.
 
     .. codeauthor:: Rich Wareham <rjw57@cantab.net>, August 2013
     .. codeauthor:: Cian Shaffrey, Cambridge University, August 2000
@@ -185,7 +197,7 @@ def colifilt(X, ha, hb):
     ha = asfarray(ha)
     hb = asfarray(hb)
 
-    r, c = X.shape
+    r = X.shape[0]
     if r % 2 != 0:
         raise ValueError('No. of rows in X must be a multiple of 2')
 
@@ -198,7 +210,7 @@ def colifilt(X, ha, hb):
     m = ha.shape[0]
     m2 = np.fix(m*0.5)
 
-    Y = np.zeros((r*2,c), dtype=X.dtype)
+    Y = np.zeros((r*2,) + X.shape[1:], dtype=X.dtype)
     if not np.any(np.nonzero(X[:])[0]):
         return Y
 
@@ -7,19 +7,28 @@ from dtcwt.numpy.common import Pyramid
 from dtcwt.coeffs import biort as _biort, qshift as _qshift
 from dtcwt.defaults import DEFAULT_BIORT, DEFAULT_QSHIFT
 from dtcwt.utils import appropriate_complex_type_for, asfarray
+from dtcwt.utils import finer_level_size, level2_extension, remove_level2_extension
+from dtcwt.utils import SlicePool, check_pool
 
 from dtcwt.numpy.lowlevel import *
 
-import pdb
-
 class Transform3d(object):
     """
     An implementation of the 3D DT-CWT via NumPy. *biort* and *qshift* are the
     wavelets which parameterise the transform. Valid values are documented in
     :py:func:`dtcwt.coeffs.biort` and :py:func:`dtcwt.coeffs.qshift`.
 
+    The filtering at each level loops over 2D slices of the volume. Each slice
+    is independent of the others and so, if *n_workers* is greater than 1, the
+    slices are split into contiguous ranges which are filtered in parallel.
+    *pool_type* selects whether the workers are threads (``'thread'``) or
+    processes (``'process'``). In the latter case the work arrays are allocated
+    in shared memory so that workers write their results in place. Process
+    pools require Python 3.8 or later.
+
     """
-    def __init__(self, biort=DEFAULT_BIORT, qshift=DEFAULT_QSHIFT, ext_mode=4):
+    def __init__(self, biort=DEFAULT_BIORT, qshift=DEFAULT_QSHIFT, ext_mode=4,
+                 n_workers=1, pool_type='thread'):
         # Load bi-orthogonal wavelets
         try:
             self.biort = _biort(biort)
@@ -32,9 +41,14 @@ class Transform3d(object):
         except TypeError:
             self.qshift = qshift
 
+        check_pool(n_workers, pool_type)
+
         self.ext_mode = ext_mode
+        self.n_workers = n_workers
+        self.pool_type = pool_type
 
-    def forward(self, X, nlevels=3, include_scale=False, discard_level_1=False):
+    def forward(self, X, nlevels=3, include_scale=False, discard_level_1=False,
+                discard_highpasses=False):
         """Perform a *n*-level DTCWT-3D decompostion on a 3D matrix *X*.
 
         :param X: 3D real array-like object
@@ -42,6 +56,7 @@ class Transform3d(object):
         :param biort: Level 1 wavelets to use. See :py:func:`dtcwt.coeffs.biort`.
         :param qshift: Level >= 2 wavelets to use. See :py:func:`dtcwt.coeffs.qshift`.
         :param discard_level_1: True if level 1 high-pass bands are to be discarded.
+        :param discard_highpasses: True if all high-pass bands are to be discarded.
 
         :returns: a :py:class:`dtcwt.Pyramid` instance
 
@@ -74,13 +89,75 @@ class Transform3d(object):
         that :py:func:`dtcwt.Transform3d.inverse` will accept the first element
         being `None` and will treat it as being zero.
 
+        If *discard_highpasses* is True then, similarly, no highpass
+        coefficients are calculated at any level and every element of the
+        *highpasses* tuple will be `None`. Only the lowpass filters are applied
+        and so this is considerably faster if only the lowpass (or the *scales*)
+        are required. The inverse transform of such a pyramid uses only the
+        lowpass filters.
+
+        The returned pyramid has a *level_sizes* attribute giving the shape of
+        the lowpass output by each level before any extension by the next. The
+        inverse uses this in place of any discarded highpasses to remove the
+        extension and so reconstructs a volume of the original size.
+
         .. codeauthor:: Rich Wareham <rjw57@cantab.net>, Aug 2013
         .. codeauthor:: Huizhong Chen, Jan 2009
         .. codeauthor:: Nick Kingsbury, Cambridge University, July 1999.
 
         """
         X = np.atleast_3d(asfarray(X))
+        Yl, Yh, Yscale, level_sizes = self._forward(X, nlevels, include_scale, discard_level_1,
+                                                    discard_highpasses)
+
+        if include_scale:
+            pyramid = Pyramid(Yl, Yh, Yscale)
+        else:
+            pyramid = Pyramid(Yl, Yh)
+        pyramid.level_sizes = level_sizes
+        return pyramid
+
+    def forward_batch(self, X, nlevels=3, include_scale=False, discard_level_1=False,
+                      discard_highpasses=False):
+        """Perform a *n*-level DTCWT-3D decompostion on each volume in a series
+        of volumes *X* which all share the same shape.
+
+        :param X: 4D real array-like object whose first axis indexes volumes
+        :param nlevels: Number of levels of wavelet decomposition
+        :param discard_level_1: True if level 1 high-pass bands are to be discarded.
+        :param discard_highpasses: True if all high-pass bands are to be discarded.
 
+        :returns: a :py:class:`dtcwt.Pyramid` instance
+
+        The result is equivalent to calling :py:meth:`forward` on each volume
+        ``X[i,...]`` in turn and stacking the results along a new first axis.
+        Hence the lowpass has shape *(N, ...)* and each element of
+        *highpasses* has shape *(N, ..., 28)* where *N* is ``X.shape[0]``.
+
+        Rather than looping over the volumes, all of them are filtered together
+        by the same calls to the low-level filtering routines. Shape checks and
+        work area allocation happen once per level for the whole series.
+
+        """
+        X = asfarray(X)
+        if len(X.shape) != 4:
+            raise ValueError('Input must be a 4D array of volumes')
+
+        # Move the volume index to be the last axis. The low-level filters
+        # carry all trailing axes along with each column being filtered.
+        Yl, Yh, Yscale, level_sizes = self._forward(np.moveaxis(X, 0, -1), nlevels, include_scale,
+                                                    discard_level_1, discard_highpasses)
+
+        Yl = _batch_first(Yl)
+        Yh = tuple(_batch_first(x) for x in Yh)
+        if include_scale:
+            pyramid = Pyramid(Yl, Yh, tuple(_batch_first(x) for x in Yscale))
+        else:
+            pyramid = Pyramid(Yl, Yh)
+        pyramid.level_sizes = level_sizes
+        return pyramid
+
+    def _forward(self, X, nlevels, include_scale, discard_level_1, discard_highpasses):
         # If biort has 6 elements instead of 4, then it's a modified
         # rotationally symmetric wavelet
         # FIXME: there's probably a nicer way to do this
@@ -106,29 +183,32 @@ class Transform3d(object):
 
         Yl = X
         Yh = [None,] * nlevels
+        level_sizes = [None,] * nlevels
 
+        Yscale = None
         if include_scale:
             # this is only required if the user specifies a third output component.
             Yscale = [None,] * nlevels
 
-        #pdb.set_trace()
-        # level is 0-indexed
-        for level in xrange(nlevels):
-            # Transform
-            if level == 0 and discard_level_1:
-                Yl = _level1_xfm_no_highpass(Yl, h0o, h1o, self.ext_mode)
-            elif level == 0 and not discard_level_1:
-                Yl, Yh[level] = _level1_xfm(Yl, h0o, h1o, self.ext_mode)
-            else:
-                Yl, Yh[level] = _level2_xfm(Yl, h0a, h0b, h1a, h1b, self.ext_mode)
-            if include_scale:
-                Yscale[level] = Yl.copy()
+        with SlicePool(self.n_workers, self.pool_type) as pool:
+            # level is 0-indexed
+            for level in xrange(nlevels):
+                # Transform
+                if level == 0 and (discard_level_1 or discard_highpasses):
+                    Yl = _level1_xfm_no_highpass(Yl, h0o, h1o, self.ext_mode, pool)
+                elif level == 0:
+                    Yl, Yh[level] = _level1_xfm(Yl, h0o, h1o, self.ext_mode, pool)
+                elif discard_highpasses:
+                    Yl = _level2_xfm_no_highpass(Yl, h0a, h0b, self.ext_mode, pool)
+                else:
+                    Yl, Yh[level] = _level2_xfm(Yl, h0a, h0b, h1a, h1b, self.ext_mode, pool)
+                level_sizes[level] = Yl.shape[:3]
+                if include_scale:
+                    Yscale[level] = Yl.copy()
 
-                #Yh[nlevels+1]=1 #to throw an error for debugging in nose
-        if include_scale:
-            return Pyramid(Yl, tuple(Yh), tuple(Yscale))
-        else:
-            return Pyramid(Yl, tuple(Yh))
+            Yl = pool.detach(Yl)
+
+        return Yl, tuple(Yh), tuple(Yscale) if include_scale else None, tuple(level_sizes)
 
     def inverse(self, pyramid):
         """Perform an *n*-level dual-tree complex wavelet (DTCWT) 3D
@@ -162,9 +242,25 @@ class Transform3d(object):
         .. codeauthor:: Nick Kingsbury, Cambridge University, July 1999.
 
         """
-        Yl = pyramid.lowpass
-        Yh = pyramid.highpasses
+        return self._inverse(pyramid.lowpass, pyramid.highpasses, getattr(pyramid, 'level_sizes', None))
+
+    def inverse_batch(self, pyramid):
+        """Perform an *n*-level dual-tree complex wavelet (DTCWT) 3D
+        reconstruction of each volume in a series.
+
+        :param pyramid: A :py:class:`dtcwt.Pyramid`-like instance as returned by :py:meth:`forward_batch`.
+
+        :returns: Reconstructed real 4D array whose first axis indexes volumes.
 
+        This is the inverse of :py:meth:`forward_batch`. As with the forward
+        transform, all volumes are reconstructed together.
+
+        """
+        Yl = np.moveaxis(pyramid.lowpass, 0, -1)
+        Yh = tuple(np.moveaxis(x, 0, -1) if x is not None else None for x in pyramid.highpasses)
+        return _batch_first(self._inverse(Yl, Yh, getattr(pyramid, 'level_sizes', None)))
+
+    def _inverse(self, Yl, Yh, level_sizes=None):
         # Try to load coefficients if biort is a string parameter
         if len(self.biort) == 4:
             h0o, g0o, h1o, g1o = self.biort
@@ -186,44 +282,239 @@ class Transform3d(object):
         X = Yl
 
         nlevels = len(Yh)
-        # level is 0-indexed but interpreted starting from the *last* level
-        for level in xrange(nlevels):
-            # Transform
-            if level == nlevels-1: # non-obviously this is the 'first' level
-                if Yh[-level-1] is None:
-                    Yl = _level1_ifm_no_highpass(Yl, g0o, g1o)
+        with SlicePool(self.n_workers, self.pool_type) as pool:
+            # level is 0-indexed but interpreted starting from the *last* level
+            for level in xrange(nlevels):
+                # Transform
+                if level == nlevels-1: # non-obviously this is the 'first' level
+                    if Yh[-level-1] is None:
+                        Yl = _level1_ifm_no_highpass(Yl, g0o, g1o, pool)
+                    else:
+                        Yl = _level1_ifm(Yl, Yh[-level-1], g0o, g1o, pool)
                 else:
-                    Yl = _level1_ifm(Yl, Yh[-level-1], g0o, g1o)
-            else:
-                # Gracefully handle the Yh[0] is None case.
-                if Yh[-level-2] is not None:
-                    prev_shape = Yh[-level-2].shape
+                    prev_shape = finer_level_size(Yl, Yh, level_sizes, level)
+
+                    if Yh[-level-1] is None:
+                        Yl = _level2_ifm_no_highpass(Yl, g0a, g0b, self.ext_mode, prev_shape, pool)
+                    else:
+                        Yl = _level2_ifm(Yl, Yh[-level-1], g0a, g0b, g1a, g1b, self.ext_mode, prev_shape, pool)
+
+            Yl = pool.detach(Yl)
+
+        return Yl
+
+    def forward_roi(self, X, roi, nlevels=3, discard_level_1=False):
+        """Compute the coefficients of a *n*-level DTCWT-3D decomposition of
+        *X* which are required to reconstruct a region of interest.
+
+        :param X: 3D real array-like object
+        :param roi: bounding box of the region of interest. See below.
+        :param nlevels: Number of levels of wavelet decomposition
+        :param discard_level_1: True if level 1 high-pass bands are to be discarded.
+
+        :returns: a :py:class:`dtcwt.Pyramid` instance
+
+        *roi* is a sequence of three slices, one for each axis of *X*, or of
+        three *(start, stop)* pairs. Only the part of *X* within the region and
+        a surrounding halo, the size of which depends on the wavelets and
+        *nlevels*, is transformed.
+
+        The lowpass and highpasses of the result are sub-arrays of those which
+        would be returned by :py:meth:`forward`. The location of each within
+        the full transform is given by :py:meth:`roi_coefficient_slices`. The
+        region of *X* may be reconstructed exactly from them via
+        :py:meth:`inverse_roi`.
+
+        Level 1 filters must be of odd length.
+
+        """
+        X = np.atleast_3d(asfarray(X))
+        h0o, g0o, h1o, g1o = self.biort[:4]
+        h0a, h0b, g0a, g0b, h1a, h1b, g1a, g1b = self.qshift[:8]
+
+        plans = self._roi_plans(X.shape, roi, nlevels)
+        Yh = [None,] * nlevels
+
+        with SlicePool(self.n_workers, self.pool_type) as pool:
+            # Yl is the lowpass of the previous level. Y_start is the index
+            # within the full transform of its first element along each axis.
+            Yl, Yl_start = X, (0, 0, 0)
+
+            # level is 0-indexed
+            for level in xrange(nlevels):
+                starts, stops = zip(*(plan.crops[level] for plan in plans))
+                if level == 0:
+                    crop = Yl[tuple(slice(a, b) for a, b in zip(starts, stops))]
+                    if discard_level_1:
+                        Yl = _level1_xfm_no_highpass(crop, h0o, h1o, 4, pool)
+                    else:
+                        Yl, Yh[level] = _level1_xfm(crop, h0o, h1o, 4, pool)
+                    Yl_start = starts
                 else:
-                    prev_shape = np.array(Yh[-level-1].shape) * 2
+                    # The crop is given in the co-ordinates of the full
+                    # transform's input to this level *after* extension.
+                    # Perform any extension ourselves.
+                    pads = [plan.pads[level] for plan in plans]
+                    sizes = [plan.sizes[level-1] for plan in plans]
+                    crop = Yl[tuple(
+                        slice(max(a-p, 0)-o, min(b-p, n)-o)
+                        for a, b, p, n, o in zip(starts, stops, pads, sizes, Yl_start)
+                    )]
+                    crop = np.pad(crop, tuple(
+                        (max(p-a, 0), max(b-p-n, 0))
+                        for a, b, p, n in zip(starts, stops, pads, sizes)
+                    ), mode='edge')
+
+                    # Crop sizes are multiples of 4 and so no further
+                    # extension happens for ext_mode == 4.
+                    Yl, Yh[level] = _level2_xfm(crop, h0a, h0b, h1a, h1b, 4, pool)
+                    Yl_start = tuple(a>>1 for a in starts)
+
+                # Extract the requested highpass region
+                if Yh[level] is not None:
+                    Yh[level] = Yh[level][tuple(
+                        slice(a-(o>>1), b-(o>>1))
+                        for (a, b), o in zip((plan.highpasses[level] for plan in plans), Yl_start)
+                    )].copy()
+
+            Yl = Yl[tuple(
+                slice(a-o, b-o)
+                for (a, b), o in zip((plan.lowpasses[-1] for plan in plans), Yl_start)
+            )].copy()
+
+        return Pyramid(Yl, tuple(Yh))
+
+    def inverse_roi(self, pyramid, shape, roi):
+        """Reconstruct a region of interest from coefficients computed by
+        :py:meth:`forward_roi`.
+
+        :param pyramid: The :py:class:`dtcwt.Pyramid`-like instance returned by :py:meth:`forward_roi`.
+        :param shape: Shape of the original 3D input.
+        :param roi: The region of interest passed to :py:meth:`forward_roi`.
+
+        :returns: Reconstructed real 3D array covering the region of interest.
+
+        The coefficients may be modified before reconstruction. Coefficients
+        outside of those returned by :py:meth:`forward_roi` are treated as
+        unknown rather than zero and do not affect the result.
 
-                Yl = _level2_ifm(Yl, Yh[-level-1], g0a, g0b, g1a, g1b, self.ext_mode, prev_shape)
+        """
+        h0o, g0o, h1o, g1o = self.biort[:4]
+        h0a, h0b, g0a, g0b, h1a, h1b, g1a, g1b = self.qshift[:8]
+
+        Yl = pyramid.lowpass
+        Yh = pyramid.highpasses
+        nlevels = len(Yh)
+        plans = self._roi_plans(shape, roi, nlevels)
+
+        with SlicePool(self.n_workers, self.pool_type) as pool:
+            Yl_start = tuple(plan.lowpasses[-1][0] for plan in plans)
+
+            # level is 0-indexed
+            for level in xrange(nlevels-1, -1, -1):
+                # Extract the part of the lowpass required for this level
+                Yl = Yl[tuple(
+                    slice(a-o, b-o)
+                    for (a, b), o in zip((plan.lowpasses[level] for plan in plans), Yl_start)
+                )]
+                starts = tuple(plan.lowpasses[level][0] for plan in plans)
+
+                if level == 0:
+                    if Yh[level] is None:
+                        Yl = _level1_ifm_no_highpass(Yl, g0o, g1o, pool)
+                    else:
+                        Yl = _level1_ifm(Yl, Yh[level], g0o, g1o, pool)
+                    Yl_start = starts
+                else:
+                    # No extension is removed by _level2_ifm itself. Remove
+                    # any which the full transform would have added.
+                    Yl = _level2_ifm(Yl, Yh[level], g0a, g0b, g1a, g1b, 4,
+                                     np.asarray(Yh[level].shape[:3]) * 2, pool)
+                    pads = [plan.pads[level] for plan in plans]
+                    sizes = [plan.sizes[level-1] for plan in plans]
+                    Yl = Yl[tuple(
+                        slice(max(p-2*a, 0), Yl.shape[axis]-max(2*a+Yl.shape[axis]-p-n, 0))
+                        for axis, (a, p, n) in enumerate(zip(starts, pads, sizes))
+                    )]
+                    Yl_start = tuple(max(2*a-p, 0) for a, p in zip(starts, pads))
+
+            Yl = pool.detach(Yl[tuple(
+                slice(plan.start-o, plan.stop-o) for plan, o in zip(plans, Yl_start)
+            )])
 
         return Yl
 
-def _level1_xfm(X, h0o, h1o, ext_mode):
+    def roi_coefficient_slices(self, shape, roi, nlevels=3):
+        """Return the location of the coefficients computed by
+        :py:meth:`forward_roi` within those computed by :py:meth:`forward`.
+
+        :param shape: Shape of the 3D input.
+        :param roi: The region of interest. See :py:meth:`forward_roi`.
+        :param nlevels: Number of levels of wavelet decomposition
+
+        :returns: a pair *(lowpass, highpasses)*. *lowpass* is a tuple of
+            slices into the lowpass and *highpasses* is a tuple, one element
+            per level, of tuples of slices into the highpasses.
+
+        """
+        plans = self._roi_plans(shape, roi, nlevels)
+        lowpass = tuple(slice(*plan.lowpasses[-1]) for plan in plans)
+        highpasses = tuple(
+            tuple(slice(*plan.highpasses[level]) for plan in plans)
+            for level in xrange(nlevels)
+        )
+        return lowpass, highpasses
+
+    def _roi_plans(self, shape, roi, nlevels):
+        if self.ext_mode != 4 and self.ext_mode != 8:
+            raise ValueError('ext_mode must be one of 4 or 8')
+        if self.biort[0].shape[0] % 2 == 0:
+            raise ValueError('Region of interest transforms require odd length level 1 filters')
+
+        shape = tuple(shape)
+        if len(shape) != 3 or len(roi) != 3:
+            raise ValueError('Input shape and region of interest must be 3D')
+        if self.ext_mode == 4 and np.any(np.fmod(shape, 2) != 0):
+            raise ValueError('Input shape should be a multiple of 2 in each direction when self.ext_mode == 4')
+        elif self.ext_mode == 8 and np.any(np.fmod(shape, 4) != 0):
+            raise ValueError('Input shape should be a multiple of 4 in each direction when self.ext_mode == 8')
+
+        # Half-widths of the filters' support with a little to spare
+        biort_halo = max(h.shape[0] for h in self.biort) // 2 + 1
+        qshift_halo = max(h.shape[0] for h in self.qshift) // 2 + 2
+
+        plans = []
+        for n, r in zip(shape, roi):
+            if not isinstance(r, slice):
+                r = slice(*r)
+            start, stop, step = r.indices(n)
+            if step != 1 or stop <= start:
+                raise ValueError('Region of interest must be a non-empty contiguous region')
+            plans.append(_ROIAxisPlan(n, start, stop, nlevels, self.ext_mode, biort_halo, qshift_halo))
+        return plans
+
+def _level1_xfm(X, h0o, h1o, ext_mode, pool=None):
     """Perform level 1 of the 3d transform.
 
     """
+    pool = pool or _SERIAL_POOL
+    h0o, h1o = pool.readonly(h0o), pool.readonly(h1o)
+
     # Check shape of input according to ext_mode. Note that shape of X is
     # double original input in each direction.
-    if ext_mode == 4 and np.any(np.fmod(X.shape, 2) != 0):
+    if ext_mode == 4 and np.any(np.fmod(X.shape[:3], 2) != 0):
         raise ValueError('Input shape should be a multiple of 2 in each direction when self.ext_mode == 4')
-    elif ext_mode == 8 and np.any(np.fmod(X.shape, 4) != 0):
+    elif ext_mode == 8 and np.any(np.fmod(X.shape[:3], 4) != 0):
         raise ValueError('Input shape should be a multiple of 4 in each direction when self.ext_mode == 8')
 
     # Create work area
-    work_shape = np.asanyarray(X.shape) * 2
+    work_shape = np.asanyarray(X.shape[:3]) * 2
 
     # We need one extra row per octant if filter length is even
     if h0o.shape[0] % 2 == 0:
         work_shape += 2
 
-    work = np.zeros(work_shape, dtype=X.dtype)
+    work = pool.zeros(tuple(work_shape) + X.shape[3:], dtype=X.dtype)
 
     # Form some useful slices
     s0a = slice(None, work.shape[0] >> 1)
@@ -253,90 +544,100 @@ def _level1_xfm(X, h0o, h1o, ext_mode):
         work[s0a, s1a, s2a] = X
 
     # Loop over 2nd dimension extracting 2D slice from first and 3rd dimensions
-    for f in xrange(work.shape[1] >> 1):
+    pool.map_slices(_level1_xfm_dim3, work.shape[1] >> 1,
+                    work, h0o, h1o, s0a, s2a, s2b, x2a)
+
+    # Loop over 3rd dimension extracting 2D slice from first and 2nd dimensions
+    pool.map_slices(_level1_xfm_dims12, work.shape[2],
+                    work, h0o, h1o, s0a, s0b, x0a, x1a)
+
+    # Return appropriate slices of output
+    return (
+        work[s0a, s1a, s2a],                # LLL
+        _cube2c_octants((
+            work[x0a, x1b, x2a],    # HLL
+            work[x0b, x1a, x2a],    # LHL
+            work[x0b, x1b, x2a],    # HHL
+            work[x0a, x1a, x2b],    # LLH
+            work[x0a, x1b, x2b],    # HLH
+            work[x0b, x1a, x2b],    # LHH
+            work[x0b, x1b, x2b],    # HHH
+            ))
+        )
+
+def _level1_xfm_dim3(start, stop, work, h0o, h1o, s0a, s2a, s2b, x2a):
+    for f in xrange(start, stop):
         # extract slice
-        y = work[s0a, f, x2a].T
+        y = work[s0a, f, x2a].swapaxes(0, 1)
         # Do odd top-level filters on 3rd dim. The order here is important
         # since the second filtering will modify the elements of y as well
         # since y is merely a view onto work.
-        work[s0a, f, s2b] = colfilter(y, h1o).T
-        work[s0a, f, s2a] = colfilter(y, h0o).T
+        work[s0a, f, s2b] = colfilter(y, h1o).swapaxes(0, 1)
+        work[s0a, f, s2a] = colfilter(y, h0o).swapaxes(0, 1)
 
-    # Loop over 3rd dimension extracting 2D slice from first and 2nd dimensions
-    for f in xrange(work.shape[2]):
+def _level1_xfm_dims12(start, stop, work, h0o, h1o, s0a, s0b, x0a, x1a):
+    for f in xrange(start, stop):
         # Do odd top-level filters on rows.
-        y1 = work[x0a, x1a, f].T
-        y2 = np.vstack((colfilter(y1, h0o), colfilter(y1, h1o))).T
+        y1 = work[x0a, x1a, f].swapaxes(0, 1)
+        y2 = np.vstack((colfilter(y1, h0o), colfilter(y1, h1o))).swapaxes(0, 1)
 
         # Do odd top-level filters on columns.
         work[s0a, :, f] = colfilter(y2, h0o)
         work[s0b, :, f] = colfilter(y2, h1o)
-        #if f==2:
-        #work[:,:,work.shape[2]+1]=1 #to throw an error so we can inspect y in the unit test
 
-    # Return appropriate slices of output
-    return (
-        work[s0a, s1a, s2a],                # LLL
-        np.concatenate((
-            cube2c(work[x0a, x1b, x2a]),    # HLL
-            cube2c(work[x0b, x1a, x2a]),    # LHL
-            cube2c(work[x0b, x1b, x2a]),    # HHL
-            cube2c(work[x0a, x1a, x2b]),    # LLH
-            cube2c(work[x0a, x1b, x2b]),    # HLH
-            cube2c(work[x0b, x1a, x2b]),    # LHH
-            cube2c(work[x0b, x1b, x2b]),    # HHH
-            ), axis=3)
-        )
-
-def _level1_xfm_no_highpass(X, h0o, h1o, ext_mode):
+def _level1_xfm_no_highpass(X, h0o, h1o, ext_mode, pool=None):
     """Perform level 1 of the 3d transform discarding highpass subbands.
 
     """
+    pool = pool or _SERIAL_POOL
+    h0o, h1o = pool.readonly(h0o), pool.readonly(h1o)
+
     # Check shape of input according to ext_mode. Note that shape of X is
     # double original input in each direction.
-    if ext_mode == 4 and np.any(np.fmod(X.shape, 2) != 0):
+    if ext_mode == 4 and np.any(np.fmod(X.shape[:3], 2) != 0):
         raise ValueError('Input shape should be a multiple of 2 in each direction when self.ext_mode == 4')
-    elif ext_mode == 8 and np.any(np.fmod(X.shape, 4) != 0):
+    elif ext_mode == 8 and np.any(np.fmod(X.shape[:3], 4) != 0):
         raise ValueError('Input shape should be a multiple of 4 in each direction when self.ext_mode == 8')
 
-    out = np.zeros_like(X)
+    X = pool.asshared(X)
+    out = pool.zeros(X.shape, dtype=X.dtype)
 
     # Loop over 2nd dimension extracting 2D slice from first and 3rd dimensions
-    for f in xrange(X.shape[1]):
-        # extract slice
-        y = X[:, f, :].T
-        out[:, f, :] = colfilter(y, h0o).T
+    pool.map_slices(_level1_xfm_no_highpass_dim3, X.shape[1], X, out, h0o)
 
-  # Loop over 3rd dimension extracting 2D slice from first and 2nd dimensions
-    for f in xrange(X.shape[2]):
-        y = colfilter(out[:, :, f].T, h0o).T
-        out[:, :, f] = colfilter(y, h0o)
+    # Loop over 3rd dimension extracting 2D slice from first and 2nd dimensions
+    pool.map_slices(_level1_xfm_no_highpass_dims12, X.shape[2], out, h0o)
 
     return out
 
-def _level2_xfm(X, h0a, h0b, h1a, h1b, ext_mode):
-    """Perform level 2 or greater of the 3d transform.
+def _level1_xfm_no_highpass_dim3(start, stop, X, out, h0o):
+    for f in xrange(start, stop):
+        # extract slice
+        y = X[:, f, :].swapaxes(0, 1)
+        out[:, f, :] = colfilter(y, h0o).swapaxes(0, 1)
 
-    """
+def _level1_xfm_no_highpass_dims12(start, stop, out, h0o):
+    for f in xrange(start, stop):
+        y = colfilter(out[:, :, f].swapaxes(0, 1), h0o).swapaxes(0, 1)
+        out[:, :, f] = colfilter(y, h0o)
 
-    if ext_mode == 4:
-        if X.shape[0] % 4 != 0:
-            X = np.concatenate((X[[0],:,:], X, X[[-1],:,:]), 0)
-        if X.shape[1] % 4 != 0:
-            X = np.concatenate((X[:,[0],:], X, X[:,[-1],:]), 1)
-        if X.shape[2] % 4 != 0:
-            X = np.concatenate((X[:,:,[0]], X, X[:,:,[-1]]), 2)
-    elif ext_mode == 8:
-        if X.shape[0] % 8 != 0:
-            X = np.concatenate((X[(0,0),:,:], X, X[(-1,-1),:,:]), 0)
-        if X.shape[1] % 8 != 0:
-            X = np.concatenate((X[:,(0,0),:], X, X[:,(-1,-1),:]), 1)
-        if X.shape[2] % 8 != 0:
-            X = np.concatenate((X[:,:,(0,0)], X, X[:,:,(-1,-1)]), 2)
+def _level2_xfm(X, h0a, h0b, h1a, h1b, ext_mode, pool=None):
+    """Perform level 2 or greater of the 3d transform.
 
-    # Create work area
-    work_shape = np.asanyarray(X.shape)
-    work = np.zeros(work_shape, dtype=X.dtype)
+    """
+    pool = pool or _SERIAL_POOL
+    h0a, h0b, h1a, h1b = pool.readonly(h0a), pool.readonly(h0b), pool.readonly(h1a), pool.readonly(h1b)
+
+    # Any extension of the input is performed virtually by the filtering of the
+    # 3rd dimension which reads from X and writes to the work area. If there
+    # is no extension, filter in place.
+    pads = level2_extension(X.shape, ext_mode)
+    X = pool.asshared(X)
+    if any(pads):
+        work_shape = np.asanyarray(X.shape[:3]) + 2 * np.asanyarray(pads)
+        work = pool.zeros(tuple(work_shape) + X.shape[3:], dtype=X.dtype)
+    else:
+        work = X
 
     # Form some useful slices
     s0a = slice(None, work.shape[0] >> 1)
@@ -346,51 +647,104 @@ def _level2_xfm(X, h0a, h0b, h1a, h1b, ext_mode):
     s1b = slice(work.shape[1] >> 1, None)
     s2b = slice(work.shape[2] >> 1, None)
 
-    # Assign input
-    work = X
-
     # Loop over 2nd dimension extracting 2D slice from first and 3rd dimensions
-    for f in xrange(work.shape[1]):
-        # extract slice (copy required because we overwrite the work array)
-        y = work[:, f, :].T.copy()
+    pool.map_slices(_level2_xfm_dim3, work.shape[1],
+                    X, work, h0a, h0b, h1a, h1b, s2a, s2b, pads)
+
+    # Loop over 3rd dimension extracting 2D slice from first and 2nd dimensions
+    pool.map_slices(_level2_xfm_dims12, work.shape[2],
+                    work, h0a, h0b, h1a, h1b, s0a, s0b)
+
+    # Return appropriate slices of output
+    return (
+        work[s0a, s1a, s2a],                # LLL
+        _cube2c_octants((
+            work[s0a, s1b, s2a],    # HLL
+            work[s0b, s1a, s2a],    # LHL
+            work[s0b, s1b, s2a],    # HHL
+            work[s0a, s1a, s2b],    # LLH
+            work[s0a, s1b, s2b],    # HLH
+            work[s0b, s1a, s2b],    # LHH
+            work[s0b, s1b, s2b],    # HHH
+            ))
+        )
+
+def _extended_indices(n, size, pad):
+    """Return the indices into an array with *size* rows of each of the *n*
+    rows of that array extended by *pad* repeats of its first and last rows.
+
+    """
+    return np.clip(np.arange(n) - pad, 0, size - 1)
+
+def _level2_xfm_no_highpass(X, h0a, h0b, ext_mode, pool=None):
+    """Perform level 2 or greater of the 3d transform discarding highpass
+    subbands.
+
+    """
+    pool = pool or _SERIAL_POOL
+    h0a, h0b = pool.readonly(h0a), pool.readonly(h0b)
+
+    # Only the LLL octant is computed and so only the h0 filters need be
+    # applied. Decimate along the 3rd dimension and then along the 1st and 2nd.
+    # As in _level2_xfm, any extension happens while filtering the 3rd.
+    pads = level2_extension(X.shape, ext_mode)
+    X = pool.asshared(X)
+    shape = np.asanyarray(X.shape[:3]) + 2 * np.asanyarray(pads)
+    work = pool.zeros((shape[0], shape[1], shape[2]>>1) + X.shape[3:], dtype=X.dtype)
+    out = pool.zeros(tuple(shape>>1) + X.shape[3:], dtype=X.dtype)
+
+    pool.map_slices(_level2_xfm_no_highpass_dim3, shape[1], X, work, h0a, h0b, pads)
+    pool.map_slices(_level2_xfm_no_highpass_dims12, shape[2]>>1, work, out, h0a, h0b)
+
+    return out
+
+def _level2_xfm_no_highpass_dim3(start, stop, X, work, h0a, h0b, pads):
+    rows = _extended_indices(work.shape[0], X.shape[0], pads[0])
+    cols = _extended_indices(work.shape[1], X.shape[1], pads[1])
+    for f in xrange(start, stop):
+        y = X[rows, cols[f], :].swapaxes(0, 1)
+        work[:, f, :] = coldfilt(y, h0b, h0a, pads[2]).swapaxes(0, 1)
+
+def _level2_xfm_no_highpass_dims12(start, stop, work, out, h0a, h0b):
+    for f in xrange(start, stop):
+        y = coldfilt(work[:, :, f].swapaxes(0, 1), h0b, h0a)
+        out[:, :, f] = coldfilt(y.swapaxes(0, 1), h0b, h0a)
+
+def _level2_xfm_dim3(start, stop, X, work, h0a, h0b, h1a, h1b, s2a, s2b, pads):
+    # Rows of X corresponding to those of the (extended) work area
+    rows = _extended_indices(work.shape[0], X.shape[0], pads[0])
+    cols = _extended_indices(work.shape[1], X.shape[1], pads[1])
+    for f in xrange(start, stop):
+        # extract slice of the extended input (indexing by rows copies, which
+        # is required because X may be the work area)
+        y = X[rows, cols[f], :].swapaxes(0, 1)
 
         # Do even Qshift filters on 3rd dim.
-        work[:, f, s2b] = coldfilt(y, h1b, h1a).T
-        work[:, f, s2a] = coldfilt(y, h0b, h0a).T
+        work[:, f, s2b] = coldfilt(y, h1b, h1a, pads[2]).swapaxes(0, 1)
+        work[:, f, s2a] = coldfilt(y, h0b, h0a, pads[2]).swapaxes(0, 1)
 
-    # Loop over 3rd dimension extracting 2D slice from first and 2nd dimensions
-    for f in xrange(work.shape[2]):
+def _level2_xfm_dims12(start, stop, work, h0a, h0b, h1a, h1b, s0a, s0b):
+    for f in xrange(start, stop):
         # Do even Qshift filters on rows.
-        y1 = work[:, :, f].T
-        y2 = np.vstack((coldfilt(y1, h0b, h0a), coldfilt(y1, h1b, h1a))).T
+        y1 = work[:, :, f].swapaxes(0, 1)
+        y2 = np.vstack((coldfilt(y1, h0b, h0a), coldfilt(y1, h1b, h1a))).swapaxes(0, 1)
 
         # Do even Qshift filters on columns.
         work[s0a, :, f] = coldfilt(y2, h0b, h0a)
         work[s0b, :, f] = coldfilt(y2, h1b, h1a)
 
-    # Return appropriate slices of output
-    return (
-        work[s0a, s1a, s2a],                # LLL
-        np.concatenate((
-            cube2c(work[s0a, s1b, s2a]),    # HLL
-            cube2c(work[s0b, s1a, s2a]),    # LHL
-            cube2c(work[s0b, s1b, s2a]),    # HHL
-            cube2c(work[s0a, s1a, s2b]),    # LLH
-            cube2c(work[s0a, s1b, s2b]),    # HLH
-            cube2c(work[s0b, s1a, s2b]),    # LHH
-            cube2c(work[s0b, s1b, s2b]),    # HHH
-            ), axis=3)
-        )
-
-def _level1_ifm(Yl, Yh, g0o, g1o):
+def _level1_ifm(Yl, Yh, g0o, g1o, pool=None):
     """
     Perform level 1 of the inverse 3d transform.
     """
+    pool = pool or _SERIAL_POOL
+    g0o, g1o = pool.readonly(g0o), pool.readonly(g1o)
+
     # Create work area
-    work = np.zeros(np.asanyarray(Yl.shape) * 2, dtype=Yl.dtype)
+    work = pool.zeros(tuple(np.asanyarray(Yl.shape[:3]) * 2) + Yl.shape[3:], dtype=Yl.dtype)
 
     # Work out shape of output
-    Xshape = np.asanyarray(work.shape) >> 1
+    Xshape = np.asanyarray(work.shape[:3]) >> 1
     if g0o.shape[0] % 2 == 0:
         # if we have an even length filter, we need to shrink the output by 1
         # to compensate for the addition of an extra row/column/slice in
@@ -414,55 +768,75 @@ def _level1_ifm(Yl, Yh, g0o, g1o):
 
     # Assign regions of work area
     work[s0a, s1a, s2a] = Yl
-    work[x0a, x1b, x2a] = c2cube(Yh[:,:,:, 0:4 ])
-    work[x0b, x1a, x2a] = c2cube(Yh[:,:,:, 4:8 ])
-    work[x0b, x1b, x2a] = c2cube(Yh[:,:,:, 8:12])
-    work[x0a, x1a, x2b] = c2cube(Yh[:,:,:,12:16])
-    work[x0a, x1b, x2b] = c2cube(Yh[:,:,:,16:20])
-    work[x0b, x1a, x2b] = c2cube(Yh[:,:,:,20:24])
-    work[x0b, x1b, x2b] = c2cube(Yh[:,:,:,24:28])
-
-    for f in xrange(work.shape[2]):
-        # Do odd top-level filters on rows.
-        y = colfilter(work[:, x1a, f].T, g0o) + colfilter(work[:, x1b, f].T, g1o)
+    c2cube(Yh[:,:,:, 0:4 ], out=work[x0a, x1b, x2a])
+    c2cube(Yh[:,:,:, 4:8 ], out=work[x0b, x1a, x2a])
+    c2cube(Yh[:,:,:, 8:12], out=work[x0b, x1b, x2a])
+    c2cube(Yh[:,:,:,12:16], out=work[x0a, x1a, x2b])
+    c2cube(Yh[:,:,:,16:20], out=work[x0a, x1b, x2b])
+    c2cube(Yh[:,:,:,20:24], out=work[x0b, x1a, x2b])
+    c2cube(Yh[:,:,:,24:28], out=work[x0b, x1b, x2b])
 
-        # Do odd top-level filters on columns.
-        work[s0a, s1a, f] = colfilter(y[:, x0a].T, g0o) + colfilter(y[:, x0b].T, g1o)
+    pool.map_slices(_level1_ifm_dims12, work.shape[2],
+                    work, g0o, g1o, s0a, s1a, x0a, x0b, x1a, x1b)
 
-    for f in xrange(work.shape[1]>>1):
-        # Do odd top-level filters on 3rd dim.
-        y = work[s0a, f, :].T
-        work[s0a, f, s2a] = (colfilter(y[x2a, :], g0o) + colfilter(y[x2b, :], g1o)).T
+    pool.map_slices(_level1_ifm_dim3, work.shape[1]>>1,
+                    work, g0o, g1o, s0a, s2a, x2a, x2b)
 
     if g0o.shape[0] % 2 == 0:
         return work[1:(work.shape[0]>>1), 1:(work.shape[1]>>1), 1:(work.shape[2]>>1)]
     else:
         return work[s0a, s1a, s2a]
 
-def _level1_ifm_no_highpass(Yl, g0o, g1o):
+def _level1_ifm_dims12(start, stop, work, g0o, g1o, s0a, s1a, x0a, x0b, x1a, x1b):
+    for f in xrange(start, stop):
+        # Do odd top-level filters on rows.
+        y = colfilter(work[:, x1a, f].swapaxes(0, 1), g0o) + colfilter(work[:, x1b, f].swapaxes(0, 1), g1o)
+
+        # Do odd top-level filters on columns.
+        work[s0a, s1a, f] = colfilter(y[:, x0a].swapaxes(0, 1), g0o) + colfilter(y[:, x0b].swapaxes(0, 1), g1o)
+
+def _level1_ifm_dim3(start, stop, work, g0o, g1o, s0a, s2a, x2a, x2b):
+    for f in xrange(start, stop):
+        # Do odd top-level filters on 3rd dim.
+        y = work[s0a, f, :].swapaxes(0, 1)
+        work[s0a, f, s2a] = (colfilter(y[x2a, :], g0o) + colfilter(y[x2b, :], g1o)).swapaxes(0, 1)
+
+def _level1_ifm_no_highpass(Yl, g0o, g1o, pool=None):
     """Perform level 1 of the inverse 3d transform assuming highpass
     coefficients are zero.
 
     """
-    # Create work area
-    output = np.zeros_like(Yl)
+    pool = pool or _SERIAL_POOL
+    g0o, g1o = pool.readonly(g0o), pool.readonly(g1o)
 
-    for f in xrange(Yl.shape[2]):
-        y = colfilter(Yl[:, :, f].T, g0o)
-        output[:, :, f] = colfilter(y.T, g0o)
+    # Create work area
+    Yl = pool.asshared(Yl)
+    output = pool.zeros(Yl.shape, dtype=Yl.dtype)
 
-    for f in xrange(Yl.shape[1]):
-        y = output[:, f, :].T.copy()
-        output[:, f, :] = colfilter(y, g0o)
+    pool.map_slices(_level1_ifm_no_highpass_dims12, Yl.shape[2], Yl, output, g0o)
+    pool.map_slices(_level1_ifm_no_highpass_dim3, Yl.shape[1], output, g0o)
 
     return output
 
-def _level2_ifm(Yl, Yh, g0a, g0b, g1a, g1b, ext_mode, prev_level_size):
+def _level1_ifm_no_highpass_dims12(start, stop, Yl, output, g0o):
+    for f in xrange(start, stop):
+        y = colfilter(Yl[:, :, f].swapaxes(0, 1), g0o)
+        output[:, :, f] = colfilter(y.swapaxes(0, 1), g0o)
+
+def _level1_ifm_no_highpass_dim3(start, stop, output, g0o):
+    for f in xrange(start, stop):
+        y = output[:, f, :].swapaxes(0, 1).copy()
+        output[:, f, :] = colfilter(y, g0o).swapaxes(0, 1)
+
+def _level2_ifm(Yl, Yh, g0a, g0b, g1a, g1b, ext_mode, prev_level_size, pool=None):
     """Perform level 2 or greater of the 3d inverse transform.
 
     """
+    pool = pool or _SERIAL_POOL
+    g0a, g0b, g1a, g1b = pool.readonly(g0a), pool.readonly(g0b), pool.readonly(g1a), pool.readonly(g1b)
+
     # Create work area
-    work = np.zeros(np.asanyarray(Yl.shape)*2, dtype=Yl.dtype)
+    work = pool.zeros(tuple(np.asanyarray(Yl.shape[:3])*2) + Yl.shape[3:], dtype=Yl.dtype)
 
     # Form some useful slices
     s0a = slice(None, work.shape[0] >> 1)
@@ -474,67 +848,168 @@ def _level2_ifm(Yl, Yh, g0a, g0b, g1a, g1b, ext_mode, prev_level_size):
 
     # Assign regions of work area
     work[s0a, s1a, s2a] = Yl
-    work[s0a, s1b, s2a] = c2cube(Yh[:,:,:, 0:4 ])
-    work[s0b, s1a, s2a] = c2cube(Yh[:,:,:, 4:8 ])
-    work[s0b, s1b, s2a] = c2cube(Yh[:,:,:, 8:12])
-    work[s0a, s1a, s2b] = c2cube(Yh[:,:,:,12:16])
-    work[s0a, s1b, s2b] = c2cube(Yh[:,:,:,16:20])
-    work[s0b, s1a, s2b] = c2cube(Yh[:,:,:,20:24])
-    work[s0b, s1b, s2b] = c2cube(Yh[:,:,:,24:28])
-
-    for f in xrange(work.shape[2]):
+    c2cube(Yh[:,:,:, 0:4 ], out=work[s0a, s1b, s2a])
+    c2cube(Yh[:,:,:, 4:8 ], out=work[s0b, s1a, s2a])
+    c2cube(Yh[:,:,:, 8:12], out=work[s0b, s1b, s2a])
+    c2cube(Yh[:,:,:,12:16], out=work[s0a, s1a, s2b])
+    c2cube(Yh[:,:,:,16:20], out=work[s0a, s1b, s2b])
+    c2cube(Yh[:,:,:,20:24], out=work[s0b, s1a, s2b])
+    c2cube(Yh[:,:,:,24:28], out=work[s0b, s1b, s2b])
+
+    pool.map_slices(_level2_ifm_dims12, work.shape[2],
+                    work, g0a, g0b, g1a, g1b, s0a, s0b, s1a, s1b)
+
+    pool.map_slices(_level2_ifm_dim3, work.shape[1],
+                    work, g0a, g0b, g1a, g1b, s2a, s2b)
+
+    return remove_level2_extension(work, Yh.shape, prev_level_size, ext_mode)
+
+def _level2_ifm_no_highpass(Yl, g0a, g0b, ext_mode, prev_level_size, pool=None):
+    """Perform level 2 or greater of the 3d inverse transform assuming
+    highpass coefficients are zero.
+
+    """
+    pool = pool or _SERIAL_POOL
+    g0a, g0b = pool.readonly(g0a), pool.readonly(g0b)
+
+    # Only the lowpass octant of the work area used by _level2_ifm is non-zero
+    # and so only the g0 filters need be applied. Interpolate along the 1st
+    # and 2nd dimensions and then along the 3rd.
+    Yl = pool.asshared(Yl)
+    shape = np.asanyarray(Yl.shape[:3])
+    work = pool.zeros((shape[0]*2, shape[1]*2, shape[2]) + Yl.shape[3:], dtype=Yl.dtype)
+    output = pool.zeros(tuple(shape*2) + Yl.shape[3:], dtype=Yl.dtype)
+
+    pool.map_slices(_level2_ifm_no_highpass_dims12, shape[2], Yl, work, g0a, g0b)
+    pool.map_slices(_level2_ifm_no_highpass_dim3, shape[1]*2, work, output, g0a, g0b)
+
+    return remove_level2_extension(output, shape >> 1, prev_level_size, ext_mode)
+
+def _level2_ifm_no_highpass_dims12(start, stop, Yl, work, g0a, g0b):
+    for f in xrange(start, stop):
+        y = colifilt(Yl[:, :, f].swapaxes(0, 1), g0b, g0a)
+        work[:, :, f] = colifilt(y.swapaxes(0, 1), g0b, g0a)
+
+def _level2_ifm_no_highpass_dim3(start, stop, work, output, g0a, g0b):
+    for f in xrange(start, stop):
+        y = work[:, f, :].swapaxes(0, 1)
+        output[:, f, :] = colifilt(y, g0b, g0a).swapaxes(0, 1)
+
+def _level2_ifm_dims12(start, stop, work, g0a, g0b, g1a, g1b, s0a, s0b, s1a, s1b):
+    for f in xrange(start, stop):
         # Do even Qshift filters on rows.
-        y = colifilt(work[:, s1a, f].T, g0b, g0a) + colifilt(work[:, s1b, f].T, g1b, g1a)
+        y = colifilt(work[:, s1a, f].swapaxes(0, 1), g0b, g0a) + colifilt(work[:, s1b, f].swapaxes(0, 1), g1b, g1a)
 
-          # Do even Qshift filters on columns.
-        work[:, :, f] = colifilt(y[:, s0a].T, g0b, g0a) + colifilt(y[:,s0b].T, g1b, g1a)
+        # Do even Qshift filters on columns.
+        work[:, :, f] = colifilt(y[:, s0a].swapaxes(0, 1), g0b, g0a) + colifilt(y[:,s0b].swapaxes(0, 1), g1b, g1a)
 
-    for f in xrange(work.shape[1]):
+def _level2_ifm_dim3(start, stop, work, g0a, g0b, g1a, g1b, s2a, s2b):
+    for f in xrange(start, stop):
         # Do even Qshift filters on 3rd dim.
-        y = work[:, f, :].T
-        work[:, f, :] = (colifilt(y[s2a, :], g0b, g0a) + colifilt(y[s2b, :], g1b, g1a)).T
-
-    # Now check if the size of the previous level is exactly twice the size of
-    # the current level. If YES, this means we have not done the extension in
-    # the previous level. If NO, then we have to remove the appended row /
-    # column / frame from the previous level DTCWT coefs.
-
-    prev_level_size = np.asarray(prev_level_size)
-    curr_level_size = np.asarray(Yh.shape)
-
-    if ext_mode == 4:
-        if curr_level_size[0] * 2 != prev_level_size[0]:
-            # Discard the top and bottom rows
-            work = work[1:-1,:,:]
-        if curr_level_size[1] * 2 != prev_level_size[1]:
-            # Discard the top and bottom rows
-            work = work[:,1:-1,:]
-        if curr_level_size[2] * 2 != prev_level_size[2]:
-            # Discard the top and bottom rows
-            work = work[:,:,1:-1]
-    elif ext_mode == 8:
-        if curr_level_size[0] * 2 != prev_level_size[0]:
-        # Discard the top and bottom rows
-            work = work[2:-2,:,:]
-        if curr_level_size[1] * 2 != prev_level_size[1]:
-        # Discard the top and bottom rows
-            work = work[:,2:-2,:]
-        if curr_level_size[2] * 2 != prev_level_size[2]:
-        # Discard the top and bottom rows
-            work = work[:,:,2:-2]
-
-    return work
+        y = work[:, f, :].swapaxes(0, 1)
+        work[:, f, :] = (colifilt(y[s2a, :], g0b, g0a) + colifilt(y[s2b, :], g1b, g1a)).swapaxes(0, 1)
 
 #==========================================================================================
 #                       **********    INTERNAL FUNCTIONS    **********
 #==========================================================================================
 
-def cube2c(y):
+def _batch_first(X):
+    """
+    INTERNAL
+
+    Move the trailing volume index axis used by batched transforms back to be
+    the first axis.
+
+    """
+    if X is None:
+        return None
+    return np.ascontiguousarray(np.moveaxis(X, -1, 0))
+
+_SERIAL_POOL = SlicePool()
+
+class _ROIAxisPlan(object):
+    """
+    INTERNAL
+
+    Work out, along one axis of length *n*, which samples at each level of a
+    *nlevels* transform are needed to reconstruct *start* to *stop* exactly.
+
+    All ranges are half-open *(start, stop)* pairs in the co-ordinates of the
+    full transform and are indexed by 0-based level:
+
+    * *sizes[l]* is the length of the lowpass output by level *l* before any
+      extension by the next level. *pads[l]* is the number of samples added to
+      each end of *sizes[l-1]* by the extension at the start of level *l*.
+    * *lowpasses[l]* and *highpasses[l]* are the ranges of the lowpass and
+      highpass coefficients output by level *l* used by the inverse.
+    * *crops[l]* is the range of the input to level *l*, after extension, which
+      must be filtered to compute these lowpass and highpass ranges.
+
+    Ranges are aligned so that decimation and the pairing of samples into
+    complex coefficients has the same phase as in the full transform.
+
+    """
+    def __init__(self, n, start, stop, nlevels, ext_mode, biort_halo, qshift_halo):
+        self.start, self.stop = start, stop
+
+        # Sizes and extension of the full transform
+        self.sizes, self.pads = [n], [0]
+        for level in xrange(1, nlevels):
+            m = self.sizes[-1]
+            if ext_mode == 4:
+                pad = 1 if m % 4 != 0 else 0
+            else:
+                pad = 2 if m % 8 != 0 else 0
+            self.pads.append(pad)
+            self.sizes.append((m + 2*pad) >> 1)
+
+        # Coefficients required by the inverse working from the finest level
+        self.lowpasses, self.highpasses = [], []
+        lo, hi = start, stop
+        for level in xrange(nlevels):
+            if level == 0:
+                lo, hi = _align(lo - biort_halo, hi + biort_halo, 2, 0, n)
+            else:
+                pad, size = self.pads[level], self.sizes[level]
+                lo, hi = _align(((lo + pad) >> 1) - qshift_halo,
+                                ((hi + pad + 1) >> 1) + qshift_halo, 2, 0, size)
+            self.lowpasses.append((lo, hi))
+            self.highpasses.append((lo >> 1, hi >> 1))
+
+        # Input to each level required by the forward working from the coarsest
+        self.crops = [None,] * nlevels
+        lo, hi = self.lowpasses[-1]
+        for level in xrange(nlevels-1, -1, -1):
+            lo = min(lo, self.lowpasses[level][0])
+            hi = max(hi, self.lowpasses[level][1])
+            if level == 0:
+                self.crops[level] = _align(lo - biort_halo, hi + biort_halo, 2, 0, n)
+            else:
+                pad, size = self.pads[level], self.sizes[level-1]
+                self.crops[level] = _align(2*lo - 2*qshift_halo, 2*hi + 2*qshift_halo, 4, 0, size + 2*pad)
+                lo, hi = self.crops[level]
+                lo, hi = max(lo - pad, 0), min(hi - pad, size)
+
+def _align(start, stop, multiple, lower, upper):
+    """
+    INTERNAL
+
+    Clip *start* and *stop* to lie within *lower* and *upper* and then expand
+    them outward to be multiples of *multiple*. *lower* and *upper* must be
+    multiples of *multiple*.
+
+    """
+    start, stop = max(start, lower), min(stop, upper)
+    return start - (start % multiple), stop + ((-stop) % multiple)
+
+def cube2c(y, out=None):
     """Convert from octets in y to complex numbers in z.
 
     Arrange pixels from the corners of the quads into
     2 subimages of alternate real and imag pixels.
 
+    If *out* is not None, z is written into it rather than a new array.
+
         e----f
        /|   /|
       a----b |
@@ -561,27 +1036,35 @@ def cube2c(y):
     G = y[1::2, 0::2, 1::2]
     H = y[1::2, 1::2, 1::2]
 
-    # Combine to form subbands
-    p = ( A-G-D-F) * j2[0] + ( B-H+C+E) * j2[1]
-    q = ( A-G+D+F) * j2[0] + (-B+H+C+E) * j2[1]
-    r = ( A+G+D-F) * j2[0] + ( B+H-C+E) * j2[1]
-    s = ( A+G-D+F) * j2[0] + (-B-H-C+E) * j2[1]
-
-    #j2[2]=1 #to throw an error
-    # Form the 2 subbands in z.
-    z = np.concatenate((
-        p[:,:,:,np.newaxis],
-        q[:,:,:,np.newaxis],
-        r[:,:,:,np.newaxis],
-        s[:,:,:,np.newaxis],
-    ), axis=3)
+    if out is None:
+        out = np.zeros(A.shape[:3] + (4,) + A.shape[3:], dtype=appropriate_complex_type_for(y))
 
+    # Combine to form subbands in z.
+    out[:,:,:,0] = ( A-G-D-F) * j2[0] + ( B-H+C+E) * j2[1]
+    out[:,:,:,1] = ( A-G+D+F) * j2[0] + (-B+H+C+E) * j2[1]
+    out[:,:,:,2] = ( A+G+D-F) * j2[0] + ( B+H-C+E) * j2[1]
+    out[:,:,:,3] = ( A+G-D+F) * j2[0] + (-B-H-C+E) * j2[1]
+
+    return out
+
+def _cube2c_octants(octants):
+    """Convert each of the seven highpass octants in *octants* with
+    :py:func:`cube2c` into consecutive groups of four subbands of a single
+    array.
+
+    """
+    shape = octants[0].shape
+    z = np.zeros((shape[0]>>1, shape[1]>>1, shape[2]>>1, 4*len(octants)) + shape[3:],
+                 dtype=appropriate_complex_type_for(octants[0]))
+    for idx, octant in enumerate(octants):
+        cube2c(octant, out=z[:,:,:,4*idx:4*(idx+1)])
     return z
 
-def c2cube(z):
+def c2cube(z, out=None):
     """Convert from complex numbers octets in z to octets in y.
 
-    Undoes cube2c().
+    Undoes cube2c(). If *out* is not None, y is written into it rather than a
+    new array.
 
         e----f
        /|   /|
@@ -604,7 +1087,9 @@ def c2cube(z):
     rr, ri = r.real, r.imag #C,G
     sr, si = s.real, s.imag #D,H
 
-    y = np.zeros(np.asanyarray(z.shape[:3])*2, dtype=z.real.dtype)
+    y = out
+    if y is None:
+        y = np.zeros(tuple(np.asanyarray(z.shape[:3])*2) + z.shape[4:], dtype=z.real.dtype)
 
     y[0::2, 0::2, 0::2] = ( pr+qr+rr+sr)
     y[1::2, 0::2, 1::2] = (-pr-qr+rr+sr)
@@ -616,6 +1101,7 @@ def c2cube(z):
     y[1::2, 0::2, 0::2] = ( pi+qi-ri-si)
     y[0::2, 0::2, 1::2] = ( pi+qi+ri+si)
 
-    return y * scale
+    y *= scale
+    return y
 
 # vim:sw=4:sts=4:et
@@ -5,8 +5,10 @@ PyOpenCL be installed.
 """
 
 from .transform2d import Pyramid, Transform2d
+from .transform3d import Transform3d
 
 __all__ = [
     'Pyramid',
     'Transform2d',
+    'Transform3d',
 ]
@@ -12,9 +12,14 @@ except ImportError:
 class NoCLPresentError(RuntimeError):
     pass
 
+import hashlib
+import json
+import logging
 import numpy as np
+import os
 from six.moves import xrange
 import struct
+import time
 
 from dtcwt.utils import asfarray, as_column_vector, memoize
 
@@ -161,59 +166,289 @@ def get_default_queue():
     ctx = cl.create_some_context(interactive=False)
     return cl.CommandQueue(ctx)
 
-def to_queue(queue):
+# The queue or QueuePool used when none is specified. This is set from the
+# backend stack by dtcwt.push_backend().
+_DEFAULT_QUEUE = None
+
+def _set_default_queue(queue):
+    """Set the queue or :py:class:`QueuePool` used when none is specified. If
+    *queue* is ``None``, the queue returned by :py:func:`get_default_queue` is
+    used.
+
+    """
+    global _DEFAULT_QUEUE
+    _DEFAULT_QUEUE = queue
+
+def to_queue_or_pool(queue):
+    """Return *queue* if it is non-``None``. Otherwise return the default queue
+    or :py:class:`QueuePool` selected via :py:func:`dtcwt.push_backend` or, if
+    none was selected, the queue returned by :py:func:`get_default_queue`.
+
+    """
     if queue is not None:
         return queue
+    if _DEFAULT_QUEUE is not None:
+        return _DEFAULT_QUEUE
     return get_default_queue()
 
-def to_device(X, queue=None):
+def to_queue(queue):
+    queue = to_queue_or_pool(queue)
+    if isinstance(queue, QueuePool):
+        return queue.next_queue()
+    return queue
+
+def to_device(X, queue=None, dtype=np.float32):
     if isinstance(X, cl_array.Array):
         return X
-    return cl_array.to_device(to_queue(queue), np.array(X, dtype=np.float32, order='C'))
+    return cl_array.to_device(to_queue(queue), np.array(X, dtype=dtype, order='C'))
+
+def to_device_async(X, queue=None, dtype=np.float32, wait_for=None):
+    """Start copying *X* to the device without waiting for the copy to
+    complete. Returns a pair giving the :py:class:`pyopencl.array.Array`
+    which will hold the copy and a :py:class:`pyopencl.Event` which is
+    signalled when the copy completes. *X* is first copied into a contiguous
+    host-side staging array and so may be modified as soon as this function
+    returns.
+
+    If *X* is already a device array, it is returned along with an event of
+    ``None``. If *wait_for* is non-``None``, it is a sequence of events which
+    must complete before the copy starts.
+
+    """
+    if isinstance(X, cl_array.Array):
+        return X, None
+    queue = to_queue(queue)
+    X = np.array(X, dtype=dtype, order='C')
+    X_device = cl_array.empty(queue, X.shape, X.dtype)
+    event = cl.enqueue_copy(queue, X_device.data, X, is_blocking=False, wait_for=wait_for)
+    return X_device, event
 
 def to_array(a, queue=None):
     # Support passing non-CL arrays in and getting them straight back out
+    rv, event = to_array_async(a, queue=queue)
+    if event is not None:
+        event.wait()
+    return rv
+
+def to_array_async(a, queue=None, wait_for=None):
+    """Start copying the device array *a* to the host without waiting for the
+    copy to complete. Returns a pair giving the host-side array which will
+    hold the copy and a :py:class:`pyopencl.Event` which is signalled when
+    the copy completes. The host-side array must not be used before then.
+
+    If *a* is not a device array, it is returned along with an event of
+    ``None``. If *wait_for* is non-``None``, it is a sequence of events which
+    must complete before the copy starts.
+
+    """
     if not isinstance(a, cl_array.Array):
-        return a
+        return a, None
     queue = queue or a.queue or to_queue(queue)
     rv = np.empty(a.shape, a.dtype)
-    cl.enqueue_copy(queue, rv, a.data).wait()
-    return rv
+    event = cl.enqueue_copy(queue, rv, a.data, is_blocking=False, wait_for=wait_for)
+    return rv, event
+
+class DeviceFuture(object):
+    """
+    The result of an operation which has been queued on the device but which
+    may not have completed. The operation is complete when all of *events*
+    have been signalled. Events which are ``None`` are ignored.
+
+    .. py:attribute:: events
+
+        The list of :py:class:`pyopencl.Event` instances signalled when the
+        operation completes.
+
+    """
+    def __init__(self, value, events):
+        self._value = value
+        self.events = list(e for e in events if e is not None)
+
+    def done(self):
+        """Return ``True`` if the operation has completed. This never blocks."""
+        return all(
+            e.command_execution_status == cl.command_execution_status.COMPLETE
+            for e in self.events
+        )
+
+    def wait(self):
+        """Block until the operation has completed."""
+        if len(self.events) > 0:
+            cl.wait_for_events(self.events)
+
+    def result(self):
+        """Block until the operation has completed and return its result."""
+        self.wait()
+        return self._value
+
+class QueuePool(object):
+    """
+    A pool of command queues, possibly on different devices, across which
+    independent pieces of work are spread. Each piece of work is run entirely
+    on one queue and so device arrays never move between queues.
+
+    *policy* selects the queue used for the next piece of work. It may be
+    ``'round-robin'``, which cycles through *queues* in order, or ``'load'``,
+    which picks the queue with the fewest pieces of work submitted via
+    :py:meth:`submit` which have not yet completed.
+
+    .. py:attribute:: queues
+
+        The tuple of :py:class:`pyopencl.CommandQueue` instances in the pool.
 
-def _apply_kernel(X, h, kern, output, axis=0, elementstep=1, extra_kernel_args=None):
+    .. py:attribute:: policy
+
+        The queue selection policy.
+
+    """
+    POLICIES = ('round-robin', 'load')
+
+    def __init__(self, queues, policy='round-robin'):
+        self.queues = tuple(queues)
+        if len(self.queues) == 0:
+            raise ValueError('A queue pool must have at least one queue.')
+        if policy not in QueuePool.POLICIES:
+            raise ValueError('Unknown queue pool policy: {0}'.format(policy))
+        self.policy = policy
+        self._next_idx = 0
+        self._pending = list([] for _ in self.queues)
+
+    def __len__(self):
+        return len(self.queues)
+
+    def outstanding(self, queue):
+        """Return the number of pieces of work submitted to *queue* which have
+        not yet completed. This never blocks.
+
+        """
+        idx = self.queues.index(queue)
+        self._pending[idx] = list(
+            e for e in self._pending[idx]
+            if e.command_execution_status != cl.command_execution_status.COMPLETE
+        )
+        return len(self._pending[idx])
+
+    def queue_of(self, X):
+        """Return the queue in the pool associated with the device array *X*
+        or ``None`` if *X* is not a device array associated with the pool.
+
+        """
+        if isinstance(X, cl_array.Array) and X.queue in self.queues:
+            return X.queue
+        return None
+
+    def next_queue(self):
+        """Return the queue which should be used for the next piece of work."""
+        order = list(self.queues[(self._next_idx + i) % len(self.queues)] for i in xrange(len(self.queues)))
+        if self.policy == 'load':
+            # min() returns the first of equally loaded queues and so ties are
+            # broken in round-robin order.
+            queue = min(order, key=self.outstanding)
+        else:
+            queue = order[0]
+        self._next_idx = (self.queues.index(queue) + 1) % len(self.queues)
+        return queue
+
+    def submit(self, func, queue=None):
+        """Call *func* with a queue from the pool as its only argument and
+        return the result. *func* should only enqueue work on that queue. If
+        *queue* is non-``None``, it is used in place of :py:meth:`next_queue`.
+
+        """
+        if queue is None:
+            queue = self.next_queue()
+        result = func(queue)
+        self._pending[self.queues.index(queue)].append(cl.enqueue_marker(queue))
+        return result
+
+    def map(self, func, items):
+        """Return a list of ``func(item, queue)`` for each element of *items*,
+        in order, where each item is submitted to a queue from the pool.
+
+        """
+        return list(self.submit(lambda queue: func(item, queue)) for item in items)
+
+    def finish(self):
+        """Block until all work queued on the pool has completed."""
+        for queue in self.queues:
+            queue.finish()
+
+def queue_pool_for_devices(devices=None, policy='round-robin'):
+    """Return a :py:class:`QueuePool` with one queue for each device in
+    *devices*. If *devices* is ``None``, all devices on all platforms are
+    used.
+
+    """
+    _check_cl()
+    if devices is None:
+        devices = list(d for p in cl.get_platforms() for d in p.get_devices())
+    return QueuePool(list(cl.CommandQueue(cl.Context([d]), d) for d in devices), policy=policy)
+
+def queue_pool_for_subdevices(device=None, compute_units=1, policy='round-robin'):
+    """Partition *device* into sub-devices of *compute_units* compute units
+    each and return a :py:class:`QueuePool` with one queue for each of them.
+    If *device* is ``None``, the device of :py:func:`get_default_queue` is
+    used.
+
+    :raises ValueError: if *device* cannot be partitioned in this way.
+
+    """
+    _check_cl()
+    if device is None:
+        device = get_default_queue().device
+    try:
+        subdevices = device.create_sub_devices(
+            [cl.device_partition_property.EQUALLY, compute_units])
+    except cl.Error as e:
+        raise ValueError('Cannot partition device {0}: {1}'.format(device.name, e))
+    context = cl.Context(subdevices)
+    return QueuePool(list(cl.CommandQueue(context, d) for d in subdevices), policy=policy)
+
+def _filter_to_device(h, queue):
+    """Return a device array holding the filter coefficients *h* for use with
+    *queue*. Filters are uploaded once per context and subsequent calls with
+    the same coefficients return the cached device array. Cached arrays live
+    for as long as the context's compiled kernels.
+
+    """
+    if isinstance(h, cl_array.Array):
+        return h
+
+    h = np.array(h, dtype=np.float32, order='C')
+    cache = _filter_cache_for_context(queue.context)
+    key = (h.shape, h.tobytes())
+    try:
+        return cache[key]
+    except KeyError:
+        h_device = cache[key] = cl_array.to_device(queue, h)
+        return h_device
+
+def _apply_kernel(X, h, kern, output, axis=0, elementstep=1, extra_kernel_args=None, name='convolve'):
     queue = to_queue(output.queue)
 
     # If necessary, convert X and h to device arrays
-    h_device = to_device(h, queue)
+    h_device = _filter_to_device(h, queue)
     X_device = to_device(X, queue)
 
-    # Work out size of work group taking into account element step
+    # Work out size of work group taking into account element step, i.e. the
+    # number of output samples along *axis* written by each work item.
     work_shape = np.array(output.shape[:3])
-    work_shape[axis] /= elementstep
-
-    # Work out optimum group size
-    if work_shape.shape[0] >= 2 and np.all(work_shape[:2] > 1):
-        local_shape = (int(np.floor(np.sqrt(queue.device.max_work_group_size))),) * 2 + (1,1,)
-    else:
-        local_shape = (queue.device.max_work_group_size, 1, 1)
-    local_shape = local_shape[:len(work_shape)]
-
-    global_shape = list(int(np.ceil(x/float(y))*y) for x, y in zip(work_shape, local_shape))
+    work_shape[axis] = (work_shape[axis] + elementstep - 1) // elementstep
 
     X_strides = struct.pack('iiii', *(tuple(s//X_device.dtype.itemsize for s in X_device.strides) + (0,0,0,0))[:4])
     X_shape = struct.pack('iiii', *(tuple(X_device.shape) + (1,1,1,1))[:4])
-    X_offset = np.int32(X_device.offset)
+    X_offset = np.int32(X_device.offset // X_device.dtype.itemsize)
 
     Y_strides = struct.pack('iiii', *(tuple(s//output.dtype.itemsize for s in output.strides) + (0,0,0,0))[:4])
     Y_shape = struct.pack('iiii', *(tuple(output.shape) + (1,1,1,1))[:4])
-    Y_offset = np.int32(output.offset)
+    Y_offset = np.int32(output.offset // output.dtype.itemsize)
 
     h_stride = np.int32(h_device.strides[0] / h_device.dtype.itemsize)
     h_shape = np.int32(h_device.shape[0])
-    h_offset = np.int32(h_device.offset)
+    h_offset = np.int32(h_device.offset // h_device.dtype.itemsize)
 
     # Perform actual convolution
-    kern(queue, global_shape, local_shape,
+    _launch(queue, kern, '{0}-axis{1}'.format(name, axis), work_shape,
             X_device.base_data, X_strides, X_shape, X_offset,
             h_device.base_data, h_stride, h_shape, h_offset,
             output.base_data, Y_strides, Y_shape, Y_offset,
@@ -268,7 +503,7 @@ def axis_convolve_dfilter(X, h, axis=0, queue=None, output=None):
         output_shape[axis] >>= 1
         output = cl_array.empty(queue, tuple(output_shape), np.float32)
 
-    return _apply_kernel(X, h, kern, output, axis=axis, elementstep=2)
+    return _apply_kernel(X, h, kern, output, axis=axis, elementstep=2, name='dfilter')
 
 def axis_convolve_ifilter(X, h, axis=0, queue=None, output=None):
     _check_cl()
@@ -281,9 +516,16 @@ def axis_convolve_ifilter(X, h, axis=0, queue=None, output=None):
         output_shape[axis] <<= 1
         output = cl_array.empty(queue, tuple(output_shape), np.float32)
 
-    return _apply_kernel(X, h, kern, output, axis=axis, elementstep=0.5)
+    return _apply_kernel(X, h, kern, output, axis=axis, elementstep=4, name='ifilter')
 
 def q2c(X1, X2, X3, queue=None, output=None):
+    """Convert the three real quad-number images *X1*, *X2* and *X3* into the
+    six complex subbands of a highpass image.
+
+    If the images are 3D, each ``X[:,:,i]`` is converted independently in a
+    single launch and the output has an additional final axis indexing them.
+
+    """
     _check_cl()
     queue = to_queue(queue)
     kern = _q2c_kernel_for_queue(queue.context)
@@ -291,6 +533,9 @@ def q2c(X1, X2, X3, queue=None, output=None):
     if X1.shape != X2.shape or X2.shape != X3.shape:
         raise ValueError('All three X matrices must have the same shape.')
 
+    if len(X1.shape) > 3:
+        raise ValueError('X matrices must be at most three-dimensional.')
+
     # Create output if not specified
     if output is None:
         output_shape = [1,1,1]
@@ -298,6 +543,7 @@ def q2c(X1, X2, X3, queue=None, output=None):
         output_shape[0] >>= 1
         output_shape[1] >>= 1
         output_shape[2] = 6
+        output_shape.extend(X1.shape[2:])
         output = cl_array.empty(queue, tuple(output_shape), np.complex64)
 
     # If necessary, convert X
@@ -305,33 +551,25 @@ def q2c(X1, X2, X3, queue=None, output=None):
     X2_device = to_device(X2, queue)
     X3_device = to_device(X3, queue)
 
-    # Work out size of work group taking into account element step
-    work_shape = np.array(output.shape[:3])
-
-    # Work out optimum group size
-    if work_shape.shape[0] >= 2 and np.all(work_shape[:2] > 1):
-        local_shape = (int(np.floor(np.sqrt(queue.device.max_work_group_size))),) * 2 + (1,1,)
-    else:
-        local_shape = (queue.device.max_work_group_size, 1, 1)
-    local_shape = local_shape[:len(work_shape)]
-
-    global_shape = list(int(np.ceil(x/float(y))*y) for x, y in zip(work_shape, local_shape))
+    # Work out size of work group. Each work item writes all six subbands for
+    # one quad of one image.
+    work_shape = [output.shape[0], output.shape[1], (tuple(X1_device.shape[2:]) + (1,))[0]]
 
     X_shape = struct.pack('iiii', *(tuple(X1_device.shape) + (1,1,1,1))[:4])
 
     X1_strides = struct.pack('iiii', *(tuple(s//X1_device.dtype.itemsize for s in X1_device.strides) + (0,0,0,0))[:4])
-    X1_offset = np.int32(X1_device.offset)
+    X1_offset = np.int32(X1_device.offset // X1_device.dtype.itemsize)
     X2_strides = struct.pack('iiii', *(tuple(s//X2_device.dtype.itemsize for s in X2_device.strides) + (0,0,0,0))[:4])
-    X2_offset = np.int32(X2_device.offset)
+    X2_offset = np.int32(X2_device.offset // X2_device.dtype.itemsize)
     X3_strides = struct.pack('iiii', *(tuple(s//X3_device.dtype.itemsize for s in X3_device.strides) + (0,0,0,0))[:4])
-    X3_offset = np.int32(X3_device.offset)
+    X3_offset = np.int32(X3_device.offset // X3_device.dtype.itemsize)
 
     Y_strides = struct.pack('iiii', *(tuple(s//output.dtype.itemsize for s in output.strides) + (0,0,0,0))[:4])
     Y_shape = struct.pack('iiii', *(tuple(output.shape) + (1,1,1,1))[:4])
-    Y_offset = np.int32(output.offset)
+    Y_offset = np.int32(output.offset // output.dtype.itemsize)
 
-    # Perform actual convolution
-    kern(queue, global_shape, local_shape,
+    # Perform actual conversion
+    _launch(queue, kern, 'q2c', work_shape,
             X_shape,
             X1_device.base_data, X1_strides, X1_offset,
             X2_device.base_data, X2_strides, X2_offset,
@@ -340,14 +578,726 @@ def q2c(X1, X2, X3, queue=None, output=None):
 
     return output
 
+def c2q(X, gain=None, queue=None, outputs=None):
+    """Scale the six complex subbands of the highpass image *X* by the
+    corresponding elements of *gain* and convert them to three real quad-number
+    images. This is the inverse of :py:func:`q2c` and the images are returned
+    in the order of its arguments.
+
+    If *gain* is ``None``, all gains are one. If *outputs* is non-``None``, it
+    should be a sequence of three :py:class:`pyopencl.array.Array` instances
+    which the results are written into. If ``None``, output arrays are created.
+
+    """
+    _check_cl()
+    queue = to_queue(queue)
+    kern = _c2q_kernel_for_queue(queue.context)
+
+    if len(X.shape) != 3 or X.shape[2] != 6:
+        raise ValueError('X must have shape NxMx6.')
+
+    if gain is None:
+        gain = np.ones(6)
+    gain = np.asanyarray(gain, dtype=np.float32).ravel()
+    if gain.shape != (6,):
+        raise ValueError('There must be one gain for each of the six subbands.')
+
+    # Create outputs if not specified
+    if outputs is None:
+        output_shape = (X.shape[0] << 1, X.shape[1] << 1)
+        outputs = tuple(cl_array.empty(queue, output_shape, np.float32) for _ in xrange(3))
+
+    Y1, Y2, Y3 = outputs
+    if Y1.shape != Y2.shape or Y2.shape != Y3.shape:
+        raise ValueError('All three outputs must have the same shape.')
+
+    # If necessary, convert X
+    X_device = to_device(X, queue, dtype=np.complex64)
+
+    # Work out size of work group. Each work item reads one sample of each
+    # subband.
+    work_shape = np.array(X_device.shape[:2])
+
+    X_strides = struct.pack('iiii', *(tuple(s//X_device.dtype.itemsize for s in X_device.strides) + (0,0,0,0))[:4])
+    X_shape = struct.pack('iiii', *(tuple(X_device.shape) + (1,1,1,1))[:4])
+    X_offset = np.int32(X_device.offset // X_device.dtype.itemsize)
+
+    Y_shape = struct.pack('iiii', *(tuple(Y1.shape) + (1,1,1,1))[:4])
+
+    Y1_strides = struct.pack('iiii', *(tuple(s//Y1.dtype.itemsize for s in Y1.strides) + (0,0,0,0))[:4])
+    Y1_offset = np.int32(Y1.offset // Y1.dtype.itemsize)
+    Y2_strides = struct.pack('iiii', *(tuple(s//Y2.dtype.itemsize for s in Y2.strides) + (0,0,0,0))[:4])
+    Y2_offset = np.int32(Y2.offset // Y2.dtype.itemsize)
+    Y3_strides = struct.pack('iiii', *(tuple(s//Y3.dtype.itemsize for s in Y3.strides) + (0,0,0,0))[:4])
+    Y3_offset = np.int32(Y3.offset // Y3.dtype.itemsize)
+
+    # Perform actual conversion
+    _launch(queue, kern, 'c2q', work_shape,
+            X_device.base_data, X_strides, X_shape, X_offset,
+            gain[0], gain[1], gain[2], gain[3], gain[4], gain[5],
+            Y_shape,
+            Y1.base_data, Y1_strides, Y1_offset,
+            Y2.base_data, Y2_strides, Y2_offset,
+            Y3.base_data, Y3_strides, Y3_offset)
+
+    return Y1, Y2, Y3
+
+def column_filter_bank(X, filters, decimate=False, queue=None):
+    """Filter the columns of *X* with each of the two or three filters in
+    *filters* in a single kernel launch and return a tuple of the filtered
+    device arrays. This is equivalent to calling :py:func:`axis_convolve` (or
+    :py:func:`axis_convolve_dfilter` if *decimate* is ``True``) along axis 0
+    once for each filter but reads *X* only once.
+
+    If *decimate* is ``False``, the filters must have odd length and each
+    output has the same shape as *X*. Otherwise, the number of rows of *X*
+    must be a multiple of four and each output has half as many rows as *X*.
+
+    """
+    _check_cl()
+    queue = to_queue(queue)
+    columns_kernel, _ = _level_kernels_for_queue(queue.context, decimate)
+
+    if len(filters) not in (2, 3):
+        raise ValueError('There must be two or three filters.')
+
+    if len(X.shape) > 3:
+        raise ValueError('X must be at most three-dimensional.')
+
+    if not decimate and any(np.asanyarray(h).shape[0] % 2 == 0 for h in filters):
+        raise ValueError('Filters must have odd length if not decimating.')
+
+    if decimate and X.shape[0] % 4 != 0:
+        raise ValueError('No. of rows in X must be a multiple of 4 when decimating.')
+
+    X_device = to_device(X, queue)
+    output_shape = list(X_device.shape)
+    if decimate:
+        output_shape[0] >>= 1
+    outputs = tuple(cl_array.empty(queue, tuple(output_shape), np.float32) for _ in filters)
+
+    # Work out size of work group. When decimating, each work item writes a
+    # pair of output samples in each column.
+    work_shape = (tuple(output_shape) + (1,1))[:3]
+    if decimate:
+        work_shape = (work_shape[0] >> 1,) + work_shape[1:]
+
+    X_strides, X_shape, X_offset = _array_spec(X_device)
+    Y_strides, Y_shape, _ = _array_spec(outputs[0])
+
+    # The third output is never written if there are only two filters but
+    # the kernel still needs a valid buffer for it.
+    padding = 3 - len(filters)
+    filter_args, output_args = [], []
+    for h, Y in zip(tuple(filters) + (filters[-1],) * padding, outputs + (outputs[-1],) * padding):
+        filter_args.extend(_filter_spec(h, queue))
+        output_args.extend((Y.base_data, np.int32(Y.offset // Y.dtype.itemsize)))
+
+    _launch(queue, columns_kernel, 'columns' + ('-decimate' if decimate else ''), work_shape,
+            X_device.base_data, X_strides, X_shape, X_offset,
+            *(filter_args + [np.int32(len(filters)), Y_strides, Y_shape] + output_args))
+
+    return outputs
+
+def row_filter_q2c(Lo, Hi, D, filters, decimate=False, queue=None, outputs=None):
+    """Filter the rows of the column-filtered images *Lo*, *Hi* and *D* and
+    convert the results directly into the lowpass image and the six complex
+    subbands of a highpass image. *filters* is a sequence of three filters,
+    *h0*, *h1* and *hd*. This is equivalent to::
+
+        LoLo = axis_convolve(Lo, h0, axis=1)
+        Yh = q2c(axis_convolve(Hi, h0, axis=1),
+                 axis_convolve(Lo, h1, axis=1),
+                 axis_convolve(D, hd, axis=1))
+
+    (with :py:func:`axis_convolve_dfilter` in place of
+    :py:func:`axis_convolve` if *decimate* is ``True``) but the row-filtered
+    images are never written to device memory.
+
+    If the images are 3D, each ``X[:,:,i]`` is transformed independently. A
+    tuple *(LoLo, Yh)* of device arrays is returned.
+
+    If *outputs* is non-``None``, it should be a pair of
+    :py:class:`pyopencl.array.Array` instances, possibly non-contiguous views,
+    which *LoLo* and *Yh* are written into. If ``None``, output arrays are
+    created.
+
+    """
+    _check_cl()
+    queue = to_queue(queue)
+    _, rows_q2c_kernel = _level_kernels_for_queue(queue.context, decimate)
+
+    if Lo.shape != Hi.shape or Hi.shape != D.shape:
+        raise ValueError('All three X matrices must have the same shape.')
+
+    if len(Lo.shape) > 3:
+        raise ValueError('X matrices must be at most three-dimensional.')
+
+    if len(filters) != 3:
+        raise ValueError('There must be three filters.')
+
+    if not decimate and any(np.asanyarray(h).shape[0] % 2 == 0 for h in filters):
+        raise ValueError('Filters must have odd length if not decimating.')
+
+    if decimate and Lo.shape[1] % 4 != 0:
+        raise ValueError('No. of columns in X must be a multiple of 4 when decimating.')
+
+    # All three inputs must share a layout so that a single strides vector
+    # describes them.
+    inputs = [to_device(X, queue) for X in (Lo, Hi, D)]
+    for idx in xrange(1, 3):
+        if inputs[idx].strides != inputs[0].strides:
+            inputs[idx] = inputs[idx].copy()
+
+    output_shape = list(inputs[0].shape)
+    if decimate:
+        output_shape[1] >>= 1
+    Yh_shape = (output_shape[0] >> 1, output_shape[1] >> 1, 6) + tuple(output_shape[2:])
+    if outputs is None:
+        LoLo = cl_array.empty(queue, tuple(output_shape), np.float32)
+        Yh = cl_array.empty(queue, Yh_shape, np.complex64)
+    else:
+        LoLo, Yh = outputs
+        if LoLo.shape != tuple(output_shape) or Yh.shape != Yh_shape:
+            raise ValueError('Outputs have shapes {0} and {1} but {2} and {3} are required.'.format(
+                LoLo.shape, Yh.shape, tuple(output_shape), Yh_shape))
+
+    # Work out size of work group. Each work item writes one quad of LoLo and
+    # all six subbands for that quad.
+    work_shape = [Yh.shape[0], Yh.shape[1], (tuple(output_shape[2:]) + (1,))[0]]
+
+    X_strides, X_shape, _ = _array_spec(inputs[0])
+    input_args = []
+    for X in inputs:
+        input_args.extend((X.base_data, np.int32(X.offset // X.dtype.itemsize)))
+    filter_args = []
+    for h in filters:
+        filter_args.extend(_filter_spec(h, queue))
+
+    LoLo_strides, LoLo_shape, LoLo_offset = _array_spec(LoLo)
+    Yh_strides, Yh_shape, Yh_offset = _array_spec(Yh)
+
+    _launch(queue, rows_q2c_kernel, 'rows-q2c' + ('-decimate' if decimate else ''), work_shape,
+            *([X_strides, X_shape] + input_args + filter_args + [
+                LoLo.base_data, LoLo_strides, LoLo_shape, LoLo_offset,
+                Yh.base_data, Yh_strides, Yh_shape, Yh_offset]))
+
+    return LoLo, Yh
+
+def _default_local_shape(device, work_shape):
+    """Return the local work size used for *work_shape* on *device* when no
+    tuned size is available.
+
+    """
+    work_shape = np.asanyarray(work_shape)
+
+    if work_shape.shape[0] >= 2 and np.all(work_shape[:2] > 1):
+        local_shape = (int(np.floor(np.sqrt(device.max_work_group_size))),) * 2 + (1,1,)
+    else:
+        local_shape = (device.max_work_group_size, 1, 1)
+    return tuple(local_shape[:len(work_shape)])
+
+def _global_shape(work_shape, local_shape):
+    """Return the global work size which covers *work_shape* with work groups
+    of *local_shape*. If *local_shape* is ``None``, the implementation chooses
+    the work group size.
+
+    """
+    if local_shape is None:
+        return list(int(x) for x in work_shape)
+    return list(int(np.ceil(x/float(y))*y) for x, y in zip(work_shape, local_shape))
+
+def _work_shapes(queue, work_shape, kern=None, name=None, args=None):
+    """Return the global and local work sizes used to launch a kernel with one
+    work item for each element of the (up to 3D) shape *work_shape*.
+
+    If *kern* and *name* are non-``None``, the local size is that recorded for
+    *name* on this device and for shapes similar to *work_shape* or, if
+    autotuning is enabled, the fastest of a set of candidates. Candidates are timed by launching
+    *kern* with *args* and so the kernel must be safe to launch repeatedly.
+    Results are recorded in a per-device cache. See `_tuned_local_shape`.
+
+    """
+    work_shape = tuple(int(x) for x in work_shape)
+    if kern is not None and name is not None:
+        local_shape = _tuned_local_shape(queue, kern, name, work_shape, args)
+    else:
+        local_shape = _default_local_shape(queue.device, work_shape)
+
+    return _global_shape(work_shape, local_shape), local_shape
+
+def _launch(queue, kern, name, work_shape, *args):
+    """Launch *kern* on *queue* with one work item for each element of
+    *work_shape*. The local work size is chosen by :py:func:`_work_shapes`.
+
+    """
+    global_shape, local_shape = _work_shapes(queue, work_shape, kern=kern, name=name, args=args)
+    return kern(queue, global_shape, local_shape, *args)
+
+def _autotune_enabled():
+    """Return ``True`` if autotuning has been enabled by setting the
+    DTCWT_OPENCL_AUTOTUNE environment variable to "1".
+
+    """
+    return os.environ.get('DTCWT_OPENCL_AUTOTUNE', '0') == '1'
+
+def _cache_dir():
+    """Return the directory in which persistent OpenCL caches are stored or
+    ``None`` if they are disabled.
+
+    The directory is given by the DTCWT_OPENCL_CACHE_DIR environment variable.
+    If this is empty, persistent caches are disabled. If it is unset, the
+    directory ``dtcwt`` within the per-user cache directory (usually
+    ``~/.cache``) is used.
+
+    """
+    path = os.environ.get('DTCWT_OPENCL_CACHE_DIR')
+    if path is None:
+        user_cache = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+        return os.path.join(user_cache, 'dtcwt')
+    return path or None
+
+def _device_cache_name(device):
+    """Return a string, safe for use in a file name, which identifies
+    *device* and the version of its driver.
+
+    """
+    desc = '\n'.join((device.platform.name, device.name, device.driver_version))
+    return _hash_hex(desc)
+
+def _hash_hex(*parts):
+    """Return the hexadecimal SHA-1 digest of the concatenation of *parts*."""
+    h = hashlib.sha1()
+    for part in parts:
+        if not isinstance(part, bytes):
+            part = part.encode('utf8')
+        h.update(part)
+    return h.hexdigest()
+
+def _load_json(path):
+    """Load a dictionary from the JSON file at *path*. An empty dictionary is
+    returned if the file is missing or unreadable.
+
+    """
+    try:
+        with open(path) as f:
+            rv = json.load(f)
+    except (IOError, OSError, ValueError):
+        return {}
+    return rv if isinstance(rv, dict) else {}
+
+def _write_cache_file(path, data, mode='w'):
+    """Atomically replace the file at *path* with *data*, creating any
+    directories required. Failures are logged and otherwise ignored since
+    persistent caches are an optimisation only.
+
+    """
+    tmp_path = '{0}.{1}.tmp'.format(path, os.getpid())
+    try:
+        dirname = os.path.dirname(path)
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        with open(tmp_path, mode) as f:
+            f.write(data)
+        getattr(os, 'replace', os.rename)(tmp_path, path)
+    except (IOError, OSError) as e:
+        logging.warn('Could not write OpenCL cache file {0}: {1}'.format(path, e))
+
+def _is_writable(path):
+    """Return ``True`` if the file at *path* may be created or replaced."""
+    dirname = os.path.dirname(path)
+    while not os.path.isdir(dirname):
+        parent = os.path.dirname(dirname)
+        if parent == dirname:
+            return False
+        dirname = parent
+    return os.access(dirname, os.W_OK | os.X_OK)
+
+def _shape_class(work_shape):
+    """Return a string identifying the class of work shapes which share a
+    tuned local size with *work_shape*. Each dimension is rounded up to a
+    power of two.
+
+    """
+    return 'x'.join(str(int(np.ceil(np.log2(max(1, int(n)))))) for n in work_shape)
+
+@memoize
+def _tuning_cache_for_device(device):
+    """Return the dictionary of tuned local sizes for *device*, loading it
+    from the persistent cache if present. The return values are memoized.
+
+    """
+    path = _tuning_cache_path(device)
+    return _load_json(path) if path is not None else {}
+
+def _tuning_cache_path(device):
+    directory = _cache_dir()
+    if directory is None:
+        return None
+    return os.path.join(directory, 'worksizes-{0}.json'.format(_device_cache_name(device)))
+
+def _max_local_size(device, kern):
+    """Return the maximum number of work items in a work group when launching
+    *kern* on *device*.
+
+    """
+    return min(device.max_work_group_size,
+            kern.get_work_group_info(cl.kernel_work_group_info.WORK_GROUP_SIZE, device))
+
+def _kernel_source_hash(kern):
+    """Return a string identifying the source of the program containing
+    *kern*. Tuned local sizes are recorded against this so that sizes tuned
+    for one version of a kernel are not used for another. An empty string is
+    returned for kernels not built by :py:func:`_build_program`.
+
+    """
+    program = kern.get_info(cl.kernel_info.PROGRAM)
+    return _program_source_hashes.get(program.int_ptr, '')
+
+# The maximum number of local sizes benchmarked when tuning a kernel
+_MAX_TUNING_CANDIDATES = 6
+
+def _candidate_local_shapes(device, kern, work_shape, max_candidates=_MAX_TUNING_CANDIDATES):
+    """Return a list of at most *max_candidates* candidate local sizes for
+    launching *kern* on *device* over *work_shape*. ``None``, which leaves the
+    choice to the implementation, and the default local size are always
+    candidates. The remainder are spread evenly over the valid power of two
+    sizes from smallest to largest.
+
+    """
+    max_size = _max_local_size(device, kern)
+    max_items = device.max_work_item_sizes
+
+    # Powers of two up to the smallest power of two covering each of the first
+    # two dimensions. Later dimensions are not split between work items.
+    def sizes(dim):
+        if dim >= min(2, len(work_shape)):
+            return [1]
+        limit = min(max_items[dim], 1 << int(np.ceil(np.log2(max(1, work_shape[dim])))))
+        return list(1 << k for k in xrange(int(np.log2(limit)) + 1))
+
+    candidates = [None, _default_local_shape(device, work_shape)]
+    min_size = min(max_size, 16)
+    for x in sizes(0):
+        for y in sizes(1) if len(work_shape) > 1 else [None]:
+            local_shape = (x,) if y is None else (x, y)
+            local_shape = local_shape + (1,) * (len(work_shape) - len(local_shape))
+            n = int(np.prod(local_shape))
+            if n > max_size or n < min(min_size, np.prod(work_shape)):
+                continue
+            candidates.append(local_shape)
+
+    candidates = list(c for i, c in enumerate(candidates)
+            if c not in candidates[:i] and (c is None or int(np.prod(c)) <= max_size))
+
+    fixed, others = candidates[:2], candidates[2:]
+    n_others = max(0, max_candidates - len(fixed))
+    if len(others) > n_others:
+        others.sort(key=lambda c: (int(np.prod(c)), c))
+        picks = np.unique(np.linspace(0, len(others) - 1, n_others).round().astype(int))
+        others = list(others[i] for i in picks)
+    return (fixed + others)[:max_candidates]
+
+def _time_launch(queue, kern, work_shape, local_shape, args, repeats=1):
+    """Return the shortest wall-clock time taken by *repeats* launches of
+    *kern* over *work_shape* with *local_shape*.
+
+    """
+    global_shape = _global_shape(work_shape, local_shape)
+    best = None
+    for _ in xrange(repeats):
+        start = time.time()
+        kern(queue, global_shape, local_shape, *args)
+        queue.finish()
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def _tuned_local_shape(queue, kern, name, work_shape, args=None):
+    """Return the local work size for launching the kernel *kern*, identified
+    by *name*, over *work_shape* on the device associated with *queue*.
+
+    Recorded sizes are read from a file in the OpenCL cache directory keyed by
+    device name and driver version. Otherwise the default local size is used.
+
+    If autotuning is enabled via the DTCWT_OPENCL_AUTOTUNE environment
+    variable, on first use for a particular kernel and class of work shape on
+    a device, a few candidate sizes are benchmarked by launching *kern* once
+    each with *args* and the fastest is recorded so that later processes start
+    with tuned launches. Since this delays the first launch considerably, no
+    sizes are benchmarked if *args* is ``None`` or the result cannot be
+    written to the cache directory.
+
+    """
+    device = queue.device
+    work_shape = tuple(int(x) for x in work_shape)
+    cache = _tuning_cache_for_device(device)
+    key = '{0}:{1}:{2}'.format(name, _kernel_source_hash(kern), _shape_class(work_shape))
+
+    try:
+        local_shape = cache[key]
+    except KeyError:
+        pass
+    else:
+        if local_shape is None:
+            return None
+        # Discard recorded sizes which this build of the kernel cannot launch
+        if int(np.prod(local_shape)) <= _max_local_size(device, kern):
+            return tuple(local_shape)
+        del cache[key]
+
+    path = _tuning_cache_path(device)
+    if args is None or not _autotune_enabled() or path is None or not _is_writable(path):
+        return _default_local_shape(device, work_shape)
+
+    # The first launch of a kernel may include one-off costs such as
+    # transferring the program to the device
+    try:
+        _time_launch(queue, kern, work_shape, _default_local_shape(device, work_shape), args)
+    except cl.Error:
+        pass
+
+    timings = []
+    for local_shape in _candidate_local_shapes(device, kern, work_shape):
+        try:
+            timings.append((_time_launch(queue, kern, work_shape, local_shape, args), local_shape))
+        except cl.Error:
+            # Some devices reject sizes which are otherwise valid for the kernel
+            continue
+    if len(timings) == 0:
+        return _default_local_shape(device, work_shape)
+
+    local_shape = min(timings, key=lambda t: t[0])[1]
+    cache[key] = list(local_shape) if local_shape is not None else None
+
+    # Merge with entries written by other processes since this one started
+    merged = _load_json(path)
+    merged.update(cache)
+    _write_cache_file(path, json.dumps(merged, indent=1, sort_keys=True))
+
+    return local_shape
+
+def _array_spec(X):
+    """Return the packed strides, packed shape and offset, in elements, of
+    the device array *X* in the form expected by ``struct array_spec``.
+
+    """
+    strides = struct.pack('iiii', *(tuple(s//X.dtype.itemsize for s in X.strides) + (0,0,0,0))[:4])
+    shape = struct.pack('iiii', *(tuple(X.shape) + (1,1,1,1))[:4])
+    offset = np.int32(X.offset // X.dtype.itemsize)
+    return strides, shape, offset
+
+def _filter_spec(h, queue):
+    """Return the device buffer, stride, length and offset, in elements, of
+    the filter *h* in the form expected by the kernels.
+
+    """
+    h_device = _filter_to_device(h, queue)
+    return (h_device.base_data,
+            np.int32(h_device.strides[0] // h_device.dtype.itemsize),
+            np.int32(h_device.shape[0]),
+            np.int32(h_device.offset // h_device.dtype.itemsize))
+
+def cube2c(X, queue=None, output=None):
+    """Convert the octets of the 3D real device array *X* into the four complex
+    subbands of a highpass volume. This is the OpenCL equivalent of
+    :py:func:`dtcwt.numpy.transform3d.cube2c`.
+
+    If *output* is non-``None``, it should be a :py:class:`pyopencl.array.Array`
+    instance which the result is written into. This may be a view onto four
+    consecutive subbands of a larger array. If ``None``, an output array is
+    created.
+
+    """
+    _check_cl()
+    queue = to_queue(queue)
+    kern = _cube2c_kernel_for_queue(queue.context)
+
+    if len(X.shape) != 3 or np.any(np.asanyarray(X.shape) % 2 != 0):
+        raise ValueError('X must be 3D with even size in each dimension.')
+
+    output_shape = tuple(n >> 1 for n in X.shape) + (4,)
+
+    # Create output if not specified
+    if output is None:
+        output = cl_array.empty(queue, output_shape, np.complex64)
+
+    if output.shape != output_shape:
+        raise ValueError('Output has shape {0} but {1} is required.'.format(output.shape, output_shape))
+
+    X_device = to_device(X, queue)
+
+    X_strides, X_shape, X_offset = _array_spec(X_device)
+    Y_strides, Y_shape, Y_offset = _array_spec(output)
+
+    _launch(queue, kern, 'cube2c', output_shape[:3],
+            X_device.base_data, X_strides, X_shape, X_offset,
+            output.base_data, Y_strides, Y_shape, Y_offset)
+
+    return output
+
+def c2cube(X, queue=None, output=None):
+    """Convert the four complex subbands of the device array *X* back into
+    octets of a 3D real volume. This is the inverse of :py:func:`cube2c`.
+
+    If *output* is non-``None``, it should be a :py:class:`pyopencl.array.Array`
+    instance which the result is written into. If ``None``, an output array is
+    created.
+
+    """
+    _check_cl()
+    queue = to_queue(queue)
+    kern = _c2cube_kernel_for_queue(queue.context)
+
+    if len(X.shape) != 4 or X.shape[3] != 4:
+        raise ValueError('X must have shape NxMxPx4.')
+
+    output_shape = tuple(n << 1 for n in X.shape[:3])
+
+    # Create output if not specified
+    if output is None:
+        output = cl_array.empty(queue, output_shape, np.float32)
+
+    if output.shape != output_shape:
+        raise ValueError('Output has shape {0} but {1} is required.'.format(output.shape, output_shape))
+
+    X_device = to_device(X, queue, dtype=np.complex64)
+
+    X_strides, X_shape, X_offset = _array_spec(X_device)
+    Y_strides, Y_shape, Y_offset = _array_spec(output)
+
+    _launch(queue, kern, 'c2cube', X_device.shape[:3],
+            X_device.base_data, X_strides, X_shape, X_offset,
+            output.base_data, Y_strides, Y_shape, Y_offset)
+
+    return output
+
+def pad_edge(X, pad_width, queue=None, output=None):
+    """Extend the device array *X* by repeating its edge samples. *pad_width*
+    is a sequence giving a (before, after) pair of sample counts for each axis
+    of *X* in the same manner as :py:func:`numpy.pad` with ``mode='edge'``.
+    The extension is performed entirely on the device.
+
+    If *output* is non-``None``, it should be a :py:class:`pyopencl.array.Array`
+    instance which the result is written into. If ``None``, an output array is
+    created.
+
+    """
+    _check_cl()
+    queue = to_queue(queue)
+    kern = _pad_edge_kernel_for_queue(queue.context)
+
+    if len(pad_width) != len(X.shape):
+        raise ValueError('There must be one pair of pad widths for each axis of X.')
+
+    pad_before = tuple(int(before) for before, _ in pad_width)
+    output_shape = tuple(int(n + before + after) for n, (before, after) in zip(X.shape, pad_width))
+
+    # Create output if not specified
+    if output is None:
+        output = cl_array.empty(queue, output_shape, np.float32)
+
+    if output.shape != output_shape:
+        raise ValueError('Output has shape {0} but {1} is required.'.format(output.shape, output_shape))
+
+    # If necessary, convert X
+    X_device = to_device(X, queue)
+
+    # Work out size of work group. Each work item writes one output sample.
+    work_shape = np.array(output.shape[:3])
+
+    X_strides = struct.pack('iiii', *(tuple(s//X_device.dtype.itemsize for s in X_device.strides) + (0,0,0,0))[:4])
+    X_shape = struct.pack('iiii', *(tuple(X_device.shape) + (1,1,1,1))[:4])
+    X_offset = np.int32(X_device.offset // X_device.dtype.itemsize)
+
+    pad = struct.pack('iiii', *(pad_before + (0,0,0,0))[:4])
+
+    Y_strides = struct.pack('iiii', *(tuple(s//output.dtype.itemsize for s in output.strides) + (0,0,0,0))[:4])
+    Y_shape = struct.pack('iiii', *(tuple(output.shape) + (1,1,1,1))[:4])
+    Y_offset = np.int32(output.offset // output.dtype.itemsize)
+
+    # Perform actual extension
+    _launch(queue, kern, 'pad_edge', work_shape,
+            X_device.base_data, X_strides, X_shape, X_offset,
+            pad,
+            output.base_data, Y_strides, Y_shape, Y_offset)
+
+    return output
+
+def _program_cache_path(source, device):
+    directory = _cache_dir()
+    if directory is None:
+        return None
+    name = _hash_hex(source, _device_cache_name(device))
+    return os.path.join(directory, 'programs', '{0}.bin'.format(name))
+
+def _load_program_binary(path):
+    if path is None:
+        return None
+    try:
+        with open(path, 'rb') as f:
+            return f.read() or None
+    except (IOError, OSError):
+        return None
+
+# Map from the handle of each program built by _build_program to a hash of its
+# source. Programs are held by the memoized kernel builders and so handles are
+# not reused.
+_program_source_hashes = {}
+
+def _build_program(context, source):
+    """Return a built :py:class:`pyopencl.Program` for *source* on the devices
+    of *context*.
+
+    Compiled program binaries are saved in the OpenCL cache directory keyed by
+    a hash of the source, device name and driver version. If binaries are
+    present for every device, they are loaded instead of compiling *source*.
+    Should the binaries fail to load or build, for example after a driver
+    update which did not change the version string, the program is compiled
+    from source and the cache is refreshed.
+
+    """
+    devices = context.devices
+    paths = list(_program_cache_path(source, device) for device in devices)
+    binaries = list(_load_program_binary(path) for path in paths)
+    source_hash = _hash_hex(source)[:12]
+
+    if all(b is not None for b in binaries):
+        try:
+            program = cl.Program(context, devices, binaries).build()
+            _program_source_hashes[program.int_ptr] = source_hash
+            return program
+        except cl.Error as e:
+            logging.info('Rebuilding OpenCL program with unusable cached binary: {0}'.format(e))
+
+    program = cl.Program(context, source).build()
+    _program_source_hashes[program.int_ptr] = source_hash
+
+    if any(path is not None for path in paths):
+        program_devices = program.get_info(cl.program_info.DEVICES)
+        program_binaries = program.get_info(cl.program_info.BINARIES)
+        for device, binary in zip(program_devices, program_binaries):
+            path = _program_cache_path(source, device)
+            if path is not None and binary:
+                _write_cache_file(path, bytes(binary), mode='wb')
+
+    return program
+
+@memoize
+def _filter_cache_for_context(context):
+    """Return a dictionary mapping filter coefficients to the corresponding
+    device arrays in *context*. The return values are memoized.
+
+    """
+    return {}
+
 @memoize
 def _convolve_kernel_for_queue(context):
     """Return a kernel for convolution suitable for use with *context*. The
     return values are memoized.
 
     """
-    kern_prog = cl.Program(context, CL_ARRAY_HEADER + CONVOLVE_KERNEL)
-    kern_prog.build()
+    kern_prog = _build_program(context, CL_ARRAY_HEADER + CONVOLVE_KERNEL)
     return kern_prog.convolve_kernel
 
 @memoize
@@ -356,8 +1306,7 @@ def _dfilter_kernel_for_queue(context):
     return values are memoized.
 
     """
-    kern_prog = cl.Program(context, CL_ARRAY_HEADER + DFILTER_KERNEL)
-    kern_prog.build()
+    kern_prog = _build_program(context, CL_ARRAY_HEADER + DFILTER_KERNEL)
     return kern_prog.convolve_kernel
 
 @memoize
@@ -366,8 +1315,7 @@ def _ifilter_kernel_for_queue(context):
     return values are memoized.
 
     """
-    kern_prog = cl.Program(context, CL_ARRAY_HEADER + IFILTER_KERNEL)
-    kern_prog.build()
+    kern_prog = _build_program(context, CL_ARRAY_HEADER + IFILTER_KERNEL)
     return kern_prog.convolve_kernel
 
 @memoize
@@ -376,10 +1324,60 @@ def _q2c_kernel_for_queue(context):
     return values are memoized.
 
     """
-    kern_prog = cl.Program(context, CL_ARRAY_HEADER + Q2C_KERNEL)
-    kern_prog.build()
+    kern_prog = _build_program(context, CL_ARRAY_HEADER + Q2C_KERNEL)
     return kern_prog.q2c_kernel
 
+@memoize
+def _c2q_kernel_for_queue(context):
+    """Return a kernel for convolution suitable for use with *context*. The
+    return values are memoized.
+
+    """
+    kern_prog = _build_program(context, CL_ARRAY_HEADER + C2Q_KERNEL)
+    return kern_prog.c2q_kernel
+
+@memoize
+def _level_kernels_for_queue(context, decimate):
+    """Return a tuple of the column filter bank and row filter/q2c kernels for
+    one level of the 2D forward transform suitable for use with *context*. If
+    *decimate* is ``True``, the kernels are for levels 2 and greater. The return
+    values are memoized.
+
+    """
+    if decimate:
+        source = CL_ARRAY_HEADER + DFILTER_KERNEL + Q2C_KERNEL + LEVELN_KERNEL + ROWS_Q2C_KERNEL
+    else:
+        source = CL_ARRAY_HEADER + CONVOLVE_KERNEL + Q2C_KERNEL + LEVEL1_KERNEL + ROWS_Q2C_KERNEL
+    kern_prog = _build_program(context, source)
+    return kern_prog.columns_kernel, kern_prog.rows_q2c_kernel
+
+@memoize
+def _cube2c_kernel_for_queue(context):
+    """Return a kernel for octet to complex conversion suitable for use with
+    *context*. The return values are memoized.
+
+    """
+    kern_prog = _build_program(context, CL_ARRAY_HEADER + CUBE2C_KERNEL)
+    return kern_prog.cube2c_kernel
+
+@memoize
+def _c2cube_kernel_for_queue(context):
+    """Return a kernel for complex to octet conversion suitable for use with
+    *context*. The return values are memoized.
+
+    """
+    kern_prog = _build_program(context, CL_ARRAY_HEADER + C2CUBE_KERNEL)
+    return kern_prog.c2cube_kernel
+
+@memoize
+def _pad_edge_kernel_for_queue(context):
+    """Return a kernel for edge extension suitable for use with *context*. The
+    return values are memoized.
+
+    """
+    kern_prog = _build_program(context, CL_ARRAY_HEADER + PAD_EDGE_KERNEL)
+    return kern_prog.pad_edge_kernel
+
 # Functions to access OpenCL Arrays within a kernel
 CL_ARRAY_HEADER = '''
 struct array_spec
@@ -409,23 +1407,13 @@ int4 reflect(int4 x, int4 x_min, int4 x_max)
 '''
 
 CONVOLVE_KERNEL = '''
-void __kernel convolve_kernel(
-    const __global float* X, int4 X_strides, int4 X_shape, int X_offset,
+// Return the result of convolving X with h at output_coord along the axis for
+// which one_px_advance is set.
+inline float convolve_sample(
+    const __global float* X, struct array_spec X_spec,
     const __global float* h, int h_stride, int h_shape, int h_offset,
-    __global float* Y, int4 Y_strides, int4 Y_shape, int Y_offset,
-    int axis)
+    int4 output_coord, int4 one_px_advance)
 {
-    int4 output_coord = { get_global_id(0), get_global_id(1), get_global_id(2), 0 };
-    struct array_spec X_spec = { .strides = X_strides, .shape = X_shape, .offset = X_offset };
-    struct array_spec Y_spec = { .strides = Y_strides, .shape = Y_shape, .offset = Y_offset };
-
-    if(any(output_coord >= Y_spec.shape))
-        return;
-
-    // A vector of flags with the convolution direction set
-    int4 axis_flag = (int4)(axis,axis,axis,axis) == (int4)(0,1,2,3);
-    int4 one_px_advance = select((int4)(0,0,0,0), (int4)(1,1,1,1), axis_flag);
-
     float output = 0;
 
     int4 coord_min = { 0, 0, 0, 0 };
@@ -437,36 +1425,42 @@ void __kernel convolve_kernel(
         output += h[h_offset + d*h_stride] * X[coord_to_offset(sample_coord, X_spec)];
     }
 
-    Y[coord_to_offset(output_coord, Y_spec)] = output;
+    return output;
 }
-'''
 
-DFILTER_KERNEL = '''
 void __kernel convolve_kernel(
     const __global float* X, int4 X_strides, int4 X_shape, int X_offset,
     const __global float* h, int h_stride, int h_shape, int h_offset,
     __global float* Y, int4 Y_strides, int4 Y_shape, int Y_offset,
     int axis)
 {
-    int4 global_coord = { get_global_id(0), get_global_id(1), get_global_id(2), 0 };
+    int4 output_coord = { get_global_id(0), get_global_id(1), get_global_id(2), 0 };
     struct array_spec X_spec = { .strides = X_strides, .shape = X_shape, .offset = X_offset };
     struct array_spec Y_spec = { .strides = Y_strides, .shape = Y_shape, .offset = Y_offset };
 
+    if(any(output_coord >= Y_spec.shape))
+        return;
+
     // A vector of flags with the convolution direction set
     int4 axis_flag = (int4)(axis,axis,axis,axis) == (int4)(0,1,2,3);
-
-    // Each run of this kernel outputs *two* pixels: the result of convolving
-    // 'odd' samples (0, 2, 4, ...) with h and the result of convolving 'even'
-    // samples (1, 3, 5, ... ) with reverse(h).
-
-    // Compute the base output co-ordinate and a vector which has 1 set in the
-    // component corresponding to *axis*.
-    int4 output_coord = select(global_coord, global_coord * 2, axis_flag);
     int4 one_px_advance = select((int4)(0,0,0,0), (int4)(1,1,1,1), axis_flag);
 
-    if(any(output_coord >= Y_shape))
-        return;
+    Y[coord_to_offset(output_coord, Y_spec)] = convolve_sample(
+        X, X_spec, h, h_stride, h_shape, h_offset, output_coord, one_px_advance);
+}
+'''
 
+DFILTER_KERNEL = '''
+// Return the pair of decimated outputs at global_coord*2 and global_coord*2+1
+// along the axis for which axis_flag is set. The first output is the result of
+// convolving 'odd' samples (0, 2, 4, ...) with h and the second the result of
+// convolving 'even' samples (1, 3, 5, ... ) with reverse(h).
+inline float2 dfilter_pair(
+    const __global float* X, struct array_spec X_spec,
+    const __global float* h, int h_stride, int h_shape, int h_offset,
+    int4 global_coord, int4 axis_flag)
+{
+    int4 one_px_advance = select((int4)(0,0,0,0), (int4)(1,1,1,1), axis_flag);
     int4 X_coord = select(global_coord, global_coord * 4, axis_flag);
 
     int4 coord_min = { 0, 0, 0, 0 };
@@ -508,6 +1502,33 @@ void __kernel convolve_kernel(
         output = output.s10;
     }
 
+    return output;
+}
+
+void __kernel convolve_kernel(
+    const __global float* X, int4 X_strides, int4 X_shape, int X_offset,
+    const __global float* h, int h_stride, int h_shape, int h_offset,
+    __global float* Y, int4 Y_strides, int4 Y_shape, int Y_offset,
+    int axis)
+{
+    int4 global_coord = { get_global_id(0), get_global_id(1), get_global_id(2), 0 };
+    struct array_spec X_spec = { .strides = X_strides, .shape = X_shape, .offset = X_offset };
+    struct array_spec Y_spec = { .strides = Y_strides, .shape = Y_shape, .offset = Y_offset };
+
+    // A vector of flags with the convolution direction set
+    int4 axis_flag = (int4)(axis,axis,axis,axis) == (int4)(0,1,2,3);
+
+    // Each run of this kernel outputs *two* pixels. Compute the base output
+    // co-ordinate and a vector which has 1 set in the component corresponding
+    // to *axis*.
+    int4 output_coord = select(global_coord, global_coord * 2, axis_flag);
+    int4 one_px_advance = select((int4)(0,0,0,0), (int4)(1,1,1,1), axis_flag);
+
+    if(any(output_coord >= Y_shape))
+        return;
+
+    float2 output = dfilter_pair(X, X_spec, h, h_stride, h_shape, h_offset, global_coord, axis_flag);
+
     Y[coord_to_offset(output_coord, Y_spec)] = output.s0;
     Y[coord_to_offset(output_coord + one_px_advance, Y_spec)] = output.s1;
 }
@@ -542,28 +1563,29 @@ void __kernel convolve_kernel(
 
     float4 output = { 0, 0, 0, 0 };
 
+    // The filters are ha = h and hb = reverse(h). As in colifilt, the sign of
+    // ha.hb determines which of each pair of input samples is filtered by ha
+    // and which by hb.
     float ha_dot_hb = 0.f;
     for(int i=0; i<h_shape; ++i) {
         ha_dot_hb += h[h_offset + i*h_stride] * h[h_offset + (h_shape - 1 - i)*h_stride];
     }
-    bool flip_output = ha_dot_hb > 0.f;
+    int da = (ha_dot_hb > 0.f) ? 0 : 1;
+    int db = 1 - da;
 
+    // Offsets of the input samples for each output, relative to m - 2*d.
     int m = h_shape>>1;
-    int4 offsets = (m % 2 == 0) ? (int4)(-1,-2,1,0) : (int4)(1,0,1,0);
+    int4 offsets = (m % 2 == 0) ? (int4)(-1-db, -1-da, 1-db, 1-da) : (int4)(-db, -da, -db, -da);
     for(int d=0; d<m; ++d) {
-        int X_offset = 2*((m>>1)-d);
+        int X_offset = m - 2*d;
 
-        float4 h_samples = {
-            h[h_offset + (d*2)*h_stride],                   // ha odd
-            h[h_offset + (h_shape-1-d*2)*h_stride],         // hb odd
-            h[h_offset + (1+(d*2))*h_stride],               // ha even
-            h[h_offset + (h_shape-1-(1+(d*2)))*h_stride],   // hb even
-        };
+        float hao = h[h_offset + (d*2)*h_stride];
+        float hae = h[h_offset + (1+d*2)*h_stride];
+        float hbo = h[h_offset + (h_shape-1-d*2)*h_stride];
+        float hbe = h[h_offset + (h_shape-2-d*2)*h_stride];
 
-        // swap odd and even samples of h if length of h is not multiple of 4
-        if(m % 2 == 0) {
-            h_samples = h_samples.zwxy;
-        }
+        // The odd and even filter taps are interchanged if m is even
+        float4 h_samples = (m % 2 == 0) ? (float4)(hae, hbe, hao, hbo) : (float4)(hao, hbo, hae, hbe);
 
         float4 X_samples = {
             X[coord_to_offset(reflect(X_coord + (X_offset+offsets.s0)*one_px_advance, coord_min, coord_max), X_spec)],
@@ -575,10 +1597,6 @@ void __kernel convolve_kernel(
         output += X_samples * h_samples;
     }
 
-    if(flip_output) {
-        output = output.yxwz;
-    }
-
     Y[coord_to_offset(output_coord, Y_spec)] = output.s0;
     Y[coord_to_offset(output_coord + one_px_advance, Y_spec)] = output.s1;
     Y[coord_to_offset(output_coord + 2*one_px_advance, Y_spec)] = output.s2;
@@ -587,6 +1605,45 @@ void __kernel convolve_kernel(
 '''
 
 Q2C_KERNEL = '''
+// Convert the quads of pixels X1, X2 and X3, each given in the order
+//  a----b
+//  |    |
+//  |    |
+//  c----d
+// into complex subbands and write them to the six subbands of Y at Y_coord.
+inline void q2c_write(__global float2* Y, struct array_spec Y_spec, int4 Y_coord,
+    float4 X1_samples, float4 X2_samples, float4 X3_samples)
+{
+    X1_samples *= (float)sqrt(0.5);
+    X2_samples *= (float)sqrt(0.5);
+    X3_samples *= (float)sqrt(0.5);
+
+    float2 z1a = { X1_samples.x - X1_samples.w, X1_samples.y + X1_samples.z };
+    float2 z1b = { X1_samples.x + X1_samples.w, X1_samples.y - X1_samples.z };
+    float2 z2a = { X2_samples.x - X2_samples.w, X2_samples.y + X2_samples.z };
+    float2 z2b = { X2_samples.x + X2_samples.w, X2_samples.y - X2_samples.z };
+    float2 z3a = { X3_samples.x - X3_samples.w, X3_samples.y + X3_samples.z };
+    float2 z3b = { X3_samples.x + X3_samples.w, X3_samples.y - X3_samples.z };
+
+    Y[coord_to_offset(Y_coord + (int4)(0,0,0,0), Y_spec)] = z1a;
+    Y[coord_to_offset(Y_coord + (int4)(0,0,1,0), Y_spec)] = z3a;
+    Y[coord_to_offset(Y_coord + (int4)(0,0,2,0), Y_spec)] = z2a;
+    Y[coord_to_offset(Y_coord + (int4)(0,0,3,0), Y_spec)] = z2b;
+    Y[coord_to_offset(Y_coord + (int4)(0,0,4,0), Y_spec)] = z3b;
+    Y[coord_to_offset(Y_coord + (int4)(0,0,5,0), Y_spec)] = z1b;
+}
+
+// Read the quad of pixels with top-left corner at X_coord.
+inline float4 read_quad(const __global float* X, struct array_spec X_spec, int4 X_coord)
+{
+    return (float4)(
+        X[coord_to_offset(X_coord,                   X_spec)], // a
+        X[coord_to_offset(X_coord + (int4)(0,1,0,0), X_spec)], // b
+        X[coord_to_offset(X_coord + (int4)(1,0,0,0), X_spec)], // c
+        X[coord_to_offset(X_coord + (int4)(1,1,0,0), X_spec)]  // d
+    );
+}
+
 void __kernel q2c_kernel(
     int4 X_shape,
     const __global float* X1, int4 X1_strides, int X1_offset,
@@ -600,55 +1657,311 @@ void __kernel q2c_kernel(
     struct array_spec X3_spec = { .strides = X3_strides, .shape = X_shape, .offset = X3_offset };
     struct array_spec Y_spec = { .strides = Y_strides, .shape = Y_shape, .offset = Y_offset };
 
+    // The third global index selects an image within a stack. Images are
+    // indexed by the third axis of X and the fourth axis of Y.
     int4 X_coord = global_coord * (int4)(2,2,1,1);
-    int4 Y_coord = global_coord;
+    int4 Y_coord = (int4)(global_coord.x, global_coord.y, 0, global_coord.z);
 
     if(any(Y_coord >= Y_shape) || any(X_coord >= X_shape))
         return;
 
-    // Arrange pixels from the corners of the quads into
-    // 2 subimages of alternate real and imag pixels.
-    //  a----b
-    //  |    |
-    //  |    |
-    //  c----d
+    q2c_write(Y, Y_spec, Y_coord,
+        read_quad(X1, X1_spec, X_coord),
+        read_quad(X2, X2_spec, X_coord),
+        read_quad(X3, X3_spec, X_coord));
+}
+'''
 
-    float4 X1_samples = {
-        X1[coord_to_offset(X_coord,                   X1_spec)], // a
-        X1[coord_to_offset(X_coord + (int4)(0,1,0,0), X1_spec)], // b
-        X1[coord_to_offset(X_coord + (int4)(1,0,0,0), X1_spec)], // c
-        X1[coord_to_offset(X_coord + (int4)(1,1,0,0), X1_spec)], // d
-    };
-    X1_samples *= (float)sqrt(0.5);
+C2Q_KERNEL = '''
+// Write the quad of pixels at Y_coord recovered from the complex subband
+// samples w1 and w2.
+//  a----b
+//  |    |
+//  |    |
+//  c----d
+inline void write_quad(__global float* Y, struct array_spec Y_spec, int4 Y_coord, float2 w1, float2 w2)
+{
+    float2 P = w1 + w2;
+    float2 Q = w1 - w2;
 
-    float4 X2_samples = {
-        X2[coord_to_offset(X_coord,                   X2_spec)], // a
-        X2[coord_to_offset(X_coord + (int4)(0,1,0,0), X2_spec)], // b
-        X2[coord_to_offset(X_coord + (int4)(1,0,0,0), X2_spec)], // c
-        X2[coord_to_offset(X_coord + (int4)(1,1,0,0), X2_spec)], // d
-    };
-    X2_samples *= (float)sqrt(0.5);
+    Y[coord_to_offset(Y_coord,                   Y_spec)] = P.x;  // a
+    Y[coord_to_offset(Y_coord + (int4)(0,1,0,0), Y_spec)] = P.y;  // b
+    Y[coord_to_offset(Y_coord + (int4)(1,0,0,0), Y_spec)] = Q.y;  // c
+    Y[coord_to_offset(Y_coord + (int4)(1,1,0,0), Y_spec)] = -Q.x; // d
+}
 
-    float4 X3_samples = {
-        X3[coord_to_offset(X_coord,                   X3_spec)], // a
-        X3[coord_to_offset(X_coord + (int4)(0,1,0,0), X3_spec)], // b
-        X3[coord_to_offset(X_coord + (int4)(1,0,0,0), X3_spec)], // c
-        X3[coord_to_offset(X_coord + (int4)(1,1,0,0), X3_spec)], // d
-    };
-    X3_samples *= (float)sqrt(0.5);
+void __kernel c2q_kernel(
+    const __global float2* X, int4 X_strides, int4 X_shape, int X_offset,
+    float gain0, float gain1, float gain2, float gain3, float gain4, float gain5,
+    int4 Y_shape,
+    __global float* Y1, int4 Y1_strides, int Y1_offset,
+    __global float* Y2, int4 Y2_strides, int Y2_offset,
+    __global float* Y3, int4 Y3_strides, int Y3_offset)
+{
+    int4 global_coord = { get_global_id(0), get_global_id(1), 0, 0 };
+    struct array_spec X_spec = { .strides = X_strides, .shape = X_shape, .offset = X_offset };
+    struct array_spec Y1_spec = { .strides = Y1_strides, .shape = Y_shape, .offset = Y1_offset };
+    struct array_spec Y2_spec = { .strides = Y2_strides, .shape = Y_shape, .offset = Y2_offset };
+    struct array_spec Y3_spec = { .strides = Y3_strides, .shape = Y_shape, .offset = Y3_offset };
 
-    float2 z1a = { X1_samples.x - X1_samples.w, X1_samples.y + X1_samples.z };
-    float2 z1b = { X1_samples.x + X1_samples.w, X1_samples.y - X1_samples.z };
-    float2 z2a = { X2_samples.x - X2_samples.w, X2_samples.y + X2_samples.z };
-    float2 z2b = { X2_samples.x + X2_samples.w, X2_samples.y - X2_samples.z };
-    float2 z3a = { X3_samples.x - X3_samples.w, X3_samples.y + X3_samples.z };
-    float2 z3b = { X3_samples.x + X3_samples.w, X3_samples.y - X3_samples.z };
+    int4 X_coord = global_coord;
+    int4 Y_coord = global_coord * (int4)(2,2,1,1);
 
-    Y[coord_to_offset(Y_coord + (int4)(0,0,0,0), Y_spec)] = z1a;
-    Y[coord_to_offset(Y_coord + (int4)(0,0,1,0), Y_spec)] = z3a;
-    Y[coord_to_offset(Y_coord + (int4)(0,0,2,0), Y_spec)] = z2a;
-    Y[coord_to_offset(Y_coord + (int4)(0,0,3,0), Y_spec)] = z2b;
-    Y[coord_to_offset(Y_coord + (int4)(0,0,4,0), Y_spec)] = z3b;
-    Y[coord_to_offset(Y_coord + (int4)(0,0,5,0), Y_spec)] = z1b;
+    if(any(X_coord >= X_shape) || any(Y_coord >= Y_shape))
+        return;
+
+    float sc = (float)sqrt(0.5);
+
+    // Subbands in the order written by q2c_kernel
+    float2 z1a = X[coord_to_offset(X_coord + (int4)(0,0,0,0), X_spec)] * (gain0 * sc);
+    float2 z3a = X[coord_to_offset(X_coord + (int4)(0,0,1,0), X_spec)] * (gain1 * sc);
+    float2 z2a = X[coord_to_offset(X_coord + (int4)(0,0,2,0), X_spec)] * (gain2 * sc);
+    float2 z2b = X[coord_to_offset(X_coord + (int4)(0,0,3,0), X_spec)] * (gain3 * sc);
+    float2 z3b = X[coord_to_offset(X_coord + (int4)(0,0,4,0), X_spec)] * (gain4 * sc);
+    float2 z1b = X[coord_to_offset(X_coord + (int4)(0,0,5,0), X_spec)] * (gain5 * sc);
+
+    write_quad(Y1, Y1_spec, Y_coord, z1a, z1b);
+    write_quad(Y2, Y2_spec, Y_coord, z2a, z2b);
+    write_quad(Y3, Y3_spec, Y_coord, z3a, z3b);
+}
+'''
+
+# Kernels for a whole level of the 2D forward transform. The level 1 kernels
+# require CONVOLVE_KERNEL and Q2C_KERNEL to be part of the same program and the
+# level 2 or greater kernels require DFILTER_KERNEL and Q2C_KERNEL.
+#
+# columns_kernel filters the columns of X with two or three filters in one pass.
+# rows_q2c_kernel filters the rows of the column-filtered images and writes the
+# lowpass image and the six complex subbands directly. Each work item handles
+# one quad of the output.
+LEVEL1_KERNEL = '''
+// Filter the rows of X at each pixel of the quad with top-left corner at coord.
+inline float4 filter_quad(
+    const __global float* X, struct array_spec X_spec,
+    const __global float* h, int h_stride, int h_shape, int h_offset,
+    int4 coord)
+{
+    int4 one_px_advance = { 0, 1, 0, 0 };
+    return (float4)(
+        convolve_sample(X, X_spec, h, h_stride, h_shape, h_offset, coord,                   one_px_advance),
+        convolve_sample(X, X_spec, h, h_stride, h_shape, h_offset, coord + (int4)(0,1,0,0), one_px_advance),
+        convolve_sample(X, X_spec, h, h_stride, h_shape, h_offset, coord + (int4)(1,0,0,0), one_px_advance),
+        convolve_sample(X, X_spec, h, h_stride, h_shape, h_offset, coord + (int4)(1,1,0,0), one_px_advance)
+    );
+}
+
+void __kernel columns_kernel(
+    const __global float* X, int4 X_strides, int4 X_shape, int X_offset,
+    const __global float* h0, int h0_stride, int h0_shape, int h0_offset,
+    const __global float* h1, int h1_stride, int h1_shape, int h1_offset,
+    const __global float* h2, int h2_stride, int h2_shape, int h2_offset,
+    int n_outputs, int4 Y_strides, int4 Y_shape,
+    __global float* Y0, int Y0_offset,
+    __global float* Y1, int Y1_offset,
+    __global float* Y2, int Y2_offset)
+{
+    int4 coord = { get_global_id(0), get_global_id(1), get_global_id(2), 0 };
+    struct array_spec X_spec = { .strides = X_strides, .shape = X_shape, .offset = X_offset };
+    struct array_spec Y0_spec = { .strides = Y_strides, .shape = Y_shape, .offset = Y0_offset };
+    struct array_spec Y1_spec = { .strides = Y_strides, .shape = Y_shape, .offset = Y1_offset };
+    struct array_spec Y2_spec = { .strides = Y_strides, .shape = Y_shape, .offset = Y2_offset };
+
+    if(any(coord >= Y_shape))
+        return;
+
+    int4 one_px_advance = { 1, 0, 0, 0 };
+    Y0[coord_to_offset(coord, Y0_spec)] = convolve_sample(X, X_spec, h0, h0_stride, h0_shape, h0_offset, coord, one_px_advance);
+    Y1[coord_to_offset(coord, Y1_spec)] = convolve_sample(X, X_spec, h1, h1_stride, h1_shape, h1_offset, coord, one_px_advance);
+    if(n_outputs > 2)
+        Y2[coord_to_offset(coord, Y2_spec)] = convolve_sample(X, X_spec, h2, h2_stride, h2_shape, h2_offset, coord, one_px_advance);
+}
+'''
+
+LEVELN_KERNEL = '''
+// Filter the rows of X giving the quad of pixels with top-left corner at
+// coord in the decimated output.
+inline float4 filter_quad(
+    const __global float* X, struct array_spec X_spec,
+    const __global float* h, int h_stride, int h_shape, int h_offset,
+    int4 coord)
+{
+    int4 axis_flag = (int4)(1,1,1,1) == (int4)(0,1,2,3);
+    int4 pair_coord = coord * (int4)(1,0,1,1) + (int4)(0,coord.y>>1,0,0);
+    float2 top = dfilter_pair(X, X_spec, h, h_stride, h_shape, h_offset, pair_coord, axis_flag);
+    float2 bottom = dfilter_pair(X, X_spec, h, h_stride, h_shape, h_offset, pair_coord + (int4)(1,0,0,0), axis_flag);
+    return (float4)(top, bottom);
+}
+
+void __kernel columns_kernel(
+    const __global float* X, int4 X_strides, int4 X_shape, int X_offset,
+    const __global float* h0, int h0_stride, int h0_shape, int h0_offset,
+    const __global float* h1, int h1_stride, int h1_shape, int h1_offset,
+    const __global float* h2, int h2_stride, int h2_shape, int h2_offset,
+    int n_outputs, int4 Y_strides, int4 Y_shape,
+    __global float* Y0, int Y0_offset,
+    __global float* Y1, int Y1_offset,
+    __global float* Y2, int Y2_offset)
+{
+    int4 global_coord = { get_global_id(0), get_global_id(1), get_global_id(2), 0 };
+    struct array_spec X_spec = { .strides = X_strides, .shape = X_shape, .offset = X_offset };
+    struct array_spec Y0_spec = { .strides = Y_strides, .shape = Y_shape, .offset = Y0_offset };
+    struct array_spec Y1_spec = { .strides = Y_strides, .shape = Y_shape, .offset = Y1_offset };
+    struct array_spec Y2_spec = { .strides = Y_strides, .shape = Y_shape, .offset = Y2_offset };
+
+    // Each work item writes a pair of samples in each column.
+    int4 axis_flag = (int4)(0,0,0,0) == (int4)(0,1,2,3);
+    int4 coord = global_coord * (int4)(2,1,1,1);
+    int4 next = coord + (int4)(1,0,0,0);
+
+    if(any(coord >= Y_shape))
+        return;
+
+    float2 y = dfilter_pair(X, X_spec, h0, h0_stride, h0_shape, h0_offset, global_coord, axis_flag);
+    Y0[coord_to_offset(coord, Y0_spec)] = y.s0;
+    Y0[coord_to_offset(next, Y0_spec)] = y.s1;
+
+    y = dfilter_pair(X, X_spec, h1, h1_stride, h1_shape, h1_offset, global_coord, axis_flag);
+    Y1[coord_to_offset(coord, Y1_spec)] = y.s0;
+    Y1[coord_to_offset(next, Y1_spec)] = y.s1;
+
+    if(n_outputs > 2) {
+        y = dfilter_pair(X, X_spec, h2, h2_stride, h2_shape, h2_offset, global_coord, axis_flag);
+        Y2[coord_to_offset(coord, Y2_spec)] = y.s0;
+        Y2[coord_to_offset(next, Y2_spec)] = y.s1;
+    }
+}
+'''
+
+ROWS_Q2C_KERNEL = '''
+void __kernel rows_q2c_kernel(
+    int4 X_strides, int4 X_shape,
+    const __global float* Lo, int Lo_offset,
+    const __global float* Hi, int Hi_offset,
+    const __global float* D, int D_offset,
+    const __global float* h0, int h0_stride, int h0_shape, int h0_offset,
+    const __global float* h1, int h1_stride, int h1_shape, int h1_offset,
+    const __global float* hd, int hd_stride, int hd_shape, int hd_offset,
+    __global float* LoLo, int4 LoLo_strides, int4 LoLo_shape, int LoLo_offset,
+    __global float2* Yh, int4 Yh_strides, int4 Yh_shape, int Yh_offset)
+{
+    int4 global_coord = { get_global_id(0), get_global_id(1), get_global_id(2), 0 };
+    struct array_spec Lo_spec = { .strides = X_strides, .shape = X_shape, .offset = Lo_offset };
+    struct array_spec Hi_spec = { .strides = X_strides, .shape = X_shape, .offset = Hi_offset };
+    struct array_spec D_spec = { .strides = X_strides, .shape = X_shape, .offset = D_offset };
+    struct array_spec LoLo_spec = { .strides = LoLo_strides, .shape = LoLo_shape, .offset = LoLo_offset };
+    struct array_spec Yh_spec = { .strides = Yh_strides, .shape = Yh_shape, .offset = Yh_offset };
+
+    // The third global index selects an image within a stack.
+    int4 coord = global_coord * (int4)(2,2,1,1);
+    int4 Yh_coord = (int4)(global_coord.x, global_coord.y, 0, global_coord.z);
+
+    if(any(coord >= LoLo_shape) || any(Yh_coord >= Yh_shape))
+        return;
+
+    float4 lolo = filter_quad(Lo, Lo_spec, h0, h0_stride, h0_shape, h0_offset, coord);
+    LoLo[coord_to_offset(coord,                   LoLo_spec)] = lolo.s0;
+    LoLo[coord_to_offset(coord + (int4)(0,1,0,0), LoLo_spec)] = lolo.s1;
+    LoLo[coord_to_offset(coord + (int4)(1,0,0,0), LoLo_spec)] = lolo.s2;
+    LoLo[coord_to_offset(coord + (int4)(1,1,0,0), LoLo_spec)] = lolo.s3;
+
+    q2c_write(Yh, Yh_spec, Yh_coord,
+        filter_quad(Hi, Hi_spec, h0, h0_stride, h0_shape, h0_offset, coord),
+        filter_quad(Lo, Lo_spec, h1, h1_stride, h1_shape, h1_offset, coord),
+        filter_quad(D, D_spec, hd, hd_stride, hd_shape, hd_offset, coord));
+}
+'''
+
+PAD_EDGE_KERNEL = '''
+void __kernel pad_edge_kernel(
+    const __global float* X, int4 X_strides, int4 X_shape, int X_offset,
+    int4 pad_before,
+    __global float* Y, int4 Y_strides, int4 Y_shape, int Y_offset)
+{
+    int4 Y_coord = { get_global_id(0), get_global_id(1), get_global_id(2), 0 };
+    struct array_spec X_spec = { .strides = X_strides, .shape = X_shape, .offset = X_offset };
+    struct array_spec Y_spec = { .strides = Y_strides, .shape = Y_shape, .offset = Y_offset };
+
+    if(any(Y_coord >= Y_spec.shape))
+        return;
+
+    // Samples outside of X take the value of the nearest edge sample
+    int4 X_coord = clamp(Y_coord - pad_before, (int4)(0,0,0,0), X_spec.shape - (int4)(1,1,1,1));
+
+    Y[coord_to_offset(Y_coord, Y_spec)] = X[coord_to_offset(X_coord, X_spec)];
+}
+'''
+
+CUBE2C_KERNEL = '''
+void __kernel cube2c_kernel(
+    const __global float* X, int4 X_strides, int4 X_shape, int X_offset,
+    __global float2* Y, int4 Y_strides, int4 Y_shape, int Y_offset)
+{
+    int4 Y_coord = { get_global_id(0), get_global_id(1), get_global_id(2), 0 };
+    struct array_spec X_spec = { .strides = X_strides, .shape = X_shape, .offset = X_offset };
+    struct array_spec Y_spec = { .strides = Y_strides, .shape = Y_shape, .offset = Y_offset };
+
+    int4 X_coord = Y_coord * (int4)(2,2,2,1);
+
+    if(any(Y_coord >= Y_spec.shape) || any(X_coord >= X_spec.shape))
+        return;
+
+    // Arrange pixels from the corners of the octets into
+    // 4 subbands of complex pixels.
+    //    e----f
+    //   /|   /|
+    //  a----b |
+    //  | g- | h
+    //  |/   |/
+    //  c----d
+    float A = X[coord_to_offset(X_coord + (int4)(0,0,0,0), X_spec)];
+    float B = X[coord_to_offset(X_coord + (int4)(0,1,0,0), X_spec)];
+    float C = X[coord_to_offset(X_coord + (int4)(1,0,0,0), X_spec)];
+    float D = X[coord_to_offset(X_coord + (int4)(1,1,0,0), X_spec)];
+    float E = X[coord_to_offset(X_coord + (int4)(0,0,1,0), X_spec)];
+    float F = X[coord_to_offset(X_coord + (int4)(0,1,1,0), X_spec)];
+    float G = X[coord_to_offset(X_coord + (int4)(1,0,1,0), X_spec)];
+    float H = X[coord_to_offset(X_coord + (int4)(1,1,1,0), X_spec)];
+
+    float2 p = { ( A-G-D-F), ( B-H+C+E) };
+    float2 q = { ( A-G+D+F), (-B+H+C+E) };
+    float2 r = { ( A+G+D-F), ( B+H-C+E) };
+    float2 s = { ( A+G-D+F), (-B-H-C+E) };
+
+    Y[coord_to_offset(Y_coord + (int4)(0,0,0,0), Y_spec)] = 0.5f * p;
+    Y[coord_to_offset(Y_coord + (int4)(0,0,0,1), Y_spec)] = 0.5f * q;
+    Y[coord_to_offset(Y_coord + (int4)(0,0,0,2), Y_spec)] = 0.5f * r;
+    Y[coord_to_offset(Y_coord + (int4)(0,0,0,3), Y_spec)] = 0.5f * s;
+}
+'''
+
+C2CUBE_KERNEL = '''
+void __kernel c2cube_kernel(
+    const __global float2* X, int4 X_strides, int4 X_shape, int X_offset,
+    __global float* Y, int4 Y_strides, int4 Y_shape, int Y_offset)
+{
+    int4 X_coord = { get_global_id(0), get_global_id(1), get_global_id(2), 0 };
+    struct array_spec X_spec = { .strides = X_strides, .shape = X_shape, .offset = X_offset };
+    struct array_spec Y_spec = { .strides = Y_strides, .shape = Y_shape, .offset = Y_offset };
+
+    int4 Y_coord = X_coord * (int4)(2,2,2,1);
+
+    if(any(X_coord >= X_spec.shape) || any(Y_coord >= Y_spec.shape))
+        return;
+
+    float2 p = X[coord_to_offset(X_coord + (int4)(0,0,0,0), X_spec)];
+    float2 q = X[coord_to_offset(X_coord + (int4)(0,0,0,1), X_spec)];
+    float2 r = X[coord_to_offset(X_coord + (int4)(0,0,0,2), X_spec)];
+    float2 s = X[coord_to_offset(X_coord + (int4)(0,0,0,3), X_spec)];
+
+    // Recover each of the 8 corners of the octets.
+    Y[coord_to_offset(Y_coord + (int4)(0,0,0,0), Y_spec)] = 0.5f * ( p.x+q.x+r.x+s.x); // a
+    Y[coord_to_offset(Y_coord + (int4)(1,0,1,0), Y_spec)] = 0.5f * (-p.x-q.x+r.x+s.x); // g
+    Y[coord_to_offset(Y_coord + (int4)(1,1,0,0), Y_spec)] = 0.5f * (-p.x+q.x+r.x-s.x); // d
+    Y[coord_to_offset(Y_coord + (int4)(0,1,1,0), Y_spec)] = 0.5f * (-p.x+q.x-r.x+s.x); // f
+
+    Y[coord_to_offset(Y_coord + (int4)(0,1,0,0), Y_spec)] = 0.5f * ( p.y-q.y+r.y-s.y); // b
+    Y[coord_to_offset(Y_coord + (int4)(1,1,1,0), Y_spec)] = 0.5f * (-p.y+q.y+r.y-s.y); // h
+    Y[coord_to_offset(Y_coord + (int4)(1,0,0,0), Y_spec)] = 0.5f * ( p.y+q.y-r.y-s.y); // c
+    Y[coord_to_offset(Y_coord + (int4)(0,0,1,0), Y_spec)] = 0.5f * ( p.y+q.y+r.y+s.y); // e
 }
 '''
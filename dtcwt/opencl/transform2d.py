@@ -7,13 +7,17 @@ from six.moves import xrange
 from dtcwt.coeffs import biort as _biort, qshift as _qshift
 from dtcwt.defaults import DEFAULT_BIORT, DEFAULT_QSHIFT
 from dtcwt.utils import appropriate_complex_type_for, asfarray, memoize
-from dtcwt.opencl.lowlevel import axis_convolve, axis_convolve_dfilter, q2c
-from dtcwt.opencl.lowlevel import to_device, to_queue, to_array, empty
+from dtcwt.opencl.lowlevel import axis_convolve, axis_convolve_dfilter, axis_convolve_ifilter
+from dtcwt.opencl.lowlevel import q2c, c2q, pad_edge
+from dtcwt.opencl.lowlevel import column_filter_bank, row_filter_q2c
+from dtcwt.opencl.lowlevel import to_device, to_queue, to_queue_or_pool, to_array, empty
+from dtcwt.opencl.lowlevel import to_device_async, to_array_async, DeviceFuture, QueuePool
 
 from dtcwt.numpy import Pyramid
 from dtcwt.numpy import Transform2d as Transform2dNumPy
 
 try:
+    import pyopencl as cl
     from pyopencl.array import concatenate, Array as CLArray
 except ImportError:
     # The lack of OpenCL will be caught by the low-level routines.
@@ -46,6 +50,8 @@ class Pyramid(object):
         should not be modifying the arrays once you return an instance of this
         class anyway but if you do, beware!
 
+        The copy may be started early, without blocking, via :py:meth:`prefetch`.
+
     .. py:attribute:: cl_lowpass
 
         The CL array containing the lowpass image.
@@ -64,21 +70,56 @@ class Pyramid(object):
         self.cl_lowpass = lowpass
         self.cl_highpasses = highpasses
         self.cl_scales = scales
+        self._prefetch_events = []
+
+    def prefetch(self, queue=None, wait_for=None):
+        """Start copying the device-side arrays to the host without waiting for
+        the copies to complete. Subsequent access to the host-side attributes
+        waits for these copies rather than performing new ones.
+
+        If *queue* is non-``None``, the copies are performed on it. If
+        *wait_for* is non-``None``, it is a sequence of events which must
+        complete before the copies start.
+
+        :returns: A list of :py:class:`pyopencl.Event` instances signalled when the copies complete.
+
+        """
+        events = []
+        def fetch(a):
+            rv, event = to_array_async(a, queue=queue, wait_for=wait_for)
+            if event is not None:
+                events.append(event)
+            return rv
+
+        self._lowpass = fetch(self.cl_lowpass)
+        self._highpasses = tuple(fetch(x) for x in self.cl_highpasses) if self.cl_highpasses is not None else None
+        self._scales = tuple(fetch(x) for x in self.cl_scales) if self.cl_scales is not None else None
+
+        self._prefetch_events = events
+        return events
+
+    def _wait_for_prefetch(self):
+        if len(self._prefetch_events) > 0:
+            cl.wait_for_events(self._prefetch_events)
+            self._prefetch_events = []
 
     @property
     def lowpass(self):
+        self._wait_for_prefetch()
         if not hasattr(self, '_lowpass'):
             self._lowpass = to_array(self.cl_lowpass) if self.cl_lowpass is not None else None
         return self._lowpass
 
     @property
     def highpasses(self):
+        self._wait_for_prefetch()
         if not hasattr(self, '_highpasses'):
             self._highpasses = tuple(to_array(x) for x in self.cl_highpasses) if self.cl_highpasses is not None else None
         return self._highpasses
 
     @property
     def scales(self):
+        self._wait_for_prefetch()
         if not hasattr(self, '_scales'):
             self._scales = tuple(to_array(x) for x in self.cl_scales) if self.cl_scales is not None else None
         return self._scales
@@ -99,15 +140,105 @@ class Transform2d(Transform2dNumPy):
     coefficients. In the *biort* case, this should be (h0o, g0o, h1o, g1o). In
     the *qshift* case, this should be (h0a, h0b, g0a, g0b, h1a, h1b, g1a, g1b).
 
-    .. note::
+    Both the forward and inverse transforms are accelerated. The inverse
+    transform may be performed entirely on the device via :py:meth:`cl_inverse`.
 
-        At the moment *only* the **forward** transform is accelerated. The
-        inverse transform uses the NumPy backend.
+    The :py:meth:`forward_async` and :py:meth:`inverse_async` methods queue a
+    transform without waiting for it to complete. Copies between host and
+    device made by these methods are performed on a separate
+    :py:attr:`transfer_queue` so that they may overlap with computation. If
+    *transfer_queue* is *None*, a queue is created on the same device as
+    *queue* when first needed.
+
+    *queue* may also be a :py:class:`dtcwt.opencl.lowlevel.QueuePool`. In which
+    case each call to a transform method is run on a queue chosen by the pool.
+    Inverse transforms of device-side pyramids are run on the queue which
+    computed them. *transfer_queue* must be *None* in this case.
 
     """
-    def __init__(self, biort=DEFAULT_BIORT, qshift=DEFAULT_QSHIFT, queue=None):
+    def __init__(self, biort=DEFAULT_BIORT, qshift=DEFAULT_QSHIFT, queue=None, transfer_queue=None):
         super(Transform2d, self).__init__(biort=biort, qshift=qshift)
-        self.queue = to_queue(queue)
+        queue = to_queue_or_pool(queue)
+        self.queue_pool = None
+        if isinstance(queue, QueuePool):
+            if transfer_queue is not None:
+                raise ValueError('A transfer queue may not be specified with a queue pool.')
+            self.queue_pool, queue = queue, queue.queues[0]
+            self._pool_transforms = {}
+        self.queue = queue
+        self._transfer_queue = transfer_queue
+
+    def _pool_call(self, method, queue, *args, **kwargs):
+        """Call *method* of a transform for a queue from :py:attr:`queue_pool`
+        with *args* and *kwargs*. If *queue* is ``None``, the pool chooses the
+        queue.
+
+        """
+        def call(queue):
+            return getattr(self._pool_transform(queue), method)(*args, **kwargs)
+        return self.queue_pool.submit(call, queue=queue)
+
+    def _pool_transform(self, queue):
+        """Return the transform which runs on *queue* from :py:attr:`queue_pool`."""
+        try:
+            return self._pool_transforms[queue]
+        except KeyError:
+            transform = self._pool_transforms[queue] = Transform2d(
+                biort=self.biort, qshift=self.qshift, queue=queue)
+            return transform
+
+    @property
+    def transfer_queue(self):
+        """The :py:class:`pyopencl.CommandQueue` used for asynchronous copies
+        between host and device.
+
+        """
+        if self._transfer_queue is None:
+            self._transfer_queue = cl.CommandQueue(self.queue.context, self.queue.device)
+        return self._transfer_queue
+
+    def forward_async(self, X, nlevels=3, include_scale=False, copy_to_host=False):
+        """Queue a *n*-level DTCWT-2D decompostion of a 2D matrix *X* without
+        waiting for it to complete.
+
+        :param X: 2D real array
+        :param nlevels: Number of levels of wavelet decomposition
+        :param copy_to_host: True if the result should also be copied back to the host.
+
+        :returns: A :py:class:`dtcwt.opencl.lowlevel.DeviceFuture` whose result is a :py:class:`dtcwt.opencl.Pyramid`.
+
+        If *X* is on the host, it is copied to the device on
+        :py:attr:`transfer_queue` and so the copy may overlap with transforms
+        already queued. If *copy_to_host* is True, the result is copied back on
+        :py:attr:`transfer_queue` once computed and the future completes only
+        when the host-side attributes of the pyramid are available.
+
+        For example, to overlap the transform of each frame in a sequence with
+        the copies for its neighbours::
+
+            futures = [trans.forward_async(frame, copy_to_host=True) for frame in frames]
+            for future in futures:
+                process(future.result().highpasses)
+
+        """
+        if self.queue_pool is not None:
+            return self._pool_call('forward_async', self.queue_pool.queue_of(X), X,
+                                   nlevels=nlevels, include_scale=include_scale, copy_to_host=copy_to_host)
+
+        queue = self.queue
+
+        if not isinstance(X, CLArray):
+            X, upload = to_device_async(np.atleast_2d(asfarray(X)), queue=self.transfer_queue)
+
+            # The transform must not start until the copy has completed
+            cl.enqueue_barrier(queue, wait_for=[upload])
+
+        pyramid = self.forward(X, nlevels=nlevels, include_scale=include_scale)
+        computed = cl.enqueue_marker(queue)
+
+        if copy_to_host:
+            return DeviceFuture(pyramid, pyramid.prefetch(queue=self.transfer_queue, wait_for=[computed]))
+        return DeviceFuture(pyramid, [computed])
 
     def forward(self, X, nlevels=3, include_scale=False):
         """Perform a *n*-level DTCWT-2D decompostion on a 2D matrix *X*.
@@ -128,6 +259,10 @@ class Transform2d(Transform2dNumPy):
         .. codeauthor:: Cian Shaffrey, Cambridge University, Sept 2001
 
         """
+        if self.queue_pool is not None:
+            return self._pool_call('forward', self.queue_pool.queue_of(X), X,
+                                   nlevels=nlevels, include_scale=include_scale)
+
         queue = self.queue
 
         if isinstance(X, CLArray):
@@ -137,6 +272,103 @@ class Transform2d(Transform2dNumPy):
             # If not an array, copy to device
             X = np.atleast_2d(asfarray(X))
 
+        if len(X.shape) >= 3:
+            raise ValueError('The entered image is {0}, please enter each image slice separately.'.
+                    format('x'.join(list(str(s) for s in X.shape))))
+
+        # Copy X to the device if necessary
+        X = to_device(X, queue=queue)
+
+        return self._forward(X, nlevels, include_scale)
+
+    def forward_batch(self, X, nlevels=3, include_scale=False):
+        """Perform a *n*-level DTCWT-2D decompostion on each image in a series
+        of images *X* which all share the same shape.
+
+        :param X: 3D real array-like object whose first axis indexes images
+        :param nlevels: Number of levels of wavelet decomposition
+
+        :returns: A :py:class:`dtcwt.opencl.Pyramid` whose arrays have an additional first axis indexing the images
+
+        The result is equivalent to calling :py:meth:`forward` on each image
+        ``X[i,...]`` in turn and stacking the results along a new first axis,
+        as with :py:meth:`dtcwt.numpy.Transform3d.forward_batch`. Hence the
+        lowpass image for image *i* is ``lowpass[i,...]`` and its highpass
+        subbands for level *l* are ``highpasses[l][i,...]``.
+
+        Each kernel launch processes every image in the series and so, for
+        many small images, this is considerably faster than calling
+        :py:meth:`forward` for each one.
+
+        *X* may be a :py:class:`pyopencl.array.Array` instance which has
+        already been copied to the device.
+
+        If the transform uses a queue pool and *X* is on the host, the images
+        are split into contiguous runs, one for each queue, which are
+        transformed concurrently and reassembled in order. A device array
+        associated with the pool is transformed entirely on its queue.
+
+        """
+        if len(X.shape) != 3:
+            raise ValueError('Input must be a 3D array of images')
+
+        if self.queue_pool is not None:
+            if isinstance(X, CLArray):
+                return self._pool_call('forward_batch', self.queue_pool.queue_of(X), X,
+                                       nlevels=nlevels, include_scale=include_scale)
+            return self._pool_forward_batch(asfarray(X), nlevels, include_scale)
+
+        if not isinstance(X, CLArray):
+            X = asfarray(X)
+
+        # The kernels index images by a third axis. Each image remains
+        # contiguous on the device and the outputs are allocated so that they
+        # are too.
+        X = to_device(X, queue=self.queue).transpose((1, 2, 0))
+        return self._forward(X, nlevels, include_scale, batch=True)
+
+    def _pool_forward_batch(self, X, nlevels, include_scale):
+        """Transform the host array of images *X* by splitting it between the
+        queues of :py:attr:`queue_pool` and return a single pyramid.
+
+        """
+        n_chunks = max(1, min(len(self.queue_pool), X.shape[0]))
+        chunks = list(np.ascontiguousarray(c) for c in np.array_split(X, n_chunks))
+        def forward_chunk(chunk, queue):
+            pyramid = self._pool_transform(queue).forward_batch(
+                chunk, nlevels=nlevels, include_scale=include_scale)
+            return pyramid, queue
+        pyramids, queues = zip(*self.queue_pool.map(forward_chunk, chunks))
+        if len(pyramids) == 1:
+            return pyramids[0]
+
+        # Reassemble on the first queue. Arrays in the same context may be
+        # concatenated on the device once every queue has finished with them
+        # whereas others must be copied via the host.
+        queue = queues[0]
+        if all(q.context == queue.context for q in queues):
+            computed = list(cl.enqueue_marker(q) for q in queues)
+            cl.enqueue_barrier(queue, wait_for=computed)
+            join = lambda arrays: concatenate(list(a.with_queue(queue) for a in arrays), queue=queue)
+        else:
+            join = lambda arrays: to_device(np.concatenate(list(to_array(a) for a in arrays)),
+                                            queue=queue, dtype=arrays[0].dtype)
+
+        Yl = join(list(p.cl_lowpass for p in pyramids))
+        Yh = tuple(join(list(p.cl_highpasses[level] for p in pyramids)) for level in xrange(nlevels))
+        if include_scale:
+            Yscale = tuple(join(list(p.cl_scales[level] for p in pyramids)) for level in xrange(nlevels))
+            return Pyramid(Yl, Yh, Yscale)
+        return Pyramid(Yl, Yh)
+
+    def _forward(self, X, nlevels, include_scale, batch=False):
+        """Perform the forward transform of the 2D device array *X* or, if *X*
+        is 3D, of each image ``X[:,:,i]``. If *batch* is True, the arrays of
+        the result have the image index as their first axis.
+
+        """
+        queue = self.queue
+
         # If biort has 6 elements instead of 4, then it's a modified
         # rotationally symmetric wavelet
         # FIXME: there's probably a nicer way to do this
@@ -157,11 +389,11 @@ class Transform2d(Transform2dNumPy):
         else:
             raise ValueError('Qshift wavelet must have 12 or 8 components.')
 
-        original_size = X.shape
+        original_size = X.shape[:2]
 
-        if len(X.shape) >= 3:
-            raise ValueError('The entered image is {0}, please enter each image slice separately.'.
-                    format('x'.join(list(str(s) for s in X.shape))))
+        # Any axes after the first two index images within a stack and are
+        # never extended.
+        stack_pad = ((0, 0),) * (len(X.shape) - 2)
 
         # The next few lines of code check to see if the image is odd in size, if so an extra ...
         # row/column will be added to the bottom/right of the image
@@ -169,27 +401,38 @@ class Transform2d(Transform2dNumPy):
         initial_col_extend = 0
         if original_size[0] % 2 != 0:
             # if X.shape[0] is not divisible by 2 then we need to extend X by adding a row at the bottom
-            X = to_array(X)
-            X = np.vstack((X, X[[-1],:]))  # Any further extension will be done in due course.
             initial_row_extend = 1
 
         if original_size[1] % 2 != 0:
             # if X.shape[1] is not divisible by 2 then we need to extend X by adding a col to the left
-            X = to_array(X)
-            X = np.hstack((X, X[:,[-1]]))
             initial_col_extend = 1
 
-        extended_size = X.shape
+        if initial_row_extend == 1 or initial_col_extend == 1:
+            # Any further extension will be done in due course.
+            X = pad_edge(X, ((0, initial_row_extend), (0, initial_col_extend)) + stack_pad, queue=queue)
 
-        # Copy X to the device if necessary
-        X = to_device(X, queue=queue)
+        extended_size = X.shape[:2]
 
         if nlevels == 0:
+            if batch:
+                X = _batch_first(X, queue)
             if include_scale:
                 return Pyramid(X, (), ())
             else:
                 return Pyramid(X, ())
 
+        def outputs(Lo, decimate):
+            # Outputs with the image index as the first axis viewed with it as
+            # the last, as the kernels expect.
+            if not batch:
+                return None
+            rows, cols, n = Lo.shape
+            if decimate:
+                cols >>= 1
+            LoLo = empty((n, rows, cols), np.float32, queue=queue)
+            Yh = empty((n, rows >> 1, cols >> 1, 6), np.complex64, queue=queue)
+            return LoLo.transpose((1, 2, 0)), Yh.transpose((1, 2, 3, 0))
+
         # initialise
         Yh = [None,] * nlevels
         if include_scale:
@@ -200,62 +443,45 @@ class Transform2d(Transform2dNumPy):
 
         if nlevels >= 1:
             # Do odd top-level filters on cols.
-            Lo = axis_convolve(X,h0o,axis=0,queue=queue)
-            Hi = axis_convolve(X,h1o,axis=0,queue=queue)
             if len(self.biort) >= 6:
-                Ba = axis_convolve(X,h2o,axis=0,queue=queue)
-
-            # Do odd top-level filters on rows.
-            LoLo = axis_convolve(Lo,h0o,axis=1,queue=queue)
-
-            if len(self.biort) >= 6:
-                diag = axis_convolve(Ba,h2o,axis=1,queue=queue)
+                Lo, Hi, Ba = column_filter_bank(X, (h0o, h1o, h2o), queue=queue)
+                diag, hdiag = Ba, h2o
             else:
-                diag = axis_convolve(Hi,h1o,axis=1,queue=queue)
+                Lo, Hi = column_filter_bank(X, (h0o, h1o), queue=queue)
+                diag, hdiag = Hi, h1o
 
-            Yh[0] = q2c(
-                axis_convolve(Hi,h0o,axis=1,queue=queue),
-                axis_convolve(Lo,h1o,axis=1,queue=queue),
-                diag,
-                queue=queue
-            )
+            # Do odd top-level filters on rows and convert to complex
+            # subbands in one pass.
+            LoLo, Yh[0] = row_filter_q2c(Lo, Hi, diag, (h0o, h1o, hdiag), queue=queue,
+                                         outputs=outputs(Lo, False))
 
             if include_scale:
                 Yscale[0] = LoLo
 
         for level in xrange(1, nlevels):
-            row_size, col_size = LoLo.shape
+            row_size, col_size = LoLo.shape[:2]
 
-            if row_size % 4 != 0:
-                # Extend by 2 rows if no. of rows of LoLo are not divisible by 4
-                LoLo = to_array(LoLo)
-                LoLo = np.vstack((LoLo[:1,:], LoLo, LoLo[-1:,:]))
+            # Extend by 2 rows if no. of rows of LoLo are not divisible by 4
+            row_extend = 1 if row_size % 4 != 0 else 0
 
-            if col_size % 4 != 0:
-                # Extend by 2 cols if no. of cols of LoLo are not divisible by 4
-                LoLo = to_array(LoLo)
-                LoLo = np.hstack((LoLo[:,:1], LoLo, LoLo[:,-1:]))
-
-            # Do even Qshift filters on rows.
-            Lo = axis_convolve_dfilter(LoLo,h0b,axis=0,queue=queue)
-            Hi = axis_convolve_dfilter(LoLo,h1b,axis=0,queue=queue)
-            if len(self.qshift) >= 12:
-                Ba = axis_convolve_dfilter(LoLo,h2b,axis=0,queue=queue)
+            # Extend by 2 cols if no. of cols of LoLo are not divisible by 4
+            col_extend = 1 if col_size % 4 != 0 else 0
 
-            # Do even Qshift filters on columns.
-            LoLo = axis_convolve_dfilter(Lo,h0b,axis=1,queue=queue)
+            if row_extend == 1 or col_extend == 1:
+                LoLo = pad_edge(LoLo, ((row_extend, row_extend), (col_extend, col_extend)) + stack_pad, queue=queue)
 
+            # Do even Qshift filters on rows.
             if len(self.qshift) >= 12:
-                diag = axis_convolve_dfilter(Ba,h2b,axis=1,queue=queue)
+                Lo, Hi, Ba = column_filter_bank(LoLo, (h0b, h1b, h2b), decimate=True, queue=queue)
+                diag, hdiag = Ba, h2b
             else:
-                diag = axis_convolve_dfilter(Hi,h1b,axis=1,queue=queue)
+                Lo, Hi = column_filter_bank(LoLo, (h0b, h1b), decimate=True, queue=queue)
+                diag, hdiag = Hi, h1b
 
-            Yh[level] = q2c(
-                axis_convolve_dfilter(Hi,h0b,axis=1,queue=queue),
-                axis_convolve_dfilter(Lo,h1b,axis=1,queue=queue),
-                diag,
-                queue=queue
-            )
+            # Do even Qshift filters on columns and convert to complex
+            # subbands in one pass.
+            LoLo, Yh[level] = row_filter_q2c(Lo, Hi, diag, (h0b, h1b, hdiag), decimate=True, queue=queue,
+                                             outputs=outputs(Lo, True))
 
             if include_scale:
                 Yscale[level] = LoLo
@@ -283,7 +509,215 @@ class Transform2d(Transform2dNumPy):
             logging.warn(
                 'The rightmost column has been duplicated, prior to decomposition.')
 
+        if batch:
+            Yl = _batch_first(Yl, queue)
+            Yh = list(_batch_first(x, queue) for x in Yh)
+            if include_scale:
+                Yscale = list(_batch_first(x, queue) for x in Yscale)
+
         if include_scale:
             return Pyramid(Yl, tuple(Yh), tuple(Yscale))
         else:
             return Pyramid(Yl, tuple(Yh))
+
+    def inverse(self, pyramid, gain_mask=None):
+        """Perform an *n*-level dual-tree complex wavelet (DTCWT) 2D
+        reconstruction.
+
+        :param pyramid: A :py:class:`dtcwt.Pyramid`-like class holding the transform domain representation to invert.
+        :param gain_mask: Gain to be applied to each subband.
+
+        :returns: A numpy-array compatible instance with the reconstruction.
+
+        The reconstruction is performed by :py:meth:`cl_inverse` and copied
+        back to the host. See that method for details.
+
+        """
+        return to_array(self.cl_inverse(pyramid, gain_mask=gain_mask))
+
+    def cl_inverse(self, pyramid, gain_mask=None):
+        """Perform an *n*-level dual-tree complex wavelet (DTCWT) 2D
+        reconstruction leaving the result on the device.
+
+        :param pyramid: A :py:class:`dtcwt.Pyramid`-like class holding the transform domain representation to invert.
+        :param gain_mask: Gain to be applied to each subband.
+
+        :returns: A :py:class:`pyopencl.array.Array` instance with the reconstruction.
+
+        The (*d*, *l*)-th element of *gain_mask* is gain for subband with direction
+        *d* at level *l*. Default *gain_mask* is all ones. Note that both *d*
+        and *l* are zero-indexed.
+
+        If *pyramid* is a :py:class:`dtcwt.opencl.Pyramid` instance, the
+        device-side arrays are used directly and no copy to or from the host is
+        performed. Otherwise, the lowpass and highpass arrays are copied to the
+        device. The result may be copied to the host via
+        :py:func:`dtcwt.opencl.lowlevel.to_array`.
+
+        """
+        if self.queue_pool is not None:
+            return self._pool_call('cl_inverse', self.queue_pool.queue_of(getattr(pyramid, 'cl_lowpass', None)),
+                                   pyramid, gain_mask=gain_mask)
+
+        queue = self.queue
+
+        if isinstance(pyramid, Pyramid):
+            Yl, Yh = pyramid.cl_lowpass, pyramid.cl_highpasses
+        else:
+            Yl, Yh = pyramid.lowpass, pyramid.highpasses
+
+        a = len(Yh) # No of levels.
+
+        if gain_mask is None:
+            gain_mask = np.ones((6,a)) # Default gain_mask.
+
+        gain_mask = np.array(gain_mask)
+
+        # If biort has 6 elements instead of 4, then it's a modified
+        # rotationally symmetric wavelet
+        # FIXME: there's probably a nicer way to do this
+        if len(self.biort) == 4:
+            h0o, g0o, h1o, g1o = self.biort
+        elif len(self.biort) == 6:
+            h0o, g0o, h1o, g1o, h2o, g2o = self.biort
+        else:
+            raise ValueError('Biort wavelet must have 6 or 4 components.')
+
+        # If qshift has 12 elements instead of 8, then it's a modified
+        # rotationally symmetric wavelet
+        # FIXME: there's probably a nicer way to do this
+        if len(self.qshift) == 8:
+            h0a, h0b, g0a, g0b, h1a, h1b, g1a, g1b = self.qshift
+        elif len(self.qshift) == 12:
+            h0a, h0b, g0a, g0b, h1a, h1b, g1a, g1b, h2a, h2b, g2a, g2b = self.qshift
+        else:
+            raise ValueError('Qshift wavelet must have 12 or 8 components.')
+
+        # Copy inputs to the device if necessary
+        Z = to_device(Yl, queue=queue)
+        Yh = tuple(to_device(x, queue=queue, dtype=np.complex64) for x in Yh)
+
+        current_level = a
+
+        while current_level >= 2: # this ensures that for level 1 we never do the following
+            lh, hl, hh = c2q(Yh[current_level-1], gain_mask[:, current_level-1], queue=queue)
+
+            # Do even Qshift filters on columns.
+            y1 = axis_convolve_ifilter(Z,g0b,axis=0,queue=queue)
+            y1 += axis_convolve_ifilter(lh,g1b,axis=0,queue=queue)
+
+            if len(self.qshift) >= 12:
+                y2 = axis_convolve_ifilter(hl,g0b,axis=0,queue=queue)
+                y2bp = axis_convolve_ifilter(hh,g2b,axis=0,queue=queue)
+
+                # Do even Qshift filters on rows.
+                Z = axis_convolve_ifilter(y1,g0b,axis=1,queue=queue)
+                Z += axis_convolve_ifilter(y2,g1b,axis=1,queue=queue)
+                Z += axis_convolve_ifilter(y2bp,g2b,axis=1,queue=queue)
+            else:
+                y2 = axis_convolve_ifilter(hl,g0b,axis=0,queue=queue)
+                y2 += axis_convolve_ifilter(hh,g1b,axis=0,queue=queue)
+
+                # Do even Qshift filters on rows.
+                Z = axis_convolve_ifilter(y1,g0b,axis=1,queue=queue)
+                Z += axis_convolve_ifilter(y2,g1b,axis=1,queue=queue)
+
+            # Check size of Z and crop as required. Cropping gives a view of
+            # Z on the device which the next level's filters read directly.
+            [row_size, col_size] = Z.shape
+            S = 2*np.array(Yh[current_level-2].shape)
+            if row_size != S[0]:    # check to see if this result needs to be cropped for the rows
+                Z = Z[1:-1,:]
+            if col_size != S[1]:    # check to see if this result needs to be cropped for the cols
+                Z = Z[:,1:-1]
+
+            if np.any(np.array(Z.shape) != S[:2]):
+                raise ValueError('Sizes of highpasses are not valid for DTWAVEIFM2')
+
+            current_level = current_level - 1
+
+        if current_level == 1:
+            lh, hl, hh = c2q(Yh[current_level-1], gain_mask[:, current_level-1], queue=queue)
+
+            # Do odd top-level filters on columns.
+            y1 = axis_convolve(Z,g0o,axis=0,queue=queue)
+            y1 += axis_convolve(lh,g1o,axis=0,queue=queue)
+
+            if len(self.biort) >= 6:
+                y2 = axis_convolve(hl,g0o,axis=0,queue=queue)
+                y2bp = axis_convolve(hh,g2o,axis=0,queue=queue)
+
+                # Do odd top-level filters on rows.
+                Z = axis_convolve(y1,g0o,axis=1,queue=queue)
+                Z += axis_convolve(y2,g1o,axis=1,queue=queue)
+                Z += axis_convolve(y2bp,g2o,axis=1,queue=queue)
+            else:
+                y2 = axis_convolve(hl,g0o,axis=0,queue=queue)
+                y2 += axis_convolve(hh,g1o,axis=0,queue=queue)
+
+                # Do odd top-level filters on rows.
+                Z = axis_convolve(y1,g0o,axis=1,queue=queue)
+                Z += axis_convolve(y2,g1o,axis=1,queue=queue)
+
+        return Z
+
+    def inverse_async(self, pyramid, gain_mask=None, copy_to_host=True):
+        """Queue an *n*-level dual-tree complex wavelet (DTCWT) 2D
+        reconstruction without waiting for it to complete.
+
+        :param pyramid: A :py:class:`dtcwt.Pyramid`-like class holding the transform domain representation to invert.
+        :param gain_mask: Gain to be applied to each subband.
+        :param copy_to_host: True if the result should be copied back to the host.
+
+        :returns: A :py:class:`dtcwt.opencl.lowlevel.DeviceFuture` whose result is the reconstruction.
+
+        The reconstruction is as for :py:meth:`cl_inverse`. If *pyramid* is on
+        the host it is copied to the device on :py:attr:`transfer_queue`. If
+        *copy_to_host* is True, the result of the future is a host-side array
+        copied on :py:attr:`transfer_queue`. Otherwise it is a
+        :py:class:`pyopencl.array.Array` on the device.
+
+        """
+        if self.queue_pool is not None:
+            return self._pool_call('inverse_async', self.queue_pool.queue_of(getattr(pyramid, 'cl_lowpass', None)),
+                                   pyramid, gain_mask=gain_mask, copy_to_host=copy_to_host)
+
+        queue = self.queue
+
+        if not isinstance(pyramid, Pyramid):
+            Yl, upload = to_device_async(pyramid.lowpass, queue=self.transfer_queue)
+            uploads = [upload]
+            Yh = []
+            for x in pyramid.highpasses:
+                x, upload = to_device_async(x, queue=self.transfer_queue, dtype=np.complex64)
+                Yh.append(x)
+                uploads.append(upload)
+            pyramid = Pyramid(Yl, tuple(Yh))
+
+            # The reconstruction must not start until the copies have completed
+            uploads = list(e for e in uploads if e is not None)
+            if len(uploads) > 0:
+                cl.enqueue_barrier(queue, wait_for=uploads)
+
+        Z = self.cl_inverse(pyramid, gain_mask=gain_mask)
+        computed = cl.enqueue_marker(queue)
+
+        if copy_to_host:
+            Z, download = to_array_async(Z, queue=self.transfer_queue, wait_for=[computed])
+            return DeviceFuture(Z, [download])
+        return DeviceFuture(Z, [computed])
+
+def _batch_first(X, queue):
+    """Return the device array *X*, whose last axis indexes images, as a
+    contiguous array whose first axis does.
+
+    """
+    ndim = len(X.shape)
+    Y = X.transpose((ndim-1,) + tuple(xrange(ndim-1)))
+    if Y.flags.c_contiguous:
+        return Y
+
+    # Only an unfiltered input can be laid out with images interleaved
+    out = empty(Y.shape, X.dtype, queue=queue)
+    pad_edge(X, ((0, 0),) * ndim, queue=queue, output=out.transpose(tuple(xrange(1, ndim)) + (0,)))
+    return out
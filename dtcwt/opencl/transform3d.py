@@ -1,21 +1,19 @@
-from __future__ import division
+from __future__ import division, absolute_import
 
-import logging
 import numpy as np
 from six.moves import xrange
 
-from dtcwt.coeffs import biort as _biort, qshift as _qshift
 from dtcwt.defaults import DEFAULT_BIORT, DEFAULT_QSHIFT
-from dtcwt.utils import appropriate_complex_type_for, asfarray, memoize
-from dtcwt.opencl.lowlevel import colfilter, coldfilt, colifilt
-from dtcwt.opencl.lowlevel import axis_convolve, axis_convolve_dfilter, q2c
-from dtcwt.opencl.lowlevel import to_device, to_queue, to_array, empty
+from dtcwt.utils import asfarray, finer_level_size, level2_extension, remove_level2_extension
+from dtcwt.opencl.lowlevel import axis_convolve, axis_convolve_dfilter, axis_convolve_ifilter
+from dtcwt.opencl.lowlevel import cube2c, c2cube, pad_edge
+from dtcwt.opencl.lowlevel import to_device, to_queue, to_queue_or_pool, to_array, empty, QueuePool
 
-from dtcwt.numpy import Pyramid
+from dtcwt.opencl.transform2d import Pyramid
 from dtcwt.numpy import Transform3d as Transform3dNumPy
 
 try:
-    from pyopencl.array import concatenate, Array as CLArray
+    from pyopencl.array import Array as CLArray
 except ImportError:
     # The lack of OpenCL will be caught by the low-level routines.
     pass
@@ -31,68 +29,81 @@ class Transform3d(Transform3dNumPy):
     OpenCL kernels which implement the transform. If it is *None*, the first
     available compute device is used.
 
-    .. note::
+    Both the forward and inverse transforms filter whole volumes on the
+    device. Only level 1 wavelets with odd-length filters are supported. The
+    batched and region of interest transforms inherited from
+    :py:class:`dtcwt.numpy.Transform3d` use the NumPy backend.
 
-        At the moment *only* the **forward** transform is accelerated. The
-        inverse transform uses the NumPy backend.
+    *queue* may also be a :py:class:`dtcwt.opencl.lowlevel.QueuePool`. In which
+    case each call to :py:meth:`forward` or :py:meth:`cl_inverse` is run on a
+    queue chosen by the pool. Inverse transforms of device-side pyramids are
+    run on the queue which computed them.
 
     """
-    def __init__(self, biort=DEFAULT_BIORT, qshift=DEFAULT_QSHIFT,ext_mode=4, queue=None):
+    def __init__(self, biort=DEFAULT_BIORT, qshift=DEFAULT_QSHIFT, ext_mode=4, queue=None):
         super(Transform3d, self).__init__(biort=biort, qshift=qshift, ext_mode=ext_mode)
-        self.queue = to_queue(queue)
+        queue = to_queue_or_pool(queue)
+        self.queue_pool = None
+        if isinstance(queue, QueuePool):
+            self.queue_pool, queue = queue, queue.queues[0]
+            self._pool_transforms = {}
+        self.queue = queue
+
+    def _pool_call(self, method, queue, *args, **kwargs):
+        """Call *method* of a transform for a queue from :py:attr:`queue_pool`
+        with *args* and *kwargs*. If *queue* is ``None``, the pool chooses the
+        queue.
 
-    def forward(self, X, nlevels=3, include_scale=False, discard_level_1=False):
+        """
+        def call(queue):
+            try:
+                transform = self._pool_transforms[queue]
+            except KeyError:
+                transform = self._pool_transforms[queue] = Transform3d(
+                    biort=self.biort, qshift=self.qshift, ext_mode=self.ext_mode, queue=queue)
+            return getattr(transform, method)(*args, **kwargs)
+        return self.queue_pool.submit(call, queue=queue)
+
+    def forward(self, X, nlevels=3, include_scale=False, discard_level_1=False,
+                discard_highpasses=False):
         """Perform a *n*-level DTCWT-3D decompostion on a 3D matrix *X*.
 
         :param X: 3D real array-like object
         :param nlevels: Number of levels of wavelet decomposition
-        :param biort: Level 1 wavelets to use. See :py:func:`biort`.
-        :param qshift: Level >= 2 wavelets to use. See :py:func:`qshift`.
-        :param ext_mode: Extension mode. See below.
-        :param include_scale: True if level 1 high-pass bands are to be discarded.
-
-        :returns Yl: The real lowpass image from the final level
-        :returns Yh: A tuple containing the complex highpass subimages for each level.
-
-        Each element of *Yh* is a 4D complex array with the 4th dimension having
-        size 28. The 3D slice ``Yh[l][:,:,:,d]`` corresponds to the complex higpass
-        coefficients for direction d at level l where d and l are both 0-indexed.
-
-        If *biort* or *qshift* are strings, they are used as an argument to the
-        :py:func:`biort` or :py:func:`qshift` functions. Otherwise, they are
-        interpreted as tuples of vectors giving filter coefficients. In the *biort*
-        case, this should be (h0o, g0o, h1o, g1o). In the *qshift* case, this should
-        be (h0a, h0b, g0a, g0b, h1a, h1b, g1a, g1b).
-
-        There are two values for *ext_mode*, either 4 or 8. If *ext_mode* = 4,
-        check whether 1st level is divisible by 2 (if not we raise a
-        ``ValueError``). Also check whether from 2nd level onwards, the coefs can
-        be divided by 4. If any dimension size is not a multiple of 4, append extra
-        coefs by repeating the edges. If *ext_mode* = 8, check whether 1st level is
-        divisible by 4 (if not we raise a ``ValueError``). Also check whether from
-        2nd level onwards, the coeffs can be divided by 8. If any dimension size is
-        not a multiple of 8, append extra coeffs by repeating the edges twice.
-
-        If *include_scale* is True the highpass coefficients at level 1 will not be
-        discarded. (And, in fact, will never be calculated.) This turns the
-        transform from being 8:1 redundant to being 1:1 redundant at the cost of
-        no-longer allowing perfect reconstruction. If this option is selected then
-        `Yh[0]` will be `None`. Note that :py:func:`dtwaveifm3` will accepts
-        `Yh[0]` being `None` and will treat it as being zero.
+        :param discard_level_1: True if level 1 high-pass bands are to be discarded.
+        :param discard_highpasses: True if all high-pass bands are to be discarded.
+
+        :returns: A :py:class:`dtcwt.Pyramid` compatible object representing the transform-domain signal
+
+        The parameters and result are as for
+        :py:meth:`dtcwt.numpy.Transform3d.forward` except that the result is
+        a :py:class:`dtcwt.opencl.Pyramid` whose device-side arrays are
+        available via its ``cl_...`` attributes.
+
+        .. note::
+
+            *X* may be a :py:class:`pyopencl.array.Array` instance which has
+            already been copied to the device. In which case, it must be 3D.
 
         .. codeauthor:: Rich Wareham <rjw57@cantab.net>, Aug 2013
         .. codeauthor:: Huizhong Chen, Jan 2009
         .. codeauthor:: Nick Kingsbury, Cambridge University, July 1999.
 
         """
-        X = np.atleast_3d(asfarray(X))
+        if self.queue_pool is not None:
+            return self._pool_call('forward', self.queue_pool.queue_of(X), X, nlevels=nlevels,
+                                   include_scale=include_scale, discard_level_1=discard_level_1,
+                                   discard_highpasses=discard_highpasses)
 
-        if len(self.biort) == 4:
-            h0o, g0o, h1o, g1o = self.biort
-        elif len(self.biort) == 6:
-            h0o, g0o, h1o, g1o, h2o, g2o = self.biort
+        queue = self.queue
+
+        if isinstance(X, CLArray):
+            if len(X.shape) != 3:
+                raise ValueError('Input array must be three-dimensional')
         else:
-            raise ValueError('Biort wavelet must have 6 or 4 components.')
+            X = np.atleast_3d(asfarray(X))
+
+        h0o, g0o, h1o, g1o = self._level1_filters()
 
         if len(self.qshift) == 8:
             h0a, h0b, g0a, g0b, h1a, h1b, g1a, g1b = self.qshift
@@ -105,8 +116,10 @@ class Transform3d(Transform3dNumPy):
         if self.ext_mode != 4 and self.ext_mode != 8:
             raise ValueError('ext_mode must be one of 4 or 8')
 
-        Yl = X
+        # Copy X to the device if necessary
+        Yl = to_device(X, queue=queue)
         Yh = [None,] * nlevels
+        level_sizes = [None,] * nlevels
 
         if include_scale:
             # this is only required if the user specifies a third output component.
@@ -115,77 +128,69 @@ class Transform3d(Transform3dNumPy):
         # level is 0-indexed
         for level in xrange(nlevels):
             # Transform
-            if level == 0 and discard_level_1:
-                Yl = _level1_xfm_no_highpass(Yl, h0o, h1o, self.ext_mode)
-                if include_scale:
-                    Yscale[0] = Yl
-            elif level == 0 and not discard_level_1:
-                Yl, Yh[level] = _level1_xfm(Yl, h0o, h1o, self.ext_mode)
-                if include_scale:
-                    Yscale[0] = Yl
+            if level == 0 and (discard_level_1 or discard_highpasses):
+                Yl = _level1_xfm_no_highpass(Yl, h0o, h1o, self.ext_mode, queue)
+            elif level == 0:
+                Yl, Yh[level] = _level1_xfm(Yl, h0o, h1o, self.ext_mode, queue)
+            elif discard_highpasses:
+                Yl = _level2_xfm_no_highpass(Yl, h0a, h0b, self.ext_mode, queue)
             else:
-                Yl, Yh[level] = _level2_xfm(Yl, h0a, h0b, h1a, h1b, self.ext_mode)
-                if include_scale:
-                    Yscale[level] = Yl
-        #FIXME: need some way to separate the Yscale component to include the scale when necessary.
+                Yl, Yh[level] = _level2_xfm(Yl, h0a, h0b, h1a, h1b, self.ext_mode, queue)
+            level_sizes[level] = Yl.shape[:3]
+
+            if include_scale:
+                Yscale[level] = Yl
+
         if include_scale:
-            return Pyramid(Yl, tuple(Yh), tuple(Yscale))
+            pyramid = Pyramid(Yl, tuple(Yh), tuple(Yscale))
         else:
-            return Pyramid(Yl, tuple(Yh))
-        return Pyramid(Yl, tuple(Yh))
+            pyramid = Pyramid(Yl, tuple(Yh))
+        pyramid.level_sizes = tuple(level_sizes)
+        return pyramid
 
-    def inverse(self, td_signal):
+    def inverse(self, pyramid):
         """Perform an *n*-level dual-tree complex wavelet (DTCWT) 3D
         reconstruction.
 
-        :param Yl: The real lowpass subband from the final level
-        :param Yh: A sequence containing the complex highpass subband for each level.
-        :param biort: Level 1 wavelets to use. See :py:func:`biort`.
-        :param qshift: Level >= 2 wavelets to use. See :py:func:`qshift`.
-        :param ext_mode: Extension mode. See below.
+        :param pyramid: The :py:class:`dtcwt.Pyramid`-like instance representing the transformed signal.
 
-        :returns Z: Reconstructed real image matrix.
+        :returns: Reconstructed real array.
 
-        If *biort* or *qshift* are strings, they are used as an argument to the
-        :py:func:`biort` or :py:func:`qshift` functions. Otherwise, they are
-        interpreted as tuples of vectors giving filter coefficients. In the *biort*
-        case, this should be (h0o, g0o, h1o, g1o). In the *qshift* case, this should
-        be (h0a, h0b, g0a, g0b, h1a, h1b, g1a, g1b).
+        The reconstruction is performed by :py:meth:`cl_inverse` and copied
+        back to the host.
+
+        """
+        return to_array(self.cl_inverse(pyramid))
 
-        There are two values for *ext_mode*, either 4 or 8. If *ext_mode* = 4,
-        check whether 1st level is divisible by 2 (if not we raise a
-        ``ValueError``). Also check whether from 2nd level onwards, the coefs can
-        be divided by 4. If any dimension size is not a multiple of 4, append extra
-        coefs by repeating the edges. If *ext_mode* = 8, check whether 1st level is
-        divisible by 4 (if not we raise a ``ValueError``). Also check whether from
-        2nd level onwards, the coeffs can be divided by 8. If any dimension size is
-        not a multiple of 8, append extra coeffs by repeating the edges twice.
+    def cl_inverse(self, pyramid):
+        """Perform an *n*-level dual-tree complex wavelet (DTCWT) 3D
+        reconstruction leaving the result on the device.
 
-        Example::
+        :param pyramid: The :py:class:`dtcwt.Pyramid`-like instance representing the transformed signal.
 
-        # Performs a 3-level reconstruction from Yl,Yh using the 13,19-tap
-        # filters for level 1 and the Q-shift 14-tap filters for levels >= 2.
-        Z = dtwaveifm3(Yl, Yh, 'near_sym_b', 'qshift_b')
+        :returns: A :py:class:`pyopencl.array.Array` instance with the reconstruction.
 
-        .. codeauthor:: Rich Wareham <rjw57@cantab.net>, Aug 2013
-        .. codeauthor:: Huizhong Chen, Jan 2009
-        .. codeauthor:: Nick Kingsbury, Cambridge University, July 1999.
+        If *pyramid* is a :py:class:`dtcwt.opencl.Pyramid` instance, the
+        device-side arrays are used directly. Otherwise, the lowpass and
+        highpass arrays are copied to the device. As with
+        :py:meth:`dtcwt.numpy.Transform3d.inverse`, highpasses which are
+        ``None`` are treated as being zero.
 
         """
-        Yl = td_signal.lowpass
-        Yh = td_signal.highpasses
+        if self.queue_pool is not None:
+            return self._pool_call('cl_inverse', self.queue_pool.queue_of(getattr(pyramid, 'cl_lowpass', None)),
+                                   pyramid)
 
-        # Try to load coefficients if biort is a string parameter
-        if len(self.biort) == 4:
-            h0o, g0o, h1o, g1o = self.biort
-        elif len(self.biort) == 6:
-            h0o, g0o, h1o, g1o, h2o, g2o = self.biort
+        queue = self.queue
+
+        if isinstance(pyramid, Pyramid):
+            Yl, Yh = pyramid.cl_lowpass, pyramid.cl_highpasses
         else:
-            raise ValueError('Biort wavelet must have 6 or 4 components.')
+            Yl, Yh = pyramid.lowpass, pyramid.highpasses
+        level_sizes = getattr(pyramid, 'level_sizes', None)
+
+        h0o, g0o, h1o, g1o = self._level1_filters()
 
-        # If qshift has 12 elements instead of 8, then it's a modified
-        # rotationally symmetric wavelet
-        # FIXME: there's probably a nicer way to do this
         if len(self.qshift) == 8:
             h0a, h0b, g0a, g0b, h1a, h1b, g1a, g1b = self.qshift
         elif len(self.qshift) == 12:
@@ -193,7 +198,9 @@ class Transform3d(Transform3dNumPy):
         else:
             raise ValueError('Qshift wavelet must have 12 or 8 components.')
 
-        X = Yl
+        # Copy inputs to the device if necessary
+        Yl = to_device(Yl, queue=queue)
+        Yh = tuple(to_device(x, queue=queue, dtype=np.complex64) if x is not None else None for x in Yh)
 
         nlevels = len(Yh)
         # level is 0-indexed but interpreted starting from the *last* level
@@ -201,440 +208,205 @@ class Transform3d(Transform3dNumPy):
             # Transform
             if level == nlevels-1: # non-obviously this is the 'first' level
                 if Yh[-level-1] is None:
-                    Yl = _level1_ifm_no_highpass(Yl, g0o, g1o)
+                    Yl = _level1_ifm_no_highpass(Yl, g0o, g1o, queue)
                 else:
-                    Yl = _level1_ifm(Yl, Yh[-level-1], g0o, g1o)
+                    Yl = _level1_ifm(Yl, Yh[-level-1], g0o, g1o, queue)
             else:
-                # Gracefully handle the Yh[0] is None case.
-                if Yh[-level-2] is not None:
-                    prev_shape = Yh[-level-2].shape
-                else:
-                    prev_shape = np.array(Yh[-level-1].shape) * 2
+                prev_shape = finer_level_size(Yl, Yh, level_sizes, level)
 
-                Yl = _level2_ifm(Yl, Yh[-level-1], g0a, g0b, g1a, g1b, self.ext_mode, prev_shape)
+                if Yh[-level-1] is None:
+                    Yl = _level2_ifm_no_highpass(Yl, g0a, g0b, self.ext_mode, prev_shape, queue)
+                else:
+                    Yl = _level2_ifm(Yl, Yh[-level-1], g0a, g0b, g1a, g1b, self.ext_mode, prev_shape, queue)
 
         return Yl
 
-def _level1_xfm(X, h0o, h1o, ext_mode):
-    """Perform level 1 of the 3d transform.
+    def _level1_filters(self):
+        """Return the level 1 filters (h0o, g0o, h1o, g1o) checking that they
+        are supported by the OpenCL implementation.
 
-    """
-    # Check shape of input according to ext_mode. Note that shape of X is
-    # double original input in each direction.
-    if ext_mode == 4 and np.any(np.fmod(X.shape, 2) != 0):
+        """
+        if len(self.biort) == 4:
+            h0o, g0o, h1o, g1o = self.biort
+        elif len(self.biort) == 6:
+            h0o, g0o, h1o, g1o, h2o, g2o = self.biort
+        else:
+            raise ValueError('Biort wavelet must have 6 or 4 components.')
+
+        if h0o.shape[0] % 2 == 0 or g0o.shape[0] % 2 == 0:
+            raise ValueError('Level 1 filters must have odd length for the OpenCL 3D transform.')
+
+        return h0o, g0o, h1o, g1o
+
+# Octants of the work area holding each group of four subbands in a highpass
+# array. Each is a triple giving the filter, 0 for lowpass and 1 for
+# highpass, applied along each axis.
+_HIGHPASS_OCTANTS = (
+    (0, 1, 0),  # HLL
+    (1, 0, 0),  # LHL
+    (1, 1, 0),  # HHL
+    (0, 0, 1),  # LLH
+    (0, 1, 1),  # HLH
+    (1, 0, 1),  # LHH
+    (1, 1, 1),  # HHH
+)
+
+_LOWPASS_OCTANT = (0, 0, 0)
+
+def _check_level1_input(shape, ext_mode):
+    # Check shape of input according to ext_mode.
+    if ext_mode == 4 and np.any(np.fmod(shape, 2) != 0):
         raise ValueError('Input shape should be a multiple of 2 in each direction when self.ext_mode == 4')
-    elif ext_mode == 8 and np.any(np.fmod(X.shape, 4) != 0):
+    elif ext_mode == 8 and np.any(np.fmod(shape, 4) != 0):
         raise ValueError('Input shape should be a multiple of 4 in each direction when self.ext_mode == 8')
 
-    # Create work area
-    work_shape = np.asanyarray(X.shape) * 2
-
-    # We need one extra row per octant if filter length is even
-    if h0o.shape[0] % 2 == 0:
-        work_shape += 2
-
-    work = np.zeros(work_shape, dtype=X.dtype)
-
-    # Form some useful slices
-    s0a = slice(None, work.shape[0] >> 1)
-    s1a = slice(None, work.shape[1] >> 1)
-    s2a = slice(None, work.shape[2] >> 1)
-    s0b = slice(work.shape[0] >> 1, None)
-    s1b = slice(work.shape[1] >> 1, None)
-    s2b = slice(work.shape[2] >> 1, None)
-
-    x0a = slice(None, X.shape[0])
-    x1a = slice(None, X.shape[1])
-    x2a = slice(None, X.shape[2])
-    x0b = slice(work.shape[0] >> 1, (work.shape[0] >> 1) + X.shape[0])
-    x1b = slice(work.shape[1] >> 1, (work.shape[1] >> 1) + X.shape[1])
-    x2b = slice(work.shape[2] >> 1, (work.shape[2] >> 1) + X.shape[2])
-
-    # Assign input
-    if h0o.shape[0] % 2 == 0:
-        work[:X.shape[0], :X.shape[1], :X.shape[2]] = X
-
-        # Copy last rows/cols/slices
-        work[ X.shape[0], :X.shape[1], :X.shape[2]] = X[-1, :, :]
-        work[:X.shape[0],  X.shape[1], :X.shape[2]] = X[:, -1, :]
-        work[:X.shape[0], :X.shape[1],  X.shape[2]] = X[:, :, -1]
-        work[X.shape[0], X.shape[1], X.shape[2]] = X[-1,-1,-1]
-    else:
-        work[s0a, s1a, s2a] = X
-
-    # Loop over 2nd dimension extracting 2D slice from first and 3rd dimensions
-    for f in xrange(work.shape[1] >> 1):
-        # extract slice
-        y = work[s0a, f, x2a].T
-
-        # Do odd top-level filters on 3rd dim. The order here is important
-        # since the second filtering will modify the elements of y as well
-        # since y is merely a view onto work.
-        work[s0a, f, s2b] = colfilter(y, h1o).T
-        work[s0a, f, s2a] = colfilter(y, h0o).T
-
-    # Loop over 3rd dimension extracting 2D slice from first and 2nd dimensions
-    for f in xrange(work.shape[2]):
-        # Do odd top-level filters on rows.
-        y1 = work[x0a, x1a, f].T
-        y2 = np.vstack((colfilter(y1, h0o), colfilter(y1, h1o))).T
-
-        # Do odd top-level filters on columns.
-        work[s0a, :, f] = colfilter(y2, h0o)
-        work[s0b, :, f] = colfilter(y2, h1o)
-
-    # Return appropriate slices of output
-    return (
-        work[s0a, s1a, s2a],                # LLL
-        np.concatenate((
-            cube2c(work[x0a, x1b, x2a]),    # HLL
-            cube2c(work[x0b, x1a, x2a]),    # LHL
-            cube2c(work[x0b, x1b, x2a]),    # HHL
-            cube2c(work[x0a, x1a, x2b]),    # LLH
-            cube2c(work[x0a, x1b, x2b]),    # HLH
-            cube2c(work[x0b, x1a, x2b]),    # LHH
-            cube2c(work[x0b, x1b, x2b]),    # HLH
-            ), axis=3)
-        )
-
-def _level1_xfm_no_highpass(X, h0o, h1o, ext_mode):
-    """Perform level 1 of the 3d transform discarding highpass subbands.
+def _level1_xfm(X, h0o, h1o, ext_mode, queue):
+    """Perform level 1 of the 3d transform.
 
     """
-    # Check shape of input according to ext_mode. Note that shape of X is
-    # double original input in each direction.
-    if ext_mode == 4 and np.any(np.fmod(X.shape, 2) != 0):
-        raise ValueError('Input shape should be a multiple of 2 in each direction when self.ext_mode == 4')
-    elif ext_mode == 8 and np.any(np.fmod(X.shape, 4) != 0):
-        raise ValueError('Input shape should be a multiple of 4 in each direction when self.ext_mode == 8')
+    _check_level1_input(X.shape, ext_mode)
+    octants = _filter_octants(X, (h0o, h1o), axis_convolve,
+                              (_LOWPASS_OCTANT,) + _HIGHPASS_OCTANTS, queue)
+    return octants[_LOWPASS_OCTANT], _octants_to_highpasses(octants, queue)
 
-    out = np.zeros_like(X)
+def _level1_xfm_no_highpass(X, h0o, h1o, ext_mode, queue):
+    """Perform level 1 of the 3d transform discarding highpass subbands.
 
-    # Loop over 2nd dimension extracting 2D slice from first and 3rd dimensions
-    for f in xrange(X.shape[1]):
-        # extract slice
-        y = X[:, f, :].T
-        out[:, f, :] = colfilter(y, h0o).T
+    """
+    _check_level1_input(X.shape, ext_mode)
+    octants = _filter_octants(X, (h0o, h1o), axis_convolve, (_LOWPASS_OCTANT,), queue)
+    return octants[_LOWPASS_OCTANT]
 
-  # Loop over 3rd dimension extracting 2D slice from first and 2nd dimensions
-    for f in xrange(X.shape[2]):
-        y = colfilter(out[:, :, f].T, h0o).T
-        out[:, :, f] = colfilter(y, h0o)
+def _level2_xfm(X, h0a, h0b, h1a, h1b, ext_mode, queue):
+    """Perform level 2 or greater of the 3d transform.
 
-    return out
+    """
+    X = _extend_level2_input(X, ext_mode, queue)
+    octants = _filter_octants(X, (h0b, h1b), axis_convolve_dfilter,
+                              (_LOWPASS_OCTANT,) + _HIGHPASS_OCTANTS, queue)
+    return octants[_LOWPASS_OCTANT], _octants_to_highpasses(octants, queue)
 
-def _level2_xfm(X, h0a, h0b, h1a, h1b, ext_mode):
-    """Perform level 2 or greater of the 3d transform.
+def _level2_xfm_no_highpass(X, h0a, h0b, ext_mode, queue):
+    """Perform level 2 or greater of the 3d transform discarding highpass
+    subbands.
 
     """
+    X = _extend_level2_input(X, ext_mode, queue)
+    octants = _filter_octants(X, (h0b, None), axis_convolve_dfilter, (_LOWPASS_OCTANT,), queue)
+    return octants[_LOWPASS_OCTANT]
 
-    if ext_mode == 4:
-        if X.shape[0] % 4 != 0:
-            X = np.concatenate((X[[0],:,:], X, X[[-1],:,:]), 0)
-        if X.shape[1] % 4 != 0:
-            X = np.concatenate((X[:,[0],:], X, X[:,[-1],:]), 1)
-        if X.shape[2] % 4 != 0:
-            X = np.concatenate((X[:,:,[0]], X, X[:,:,[-1]]), 2)
-    elif self.ext_mode == 8:
-        if X.shape[0] % 8 != 0:
-            X = np.concatenate((X[(0,0),:,:], X, X[(-1,-1),:,:]), 0)
-        if X.shape[1] % 8 != 0:
-            X = np.concatenate((X[:,(0,0),:], X, X[:,(-1,-1),:]), 1)
-        if X.shape[2] % 8 != 0:
-            X = np.concatenate((X[:,:,(0,0)], X, X[:,:,(-1,-1)]), 2)
-
-    # Create work area
-    work_shape = np.asanyarray(X.shape)
-    work = np.zeros(work_shape, dtype=X.dtype)
-
-    # Form some useful slices
-    s0a = slice(None, work.shape[0] >> 1)
-    s1a = slice(None, work.shape[1] >> 1)
-    s2a = slice(None, work.shape[2] >> 1)
-    s0b = slice(work.shape[0] >> 1, None)
-    s1b = slice(work.shape[1] >> 1, None)
-    s2b = slice(work.shape[2] >> 1, None)
-
-    # Assign input
-    work = X
-
-    # Loop over 2nd dimension extracting 2D slice from first and 3rd dimensions
-    for f in xrange(work.shape[1]):
-        # extract slice (copy required because we overwrite the work array)
-        y = work[:, f, :].T.copy()
-
-        # Do even Qshift filters on 3rd dim.
-        work[:, f, s2b] = coldfilt(y, h1b, h1a).T
-        work[:, f, s2a] = coldfilt(y, h0b, h0a).T
-
-    # Loop over 3rd dimension extracting 2D slice from first and 2nd dimensions
-    for f in xrange(work.shape[2]):
-        # Do even Qshift filters on rows.
-        y1 = work[:, :, f].T
-        y2 = np.vstack((coldfilt(y1, h0b, h0a), coldfilt(y1, h1b, h1a))).T
-
-        # Do even Qshift filters on columns.
-        work[s0a, :, f] = coldfilt(y2, h0b, h0a)
-        work[s0b, :, f] = coldfilt(y2, h1b, h1a)
-
-    # Return appropriate slices of output
-    return (
-        work[s0a, s1a, s2a],                # LLL
-        np.concatenate((
-            cube2c(work[s0a, s1b, s2a]),    # HLL
-            cube2c(work[s0b, s1a, s2a]),    # LHL
-            cube2c(work[s0b, s1b, s2a]),    # HHL
-            cube2c(work[s0a, s1a, s2b]),    # LLH
-            cube2c(work[s0a, s1b, s2b]),    # HLH
-            cube2c(work[s0b, s1a, s2b]),    # LHH
-            cube2c(work[s0b, s1b, s2b]),    # HLH
-            ), axis=3)
-        )
-
-def _level1_ifm(Yl, Yh, g0o, g1o):
+def _level1_ifm(Yl, Yh, g0o, g1o, queue):
     """Perform level 1 of the inverse 3d transform.
 
     """
-    # Create work area
-    work = np.zeros(np.asanyarray(Yl.shape) * 2, dtype=Yl.dtype)
-
-    # Work out shape of output
-    Xshape = np.asanyarray(work.shape) >> 1
-    if g0o.shape[0] % 2 == 0:
-        # if we have an even length filter, we need to shrink the output by 1
-        # to compensate for the addition of an extra row/column/slice in
-        # the forward transform
-        Xshape -= 1
-
-    # Form some useful slices
-    s0a = slice(None, work.shape[0] >> 1)
-    s1a = slice(None, work.shape[1] >> 1)
-    s2a = slice(None, work.shape[2] >> 1)
-    s0b = slice(work.shape[0] >> 1, None)
-    s1b = slice(work.shape[1] >> 1, None)
-    s2b = slice(work.shape[2] >> 1, None)
-
-    x0a = slice(None, Xshape[0])
-    x1a = slice(None, Xshape[1])
-    x2a = slice(None, Xshape[2])
-    x0b = slice(work.shape[0] >> 1, (work.shape[0] >> 1) + Xshape[0])
-    x1b = slice(work.shape[1] >> 1, (work.shape[1] >> 1) + Xshape[1])
-    x2b = slice(work.shape[2] >> 1, (work.shape[2] >> 1) + Xshape[2])
-
-    # Assign regions of work area
-    work[s0a, s1a, s2a] = Yl
-    work[x0a, x1b, x2a] = c2cube(Yh[:,:,:, 0:4 ])
-    work[x0b, x1a, x2a] = c2cube(Yh[:,:,:, 4:8 ])
-    work[x0b, x1b, x2a] = c2cube(Yh[:,:,:, 8:12])
-    work[x0a, x1a, x2b] = c2cube(Yh[:,:,:,12:16])
-    work[x0a, x1b, x2b] = c2cube(Yh[:,:,:,16:20])
-    work[x0b, x1a, x2b] = c2cube(Yh[:,:,:,20:24])
-    work[x0b, x1b, x2b] = c2cube(Yh[:,:,:,24:28])
-
-    for f in xrange(work.shape[2]):
-        # Do odd top-level filters on rows.
-        y = colfilter(work[:, x1a, f].T, g0o) + colfilter(work[:, x1b, f].T, g1o)
-
-        # Do odd top-level filters on columns.
-        work[s0a, s1a, f] = colfilter(y[:, x0a].T, g0o) + colfilter(y[:, x0b].T, g1o)
-
-    for f in xrange(work.shape[1]>>1):
-        # Do odd top-level filters on 3rd dim.
-        y = work[s0a, f, :].T
-        work[s0a, f, s2a] = (colfilter(y[x2a, :], g0o) + colfilter(y[x2b, :], g1o)).T
-
-    if g0o.shape[0] % 2 == 0:
-        return work[1:(work.shape[0]>>1), 1:(work.shape[1]>>1), 1:(work.shape[2]>>1)]
-    else:
-        return work[s0a, s1a, s2a]
-
-def _level1_ifm_no_highpass(Yl, g0o, g1o):
+    return _combine_octants(_highpasses_to_octants(Yl, Yh, queue), (g0o, g1o), axis_convolve, queue)
+
+def _level1_ifm_no_highpass(Yl, g0o, g1o, queue):
     """Perform level 1 of the inverse 3d transform assuming highpass
     coefficients are zero.
 
     """
-    # Create work area
-    output = np.zeros_like(Yl)
+    return _combine_octants({_LOWPASS_OCTANT: Yl}, (g0o, g1o), axis_convolve, queue)
 
-    for f in xrange(Yl.shape[2]):
-        y = colfilter(Yl[:, :, f].T, g0o)
-        output[:, :, f] = colfilter(y.T, g0o)
-
-    for f in xrange(Yl.shape[1]):
-        y = output[:, f, :].T.copy()
-        output[:, f, :] = colfilter(y, g0o)
+def _level2_ifm(Yl, Yh, g0a, g0b, g1a, g1b, ext_mode, prev_level_size, queue):
+    """Perform level 2 or greater of the 3d inverse transform.
 
-    return output
+    """
+    work = _combine_octants(_highpasses_to_octants(Yl, Yh, queue), (g0b, g1b), axis_convolve_ifilter, queue)
+    return remove_level2_extension(work, Yh.shape[:3], prev_level_size, ext_mode)
 
-def _level2_ifm(Yl, Yh, g0a, g0b, g1a, g1b, ext_mode, prev_level_size):
-    """Perform level 2 or greater of the 3d inverse transform.
+def _level2_ifm_no_highpass(Yl, g0a, g0b, ext_mode, prev_level_size, queue):
+    """Perform level 2 or greater of the 3d inverse transform assuming
+    highpass coefficients are zero.
 
     """
-    # Create work area
-    work = np.zeros(np.asanyarray(Yl.shape)*2, dtype=Yl.dtype)
-
-    # Form some useful slices
-    s0a = slice(None, work.shape[0] >> 1)
-    s1a = slice(None, work.shape[1] >> 1)
-    s2a = slice(None, work.shape[2] >> 1)
-    s0b = slice(work.shape[0] >> 1, None)
-    s1b = slice(work.shape[1] >> 1, None)
-    s2b = slice(work.shape[2] >> 1, None)
-
-    # Assign regions of work area
-    work[s0a, s1a, s2a] = Yl
-    work[s0a, s1b, s2a] = c2cube(Yh[:,:,:, 0:4 ])
-    work[s0b, s1a, s2a] = c2cube(Yh[:,:,:, 4:8 ])
-    work[s0b, s1b, s2a] = c2cube(Yh[:,:,:, 8:12])
-    work[s0a, s1a, s2b] = c2cube(Yh[:,:,:,12:16])
-    work[s0a, s1b, s2b] = c2cube(Yh[:,:,:,16:20])
-    work[s0b, s1a, s2b] = c2cube(Yh[:,:,:,20:24])
-    work[s0b, s1b, s2b] = c2cube(Yh[:,:,:,24:28])
-
-    for f in xrange(work.shape[2]):
-        # Do even Qshift filters on rows.
-        y = colifilt(work[:, s1a, f].T, g0b, g0a) + colifilt(work[:, s1b, f].T, g1b, g1a)
-
-          # Do even Qshift filters on columns.
-        work[:, :, f] = colifilt(y[:, s0a].T, g0b, g0a) + colifilt(y[:,s0b].T, g1b, g1a)
-
-    for f in xrange(work.shape[1]):
-        # Do even Qshift filters on 3rd dim.
-        y = work[:, f, :].T
-        work[:, f, :] = (colifilt(y[s2a, :], g0b, g0a) + colifilt(y[s2b, :], g1b, g1a)).T
-
-    # Now check if the size of the previous level is exactly twice the size of
-    # the current level. If YES, this means we have not done the extension in
-    # the previous level. If NO, then we have to remove the appended row /
-    # column / frame from the previous level DTCWT coefs.
-
-    prev_level_size = np.asarray(prev_level_size)
-    curr_level_size = np.asarray(Yh.shape)
-
-    if ext_mode == 4:
-        if curr_level_size[0] * 2 != prev_level_size[0]:
-            # Discard the top and bottom rows
-            work = work[1:-1,:,:]
-        if curr_level_size[1] * 2 != prev_level_size[1]:
-            # Discard the top and bottom rows
-            work = work[:,1:-1,:]
-        if curr_level_size[2] * 2 != prev_level_size[2]:
-            # Discard the top and bottom rows
-            work = work[:,:,1:-1]
-    elif ext_mode == 8:
-        if curr_level_size[0] * 2 != prev_level_size[0]:
-        # Discard the top and bottom rows
-            work = work[2:-2,:,:]
-        if curr_level_size[1] * 2 != prev_level_size[1]:
-        # Discard the top and bottom rows
-            work = work[:,2:-2,:]
-        if curr_level_size[2] * 2 != prev_level_size[2]:
-        # Discard the top and bottom rows
-            work = work[:,:,2:-2]
-
-    return work
+    work = _combine_octants({_LOWPASS_OCTANT: Yl}, (g0b, None), axis_convolve_ifilter, queue)
+    return remove_level2_extension(work, np.asanyarray(Yl.shape[:3]) >> 1, prev_level_size, ext_mode)
 
 #==========================================================================================
 #                       **********    INTERNAL FUNCTIONS    **********
 #==========================================================================================
 
-def cube2c(y):
-    """Convert from octets in y to complex numbers in z.
-
-    Arrange pixels from the corners of the quads into
-    2 subimages of alternate real and imag pixels.
-
-        e----f
-       /|   /|
-      a----b |
-      | g- | h
-      |/   |/
-      c----d
+def _extend_level2_input(X, ext_mode, queue):
+    """Extend the input to level 2 or greater of the 3d transform on the device
+    by repeating edges as required by *ext_mode*.
 
     """
-
-    # TODO: check this scaling
-    j2 = 0.5 * np.array([1, 1j])
-
-    # This is taken from:
-    # Efficient Registration of Nonrigid 3-D Bodies, Huizhong Chen, and Nick Kingsbury, 2012
-    # IEEE TRANSACTIONS ON IMAGE PROCESSING, VOL. 21, NO. 1, JANUARY 2012
-    # eqs. (6) to (9)
-
-    A = y[1::2, 1::2, 1::2]
-    B = y[1::2, 1::2, 0::2]
-    C = y[1::2, 0::2, 1::2]
-    D = y[1::2, 0::2, 0::2]
-    E = y[0::2, 1::2, 1::2]
-    F = y[0::2, 1::2, 0::2]
-    G = y[0::2, 0::2, 1::2]
-    H = y[0::2, 0::2, 0::2]
-
-    # TODO: check if the above should be the below and, if so, fix c2cube
-    #
-    # A = y[0::2, 0::2, 0::2]
-    # B = y[0::2, 0::2, 1::2]
-    # C = y[0::2, 1::2, 0::2]
-    # D = y[0::2, 1::2, 1::2]
-    # E = y[1::2, 0::2, 0::2]
-    # F = y[1::2, 0::2, 1::2]
-    # G = y[1::2, 1::2, 0::2]
-    # H = y[1::2, 1::2, 1::2]
-
-    # Combine to form subbands
-    p = ( A-G-D-F) * j2[0] + ( B-H+C+E) * j2[1]
-    q = ( A-G+D+F) * j2[0] + (-B+H+C+E) * j2[1]
-    r = ( A+G+D-F) * j2[0] + ( B+H-C+E) * j2[1]
-    s = ( A+G-D+F) * j2[0] + (-B-H-C+E) * j2[1]
-
-    # Form the 2 subbands in z.
-    z = np.concatenate((
-        p[:,:,:,np.newaxis],
-        q[:,:,:,np.newaxis],
-        r[:,:,:,np.newaxis],
-        s[:,:,:,np.newaxis],
-    ), axis=3)
-
-    return z
-
-def c2cube(z):
-    """Convert from complex numbers octets in z to octets in y.
-
-    Undoes cube2c().
-
-        e----f
-       /|   /|
-      a----b |
-      | g- | h
-      |/   |/
-      c----d
+    pads = level2_extension(X.shape, ext_mode)
+    if any(pads):
+        X = pad_edge(X, tuple((p, p) for p in pads), queue=queue)
+    return X
+
+def _filter_octants(X, filters, convolve, octants, queue):
+    """Filter the whole volume *X* on the device along its 3rd, 2nd and then
+    1st axes with *convolve*. Return a dictionary mapping each triple in
+    *octants* to the result of filtering along each axis with the
+    corresponding element of the pair *filters*. Intermediate results shared
+    between octants are computed only once.
 
     """
+    result = {}
+    for i2 in (0, 1):
+        if not any(o[2] == i2 for o in octants):
+            continue
+        y2 = convolve(X, filters[i2], axis=2, queue=queue)
+        for i1 in (0, 1):
+            if not any(o[1:] == (i1, i2) for o in octants):
+                continue
+            y1 = convolve(y2, filters[i1], axis=1, queue=queue)
+            for i0 in (0, 1):
+                if (i0, i1, i2) in octants:
+                    result[(i0, i1, i2)] = convolve(y1, filters[i0], axis=0, queue=queue)
+    return result
+
+def _combine_octants(octants, filters, convolve, queue):
+    """The inverse of :py:func:`_filter_octants`. Filter each volume in the
+    dictionary *octants* along its 2nd, 1st and then 3rd axes with *convolve*
+    and the filters in the pair *filters* indexed by its key and return the sum
+    of the results. Sums are formed after filtering along each axis so that
+    the volumes are combined in the same way as in the NumPy backend.
 
-    scale = 0.5
-
-    p = z[:,:,:,0]
-    q = z[:,:,:,1]
-    r = z[:,:,:,2]
-    s = z[:,:,:,3]
-
-    pr, pi = p.real, p.imag
-    qr, qi = q.real, q.imag
-    rr, ri = r.real, r.imag
-    sr, si = s.real, s.imag
-
-    y = np.zeros(np.asanyarray(z.shape[:3])*2, dtype=z.real.dtype)
+    """
+    Z = None
+    for i2 in (0, 1):
+        y0 = None
+        for i0 in (0, 1):
+            y1 = None
+            for i1 in (0, 1):
+                if (i0, i1, i2) in octants:
+                    y1 = _accumulate(y1, convolve(octants[(i0, i1, i2)], filters[i1], axis=1, queue=queue))
+            if y1 is not None:
+                y0 = _accumulate(y0, convolve(y1, filters[i0], axis=0, queue=queue))
+        if y0 is not None:
+            Z = _accumulate(Z, convolve(y0, filters[i2], axis=2, queue=queue))
+    return Z
+
+def _accumulate(total, Y):
+    if total is None:
+        return Y
+    total += Y
+    return total
+
+def _octants_to_highpasses(octants, queue):
+    """Convert the seven highpass octants in *octants* into a single device
+    array of 28 complex subbands.
 
-    y[1::2, 1::2, 1::2] = ( pr+qr+rr+sr)
-    y[0::2, 0::2, 1::2] = (-pr-qr+rr+sr)
-    y[1::2, 0::2, 0::2] = (-pr+qr+rr-sr)
-    y[0::2, 1::2, 0::2] = (-pr+qr-rr+sr)
+    """
+    shape = octants[_HIGHPASS_OCTANTS[0]].shape
+    Yh = empty(tuple(n >> 1 for n in shape) + (4*len(_HIGHPASS_OCTANTS),), np.complex64, queue=queue)
+    for idx, octant in enumerate(_HIGHPASS_OCTANTS):
+        cube2c(octants[octant], queue=queue, output=Yh[:,:,:,4*idx:4*(idx+1)])
+    return Yh
 
-    y[1::2, 1::2, 0::2] = ( pi-qi+ri-si)
-    y[0::2, 0::2, 0::2] = (-pi+qi+ri-si)
-    y[1::2, 0::2, 1::2] = ( pi+qi-ri-si)
-    y[0::2, 1::2, 1::2] = ( pi+qi+ri+si)
+def _highpasses_to_octants(Yl, Yh, queue):
+    """Convert the 28 complex subbands of the highpass device array *Yh* back
+    into octants and return them along with the lowpass *Yl* in a dictionary
+    suitable for :py:func:`_combine_octants`.
 
-    return y * scale
+    """
+    octants = { _LOWPASS_OCTANT: Yl }
+    for idx, octant in enumerate(_HIGHPASS_OCTANTS):
+        octants[octant] = c2cube(Yh[:,:,:,4*idx:4*(idx+1)], queue=queue)
+    return octants
 
 # vim:sw=4:sts=4:et
@@ -9,6 +9,7 @@ These functions are 2D-only for the moment.
 """
 from __future__ import division, absolute_import
 
+import collections
 import itertools
 
 from six.moves import xrange
@@ -19,8 +20,12 @@ import dtcwt.sampling
 import dtcwt.utils
 import numpy as np
 
+from dtcwt.utils import SlicePool, check_pool
+
 __all__ = [
+    'RegistrationFeatures',
     'estimatereg',
+    'register_sequence',
     'velocityfield',
     'warp',
     'warptransform',
@@ -43,16 +48,33 @@ def phasegradient(sb1, sb2, w=None):
     Returns 3 NxM matrices giving the d/dy, d/dx and d/dt phase values
     respectively at position (x,y).
 
+    The subbands may also be NxMxK stacks of subbands. In which case each
+    element of *w* may be a length K vector giving the expected phase shift
+    for each subband and the returned matrices are NxMxK.
+
+    """
+    if sb1.size != sb2.size:
+        raise ValueError('Subbands should have identical size')
+
+    return _phasegradient(_subband_features(sb1), _subband_features(sb2), w)
+
+def _phasegradient(f1, f2, w=None):
+    """
+    INTERNAL
+
+    Compute the phase gradients of :py:func:`phasegradient` from the subband
+    features *f1* and *f2* returned by :py:func:`_subband_features`.
+
     """
     if w is None:
         w = (0,0)
 
-    if sb1.size != sb2.size:
-        raise ValueError('Subbands should have identical size')
+    # Keep the precision of the subbands
+    w = np.asanyarray(w, dtype=_real_dtype(f1.subband))
 
     # Measure horizontal phase gradients by taking the angle of
     # summed conjugate products across horizontal pairs.
-    S = (sb1[:,1:] * np.conj(sb1[:,:-1]) + sb2[:,1:] * np.conj(sb2[:,:-1])) * np.exp(-1j * w[0])
+    S = (f1.hprods + f2.hprods) * np.exp(-1j * w[0])
     #dx = np.angle(dtcwt.sampling.sample(S, xs-0.5, ys, method='bilinear')) + w[0]
     dx = np.hstack((
         np.angle(S[:,:1]),
@@ -62,7 +84,7 @@ def phasegradient(sb1, sb2, w=None):
 
     # Measure vertical phase gradients by taking the angle of
     # summed conjugate products across vertical pairs.
-    S = (sb1[1:,:] * np.conj(sb1[:-1,:]) + sb2[1:,:] * np.conj(sb2[:-1,:])) * np.exp(-1j * w[1])
+    S = (f1.vprods + f2.vprods) * np.exp(-1j * w[1])
     dy = np.vstack((
         np.angle(S[:1,:]),
         np.angle(0.5 * (S[:-1,:] + S[1:,:])),
@@ -70,7 +92,7 @@ def phasegradient(sb1, sb2, w=None):
     )) + w[1]
 
     # Measure temporal phase differences between refh and prevh
-    A = sb2 * np.conj(sb1)
+    A = f2.subband * np.conj(f1.subband)
     dt = np.angle(A)
 
     return dy, dx, dt
@@ -81,6 +103,86 @@ def _pow2(a):
 def _pow3(a):
     return a * a * a
 
+# Regions of a subband padded by one pixel on each side which select the
+# diagonal neighbours (-1,-1), (+1,-1), (-1,+1) and (+1,+1) of each pixel.
+_NEIGHBOUR_REGIONS = (
+    (slice(0,-2), slice(0,-2)),
+    (slice(0,-2), slice(2,None)),
+    (slice(2,None), slice(0,-2)),
+    (slice(2,None), slice(2,None)),
+)
+
+class _SubbandFeatures(object):
+    """
+    INTERNAL
+
+    The quantities used by :py:func:`phasegradient` and :py:func:`confidence`
+    which depend only on the subband *subband*. Each is computed when first
+    used and so the public functions compute only those they need.
+
+    """
+    def __init__(self, subband):
+        self.subband = subband
+        self._padded = None
+        self._cubed_neighbours = None
+        self._hprods = None
+        self._vprods = None
+
+    def compute(self):
+        """Compute every feature now rather than when first used."""
+        for name in ('padded', 'cubed_neighbours', 'hprods', 'vprods'):
+            getattr(self, name)
+        return self
+
+    @property
+    def padded(self):
+        """The subband padded by one pixel on each side by repeating its edges."""
+        if self._padded is None:
+            sb = self.subband
+            self._padded = np.concatenate((
+                np.concatenate((sb[  :1,:1], sb[  :1,:], sb[  :1,-1:]), axis=1),
+                np.concatenate((sb[  : ,:1], sb        , sb[  : ,-1:]), axis=1),
+                np.concatenate((sb[-1: ,:1], sb[-1: ,:], sb[-1: ,-1:]), axis=1),
+            ), axis=0)
+        return self._padded
+
+    @property
+    def cubed_neighbours(self):
+        """The sum of the cubed magnitudes of the diagonal neighbours of each
+        pixel.
+
+        """
+        if self._cubed_neighbours is None:
+            padded3_abs = _pow3(np.abs(self.padded))
+            cubed_neighbours = 0.0
+            for region in _NEIGHBOUR_REGIONS:
+                cubed_neighbours += padded3_abs[region]
+            self._cubed_neighbours = cubed_neighbours
+        return self._cubed_neighbours
+
+    @property
+    def hprods(self):
+        """The conjugate products of horizontally adjacent pixels."""
+        if self._hprods is None:
+            self._hprods = self.subband[:,1:] * np.conj(self.subband[:,:-1])
+        return self._hprods
+
+    @property
+    def vprods(self):
+        """The conjugate products of vertically adjacent pixels."""
+        if self._vprods is None:
+            self._vprods = self.subband[1:,:] * np.conj(self.subband[:-1,:])
+        return self._vprods
+
+def _subband_features(sb):
+    """
+    INTERNAL
+
+    Return the :py:class:`_SubbandFeatures` of the subband *sb*.
+
+    """
+    return _SubbandFeatures(sb)
+
 def confidence(sb1, sb2, epsilon=1e-6):
     """
     Compute the confidence measure of subbands *sb1* and *sb2* which should be
@@ -91,53 +193,115 @@ def confidence(sb1, sb2, epsilon=1e-6):
     the case when the wavelet coefficients are very small (and so dominated
     by noise). It should be set to be comparable to the cube of the amplitude
     of the measurement noise.
+
+    The subbands may also be NxMxK stacks of subbands. In which case the
+    confidence of each subband is computed independently.
     """
 
     if sb1.size != sb2.size:
         raise ValueError('Subbands should have identical size')
 
-    numerator, denominator = 0.0, epsilon
-
-    # Pad subbands
-    us = np.concatenate((
-        np.concatenate((sb1[  :1,:1], sb1[  :1,:], sb1[  :1,-1:]), axis=1),
-        np.concatenate((sb1[  : ,:1], sb1        , sb1[  : ,-1:]), axis=1),
-        np.concatenate((sb1[-1: ,:1], sb1[-1: ,:], sb1[-1: ,-1:]), axis=1),
-    ), axis=0)
-    vs = np.concatenate((
-        np.concatenate((sb2[  :1,:1], sb2[  :1,:], sb2[  :1,-1:]), axis=1),
-        np.concatenate((sb2[  : ,:1], sb2        , sb2[  : ,-1:]), axis=1),
-        np.concatenate((sb2[-1: ,:1], sb2[-1: ,:], sb2[-1: ,-1:]), axis=1),
-    ), axis=0)
-
-    us3_abs, vs3_abs = _pow3(np.abs(us)), _pow3(np.abs(vs))
-    prod_coeffs = np.conj(us) * vs
-
-    # pixels at -1, -1
-    region = (slice(0,-2), slice(0,-2))
-    numerator += prod_coeffs[region]
-    denominator += us3_abs[region] + vs3_abs[region]
-
-    # pixels at +1, -1
-    region = (slice(0,-2), slice(2,None))
-    numerator += prod_coeffs[region]
-    denominator += us3_abs[region] + vs3_abs[region]
-
-    # pixels at -1, +1
-    region = (slice(2,None), slice(0,-2))
-    numerator += prod_coeffs[region]
-    denominator += us3_abs[region] + vs3_abs[region]
-
-    # pixels at +1, +1
-    region = (slice(2,None), slice(2,None))
-    numerator += prod_coeffs[region]
-    denominator += us3_abs[region] + vs3_abs[region]
+    return _confidence(_subband_features(sb1), _subband_features(sb2), epsilon)
+
+def _confidence(f1, f2, epsilon=1e-6):
+    """
+    INTERNAL
+
+    Compute the confidence measure of :py:func:`confidence` from the subband
+    features *f1* and *f2* returned by :py:func:`_subband_features`.
+
+    """
+    prod_coeffs = np.conj(f1.padded) * f2.padded
+
+    numerator = 0.0
+    for region in _NEIGHBOUR_REGIONS:
+        numerator += prod_coeffs[region]
+    denominator = epsilon + f1.cubed_neighbours + f2.cubed_neighbours
 
     return _pow2(np.abs(numerator)) / denominator
 
+class RegistrationFeatures(object):
+    """
+    The quantities used to estimate registration which depend on only one
+    transformed image. When registering a sequence of images, each image is
+    compared to two neighbours. Computing these once per image and passing
+    them to :py:func:`estimatereg` or :py:func:`qtildematrices` in place of
+    the transformed image avoids computing them twice.
+
+    :param t: the transformed image
+
+    *t* should be a :py:class:`dtcwt.Pyramid`-compatible object. An instance of
+    this class is also :py:class:`dtcwt.Pyramid`-compatible. The features for
+    each level are computed when first needed.
+
+    .. py:attribute:: pyramid
+
+        The transformed image *t*.
+
+    """
+    def __init__(self, t):
+        self.pyramid = t
+        self._levels = {}
+
+    @property
+    def lowpass(self):
+        return self.pyramid.lowpass
+
+    @property
+    def highpasses(self):
+        return self.pyramid.highpasses
+
+    @property
+    def scales(self):
+        return self.pyramid.scales
+
+    def level(self, level):
+        """Return the features of the highpass subbands at the 0-based index
+        *level*.
+
+        """
+        try:
+            return self._levels[level]
+        except KeyError:
+            features = self._levels[level] = _subband_features(self.highpasses[level])
+            return features
+
+def _real_dtype(X):
+    """
+    INTERNAL
+
+    Return the real floating point type with the precision of the array *X*.
+
+    """
+    return np.finfo(X.dtype).dtype
+
+def _registration_features(t):
+    """
+    INTERNAL
+
+    Return *t* if it is a :py:class:`RegistrationFeatures` instance or the
+    features of the transformed image *t* otherwise.
+
+    """
+    if isinstance(t, RegistrationFeatures):
+        return t
+    return RegistrationFeatures(t)
+
 Q_TRIU_INDICES = list(zip(*np.triu_indices(6)))
 Q_TRIU_FLAT_INDICES = np.ravel_multi_index(np.triu_indices(6), (6,6))
 
+# Indices into the 21 packed upper triangle elements of the symmetric matrix Q
+# giving each element of the full 6x6 matrix.
+Q_SYMMETRIC_INDICES = np.zeros((6,6), dtype=np.intp)
+Q_SYMMETRIC_INDICES[np.triu_indices(6)] = np.arange(21)
+Q_SYMMETRIC_INDICES.T[np.triu_indices(6)] = np.arange(21)
+
+# Row and column indices into the 7x7 outer product of the vector
+# (dx, dy, x*dx, x*dy, y*dx, y*dy, -dt) with itself giving the 21 elements of
+# the upper triangle of Q followed by the 6 elements of q.
+QTILDE_ROWS = np.concatenate((np.triu_indices(6)[0], np.arange(6)))
+QTILDE_COLS = np.concatenate((np.triu_indices(6)[1], np.repeat(6, 6)))
+
 def qtildematrices(t_ref, t_target, levels):
     r"""
     Compute :math:`\tilde{Q}` matrices for given levels.
@@ -148,70 +312,71 @@ def qtildematrices(t_ref, t_target, levels):
     :returns: a tuple of :math:`\tilde{Q}` matrices for each index in *levels*
 
     Both *t_ref* and *t_target* should be
-    :py:class:`dtcwt.Pyramid`-compatible objects.
+    :py:class:`dtcwt.Pyramid`-compatible objects or
+    :py:class:`RegistrationFeatures` instances.
     Indices in *levels* are 0-based.
 
     The returned matrices are NxMx27 where NxM is the shape of the
     corresponding level's highpass subbands.
 
     """
-    # Extract highpasses
-    Yh1 = t_ref.highpasses
-    Yh2 = t_target.highpasses
+    # Extract per-image features
+    features1 = _registration_features(t_ref)
+    features2 = _registration_features(t_target)
 
     # A list of arrays of \tilde{Q} matrices for each level
     Qt_mats = []
 
     for level in levels:
-        highpasses1, highpasses2 = Yh1[level], Yh2[level]
-        xs, ys = np.meshgrid(np.arange(0,1,1/highpasses1.shape[1]),
-                             np.arange(0,1,1/highpasses1.shape[0]))
-
-        Qt_mat_sum = None
-        for subband in xrange(highpasses1.shape[2]):
-            C_d = confidence(highpasses1[:,:,subband], highpasses2[:,:,subband])
-            dy, dx, dt = phasegradient(highpasses1[:,:,subband], highpasses2[:,:,subband],
-                                            EXPECTED_SHIFTS[subband,:])
-
-            dx *= highpasses1.shape[1]
-            dy *= highpasses1.shape[0]
-
-            # This is the equivalent of the following for each member of the array
-            #  Kt_mat = np.array(((1, 0, s*x, 0, s*y, 0, 0), (0, 1, 0, s*x, 0, s*y, 0), (0,0,0,0,0,0,1)))
-            #  c_vec = np.array((dx, dy, -dt))
-            #  tmp = (Kt_mat.T).dot(c_vec)
-            tmp = (
-                dx, dy, xs*dx, xs*dy, ys*dx, ys*dy, -dt
-            )
-
-            # Calculate Qmatrix elements
-            Qt = np.zeros(dx.shape[:2] + (27,))
-            elem_idx = 0
-
-            # Q sub-matrix
-            for r, c in Q_TRIU_INDICES:
-                Qt[:,:,elem_idx] = tmp[r] * tmp[c]
-                elem_idx += 1
+        f1, f2 = features1.level(level), features2.level(level)
+        h, w = f1.subband.shape[:2]
+        Qt_mats.append(_level_qtilde(f1, f2, np.arange(h), np.arange(w), (h, w)))
 
-            # q sub-vector
-            for r in xrange(6):
-                Qt[:,:,elem_idx] = tmp[r] * tmp[6]
-                elem_idx += 1
-
-            # Include the confidence parameter
-            Qt *= C_d.reshape(Qt.shape[:-1] + (1,))**2
-
-            # Update Qt mats
-            if Qt_mat_sum is None:
-                Qt_mat_sum = Qt
-            else:
-                Qt_mat_sum += Qt
+    return Qt_mats
 
-        Qt_mats.append(Qt_mat_sum)
+def _level_qtilde(f1, f2, rows, cols, shape):
+    r"""
+    INTERNAL
 
-    return Qt_mats
+    Return the :math:`\tilde{Q}` matrices of :py:func:`qtildematrices` for
+    one level from the subband features *f1* and *f2* of a region of that
+    level. The region covers the pixel *rows* and *cols* of a level whose
+    full shape is *shape*.
 
-def solvetransform(Qtilde_vec):
+    """
+    highpasses1 = f1.subband
+    nsubbands = highpasses1.shape[2]
+    dtype = _real_dtype(highpasses1)
+    xs = (np.asarray(cols, dtype=dtype) / shape[1])[np.newaxis,:,np.newaxis]
+    ys = (np.asarray(rows, dtype=dtype) / shape[0])[:,np.newaxis,np.newaxis]
+
+    # Confidence and phase gradients for all subbands at once. Each is
+    # NxMx6 with the subband along the last axis.
+    C_d = _confidence(f1, f2)
+    dy, dx, dt = _phasegradient(f1, f2, EXPECTED_SHIFTS[:nsubbands,:].T)
+
+    dx *= shape[1]
+    dy *= shape[0]
+
+    # This is the equivalent of the following for each member of the array
+    #  Kt_mat = np.array(((1, 0, s*x, 0, s*y, 0, 0), (0, 1, 0, s*x, 0, s*y, 0), (0,0,0,0,0,0,1)))
+    #  c_vec = np.array((dx, dy, -dt))
+    #  tmp = (Kt_mat.T).dot(c_vec)
+    # scaled by the confidence so that the outer product of tmp with
+    # itself includes the C_d**2 weighting. tmp is NxMx6x7.
+    tmp = np.empty(dx.shape + (7,), dtype=dtype)
+    for idx, v in enumerate((dx, dy, xs*dx, xs*dy, ys*dx, ys*dy, -dt)):
+        np.multiply(v, C_d, out=tmp[...,idx])
+
+    # Summing the outer products over subbands is a stacked matrix product
+    # of the 7x6 and 6x7 matrices at each pixel.
+    outer = np.empty(dx.shape[:2] + (7,7), dtype=dtype)
+    np.matmul(np.swapaxes(tmp, -1, -2), tmp, out=outer)
+
+    # Extract Q sub-matrix and q sub-vector elements
+    return outer[..., QTILDE_ROWS, QTILDE_COLS]
+
+def solvetransform(Qtilde_vec, regularisation=1e-6):
     r"""
     Solve for affine transform parameter vector :math:`a` from :math:`\mathbf{\tilde{Q}}`
     matrix. decomposes :math:`\mathbf{\tilde{Q}}` as
@@ -223,30 +388,60 @@ def solvetransform(Qtilde_vec):
         \end{bmatrix}
 
     Returns :math:`\mathbf{a} = -\mathbf{Q}^{-1} \mathbf{q}`.
-    """
-
-    # Convert from 27-element vector into Q matrix and vector
-    Q = np.zeros(Qtilde_vec.shape[:-1] + (6*6,))
-    Q[..., Q_TRIU_FLAT_INDICES] = Qtilde_vec[...,:21]
-    q = Qtilde_vec[...,-6:]
-    Q = np.reshape(Q, Qtilde_vec.shape[:-1] + (6,6))
 
-    # Want to find a = -Q^{-1} q => Qa = -q
-    # The naive way would be: return -np.linalg.inv(Q).dot(q)
-    # A less naive way would be: return np.linalg.solve(Q, -q)
-
-    # NumPy >1.8 directly supports using the last two dimensions as a matrix. IF
-    # we get a LinAlgError, we assume that we need to fall-back to a NumPy 1.7
-    # approach which is *significantly* slower.
-    try:
-        rv = np.linalg.solve(Q, -q)
-    except np.linalg.LinAlgError:
-        # Try the slower fallback
-        rv = np.zeros(Qtilde_vec.shape[:-1] + (6,))
-        for idx in itertools.product(*list(xrange(s) for s in Qtilde_vec.shape[:-1])):
-            rv[idx] = np.linalg.solve(Q[idx], -q[idx])
-
-    return rv
+    :param Qtilde_vec: array of 27-element :math:`\mathbf{\tilde{Q}}` vectors as returned by :py:func:`qtildematrices`
+    :param regularisation: Tikhonov regularisation relative to the mean of the diagonal of each :math:`\mathbf{Q}`
+
+    Each symmetric matrix :math:`\mathbf{Q}` is regularised by adding
+    *regularisation* times the mean of its diagonal to the diagonal. All the
+    systems are then solved at once by an :math:`LDL^T` decomposition. Any
+    pivot made smaller than the regularisation by rounding is clamped so that,
+    if *regularisation* is positive, ill-conditioned or all-zero blocks give a
+    finite, small-norm solution. If *regularisation* is zero, the systems are
+    solved exactly and :py:class:`numpy.linalg.LinAlgError` is raised if any
+    :math:`\mathbf{Q}` is singular.
+    """
+    if regularisation < 0:
+        raise ValueError('Regularisation must not be negative')
+
+    # Transpose the packed upper triangle of Q and the vector q so that each
+    # element is a contiguous array over all the blocks. The solution is
+    # always computed in double precision.
+    Qtilde_vec = np.asanyarray(Qtilde_vec)
+    packed = np.ascontiguousarray(np.reshape(Qtilde_vec, (-1, 27)).T, dtype=np.float64)
+    q = packed[-6:]
+
+    diag = packed[Q_SYMMETRIC_INDICES[np.arange(6), np.arange(6)]]
+    scale = np.mean(diag, axis=0)
+
+    # Where Q is zero, so is q and any positive regulariser gives a = 0
+    scale[scale <= 0] = 1
+    lam = regularisation * scale
+
+    # LDL^T decomposition of each regularised Q. Only the strictly lower
+    # triangle of L is stored; its diagonal is unity.
+    L = np.zeros((6, 6, packed.shape[1]), dtype=packed.dtype)
+    D = np.empty_like(q)
+    for j in xrange(6):
+        LD = L[j, :j] * D[:j]
+        D[j] = np.maximum(diag[j] + lam - np.sum(LD * L[j, :j], axis=0), lam)
+        if np.any(D[j] <= 0):
+            # Only possible without regularisation
+            raise np.linalg.LinAlgError('Singular matrix')
+        L[j+1:, j] = packed[Q_SYMMETRIC_INDICES[j+1:, j]]
+        L[j+1:, j] -= np.einsum('ikn,kn->in', L[j+1:, :j], LD)
+        L[j+1:, j] /= D[j]
+
+    # Want to find a = -Q^{-1} q => L D L^T a = -q
+    a = -q
+    for i in xrange(1, 6):
+        a[i] -= np.sum(L[i, :i] * a[:i], axis=0)
+    a /= D
+    for i in xrange(4, -1, -1):
+        a[i] -= np.sum(L[i+1:, i] * a[i+1:], axis=0)
+
+    return np.reshape(a.T, Qtilde_vec.shape[:-1] + (6,)).astype(
+            np.result_type(Qtilde_vec.dtype, np.float32), copy=False)
 
 def normsamplehighpass(Yh, xs, ys, method=None):
     """
@@ -283,7 +478,12 @@ def warptransform(t, avecs, levels, method=None):
     :py:class:`dtcwt.Pyramid`-compatible instance.
 
     The *method* parameter is interpreted as in :py:func:`dtcwt.sampling.rescale` and
-    is the sampling method used to resize *avecs* to *shape*.
+    is the sampling method used to resize *avecs* to *shape* and to sample the
+    warped highpass subbands.
+
+    The velocity field is evaluated once for each distinct level shape and
+    shared, along with the phase images used to sample the subbands, by all
+    levels of that shape and all subbands.
 
     .. note::
 
@@ -294,22 +494,186 @@ def warptransform(t, avecs, levels, method=None):
     """
     warped_highpasses = list(t.highpasses)
 
+    # Velocity fields and phase images depend only on the shape and type of a
+    # level
+    grids = {}
+
     # Warp specified levels
     for l in levels:
-        warped_highpasses[l] = warphighpass(warped_highpasses[l], avecs, method=method)
+        Yh = warped_highpasses[l]
+        h, w, nsubbands = Yh.shape
+        key = (Yh.shape, Yh.dtype)
+        if key not in grids:
+            grids[key] = (
+                _unwrap_phase(np.arange(h), np.arange(w), nsubbands, Yh.dtype),
+                _warp_grid(avecs, (h, w), nsubbands, Yh.dtype, method=method),
+            )
+        unwrap, grid = grids[key]
+        warped_highpasses[l] = _warp_highpass(Yh * unwrap, grid, method=method)
 
     # Clone the transform
     return dtcwt.numpy.Pyramid(t.lowpass, tuple(warped_highpasses), t.scales)
 
-def estimatereg(source, reference, regshape=None, levels=None):
+@dtcwt.utils.memoize
+def _interpolation_matrix(src_size, dst_size, method=None):
+    """
+    INTERNAL
+
+    Return the *dst_size* x *src_size* matrix which resamples a vector of
+    length *src_size* to length *dst_size* with the same extent. The
+    conventions and the interpretation of *method* match
+    :py:func:`dtcwt.sampling.rescale`, which is separable, so that rescaling
+    a 2D array *X* is equivalent to ``Wy.dot(X).dot(Wx.T)``.
+
+    The return values are memoized and read-only.
+
+    """
+    if method is None:
+        method = 'lanczos'
+
+    s = (np.arange(dst_size) + 0.5) * (float(src_size) / dst_size) - 0.5
+    floor_s = np.floor(s)
+    frac_s = s - floor_s
+
+    if method == 'nearest':
+        floor_s, taps = np.round(s), ((0, np.ones_like(s)),)
+    elif method == 'bilinear':
+        taps = ((0, 1-frac_s), (1, frac_s))
+    elif method == 'lanczos':
+        a = 3.0
+        taps = tuple(
+            (offset, np.sinc(frac_s - offset) * np.sinc((frac_s - offset) / a))
+            for offset in np.arange(-a+1, a+1)
+        )
+    else:
+        raise NotImplementedError('Sampling method "{0}" is not implemented.'.format(method))
+
+    M = np.zeros((dst_size, src_size))
+    rows = np.arange(dst_size)
+    for offset, weight in taps:
+        cols = dtcwt.utils.reflect(floor_s + offset, -0.5, src_size-0.5).astype(np.intp)
+        np.add.at(M, (rows, cols), weight)
+
+    M.setflags(write=False)
+    return M
+
+def _unwrap_phase(rows, cols, nsubbands, dtype):
+    """
+    INTERNAL
+
+    Return the phase image which shifts the first *nsubbands* highpass
+    subbands at the pixel *rows* and *cols* to approximately DC. The phase
+    image has the complex floating point type with the precision of *dtype*.
+
+    """
+    dx = dtcwt.sampling.DTHETA_DX_2D[:nsubbands]
+    dy = dtcwt.sampling.DTHETA_DY_2D[:nsubbands]
+
+    # The phase is separable
+    return (
+        np.exp(-1j * dx * np.asarray(cols)[:, np.newaxis])[np.newaxis] *
+        np.exp(-1j * dy * np.asarray(rows)[:, np.newaxis, np.newaxis])
+    ).astype(np.result_type(np.finfo(dtype).dtype, np.complex64))
+
+def _warp_grid(avecs, shape, nsubbands, dtype, method=None, rows=None, cols=None):
+    """
+    INTERNAL
+
+    Return a tuple *(xs, ys, rewrap)* for warping highpass subbands of shape
+    *shape* with *nsubbands* subbands according to the affine parameters
+    *avecs*. *xs* and *ys* are the sample co-ordinates in pixels and *rewrap*
+    the phase image which restores subbands unwrapped by
+    :py:func:`_unwrap_phase` at the sample co-ordinates. The arrays have the
+    real and complex floating point types with the precision of *dtype*.
+
+    If not `None`, *rows* and *cols* are the pixel rows and columns of the
+    region of the warped subbands to return.
+
+    The velocity field is that of :py:func:`velocityfield` but is resampled
+    with separable interpolation matrices rather than by sampling.
+
+    """
+    h, w = shape
+    dtype = np.finfo(dtype).dtype
+    rows = np.arange(h) if rows is None else np.asarray(rows)
+    cols = np.arange(w) if cols is None else np.asarray(cols)
+
+    # Velocity of each block at its own location
+    bh, bw = avecs.shape[:2]
+    pxs = np.arange(0, bw, dtype=np.float32) / bw
+    pys = (np.arange(0, bh, dtype=np.float32) / bh)[:, np.newaxis]
+    vxs = avecs[:,:,0] + avecs[:,:,2] * pxs + avecs[:,:,4] * pys
+    vys = avecs[:,:,1] + avecs[:,:,3] * pxs + avecs[:,:,5] * pys
+
+    # Resample both components to the level's grid and convert to
+    # displacements in pixels
+    Wy = _interpolation_matrix(bh, h, method)[rows]
+    Wx = _interpolation_matrix(bw, w, method)[cols]
+    dxs = (w * Wy.dot(vxs).dot(Wx.T)).astype(dtype, copy=False)
+    dys = (h * Wy.dot(vys).dot(Wx.T)).astype(dtype, copy=False)
+
+    dx = dtcwt.sampling.DTHETA_DX_2D[:nsubbands].astype(dtype)
+    dy = dtcwt.sampling.DTHETA_DY_2D[:nsubbands].astype(dtype)
+
+    # The phase at the sample co-ordinates differs from that at the original
+    # sample points only by that of the displacement which is small enough
+    # to be computed in single precision if need be.
+    rewrap = np.conj(_unwrap_phase(rows, cols, nsubbands, dtype))
+    rewrap *= np.exp(1j * (dx * dxs[..., np.newaxis] + dy * dys[..., np.newaxis]))
+
+    return cols.astype(dtype) + dxs, rows[:, np.newaxis].astype(dtype) + dys, rewrap
+
+def _warp_highpass(Yh_unwrap, grid, method=None):
+    """
+    INTERNAL
+
+    Return the highpass subbands *Yh_unwrap*, unwrapped by
+    :py:func:`_unwrap_phase`, warped according to *grid* as returned by
+    :py:func:`_warp_grid`.
+
+    """
+    xs, ys, rewrap = grid
+
+    if method != 'bilinear':
+        return (rewrap * dtcwt.sampling.sample(Yh_unwrap, xs, ys, method=method)).astype(
+                Yh_unwrap.dtype, copy=False)
+
+    # Bilinear sampling of all subbands at once
+    floor_xs, floor_ys = np.floor(xs), np.floor(ys)
+    frac_xs = (xs - floor_xs)[..., np.newaxis]
+    frac_ys = (ys - floor_ys)[..., np.newaxis]
+
+    h, w = Yh_unwrap.shape[:2]
+    x0 = dtcwt.utils.reflect(floor_xs, -0.5, w-0.5).astype(np.intp)
+    x1 = dtcwt.utils.reflect(floor_xs+1, -0.5, w-0.5).astype(np.intp)
+    y0 = dtcwt.utils.reflect(floor_ys, -0.5, h-0.5).astype(np.intp)
+    y1 = dtcwt.utils.reflect(floor_ys+1, -0.5, h-0.5).astype(np.intp)
+
+    upper = Yh_unwrap[y0, x0] + frac_xs * (Yh_unwrap[y0, x1] - Yh_unwrap[y0, x0])
+    lower = Yh_unwrap[y1, x0] + frac_xs * (Yh_unwrap[y1, x1] - Yh_unwrap[y1, x0])
+
+    return rewrap * (upper + frac_ys * (lower - upper))
+
+def estimatereg(source, reference, regshape=None, levels=None, initial_avecs=None, tolerance=None,
+                smoothing=3, tile_shape=None, n_workers=1, pool_type='thread', confidence_threshold=None):
     """
     Estimate registration from which will map *source* to *reference*.
 
     :param source: transformed source image
     :param reference: transformed reference image
+    :param initial_avecs: optional initial estimate of the affine distortion parameters
+    :param tolerance: optional update size, in normalised units, at which refinement stops
+    :param smoothing: odd width of the box filter applied to each level's estimate
+    :param tile_shape: optional shape, in blocks, of the tiles each refinement step is split into
+    :param n_workers: the number of threads or processes refining tiles
+    :param pool_type: ``'thread'`` or ``'process'``
+    :param confidence_threshold: optional relative confidence below which blocks are not refined
 
     The *reference* and *source* parameters should support the same API as
-    :py:class:`dtcwt.Pyramid`.
+    :py:class:`dtcwt.Pyramid`. Either may be a :py:class:`RegistrationFeatures`
+    instance. When registering a sequence of images, each image is used twice
+    and passing its features avoids computing them again. The features of
+    *reference* are also reused by each refinement step.
 
     The local affine distortion is estimated at at 8x8 pixel scales.
     Return a NxMx6 array where the 6-element vector at (N,M) corresponds to the
@@ -320,9 +684,57 @@ def estimatereg(source, reference, regshape=None, levels=None):
 
     If not-`None`, *levels* is a sequence of sequences of 0-based level indices
     to use when calculating the registration. If `None` then a default set of
-    levels are used.
+    levels are used. The first sequence is used to estimate a global affine
+    transform and the remainder, from coarse to fine, to refine it locally.
+
+    If not-`None`, *tolerance* gives the largest root-mean-square displacement
+    of the blocks, in normalised units where the image has width and height of
+    unity, implied by a refinement update for the estimate to be considered
+    converged. No further refinement is performed once an update is this
+    small.
+
+    If not-`None`, *initial_avecs* is an initial estimate, such as the result
+    for the previous pair of frames in a video, which is rescaled if
+    necessary, and only the refinement steps at the finest levels which end
+    the schedule are run on it. If *tolerance* is also given and the last of
+    these steps does not converge, the remaining steps of the schedule are
+    run from the refined estimate in place of the global estimate. Without
+    *tolerance*, the result of the finest steps is always accepted. *levels*
+    must then include at least one refinement step. The result has the
+    precision of the transformed images whatever that of *initial_avecs*.
+
+    Each refinement step smooths the per-sample estimates of each level with a
+    *smoothing* x *smoothing* box filter before combining them. Larger values
+    give a smoother registration at no extra cost.
+
+    For very large images, the refinement steps may be split into tiles of
+    *tile_shape* blocks which are refined independently on a pool of
+    *n_workers* threads or, if *pool_type* is ``'process'``, processes which
+    share the transformed images through shared memory. Each tile is computed
+    from a region of each level extended to cover the box filter and so the
+    result is the same as that of the untiled registration. If *tile_shape* is
+    `None` and *n_workers* is greater than 1, there is one band of rows of
+    blocks for each worker. Process pools require Python 3.8 or later.
+
+    If not-`None`, refinement is sparse. Before each refinement step, the
+    confidence of each block is estimated from *reference* alone as that it
+    would have if the warped *source* matched it exactly. Blocks whose
+    confidence is below *confidence_threshold* times the mean over all blocks,
+    such as those covering sky or flat walls, are not refined directly. Within
+    each tile, only the rows and columns of blocks which contain a confident
+    block are computed and tiles with no confident blocks are skipped
+    entirely. The updates for the other blocks are interpolated from those of
+    their confident neighbours. If *tile_shape* is `None`, the blocks are
+    split into two bands of columns and two, or *n_workers* if greater, bands
+    of rows. Sparse refinement saves work when large regions of the image
+    have little texture; otherwise it costs slightly more than dense
+    refinement. A threshold of 0 gives the same result as tiled refinement.
 
     """
+    if smoothing < 1 or smoothing % 2 == 0:
+        raise ValueError('Smoothing must be a positive odd integer')
+    check_pool(n_workers, pool_type)
+
     # Extract number of levels and shape of level 4 (i.e. index 3) subband
     nlevels = len(source.highpasses)
     if regshape is None:
@@ -330,47 +742,576 @@ def estimatereg(source, reference, regshape=None, levels=None):
     else:
         avecs_shape = tuple(regshape[:2]) + (6,)
 
-    # Initialise matrix of 'a' vectors
-    avecs = np.zeros(avecs_shape)
+    # Per-image features are computed at most once for each level
+    source = _registration_features(source)
+    reference = _registration_features(reference)
 
     if levels is None:
-        levels = []
-        levels.append(list(x for x in xrange(nlevels-1, nlevels-3, -1) if x>=0))
-        for s in np.arange(nlevels-1, 0, -0.5):
-            refine_levels = list(int(np.floor(s))-x for x in range(2) if s-x >= 2)
-            if len(refine_levels) < 2:
-                continue
-            levels.append(refine_levels)
-
-    # Compute initial global transform
-    Qt_mats = list(
-            np.sum(np.sum(x, axis=0), axis=0)
-            for x in qtildematrices(source, reference, levels[0])
-    )
-    Qt = np.sum(Qt_mats, axis=0)
+        levels = _default_levels(nlevels)
+
+    if tile_shape is None and confidence_threshold is not None:
+        tile_shape = (-(-avecs_shape[0] // max(2, n_workers)), -(-avecs_shape[1] // 2))
+    elif tile_shape is None and n_workers > 1:
+        tile_shape = (-(-avecs_shape[0] // n_workers), avecs_shape[1])
+
+    if tile_shape is None:
+        def refine(avecs, est_levels):
+            return _refinement_update(source, reference, avecs, est_levels, smoothing)
+        return _estimatereg(source, reference, avecs_shape, levels, initial_avecs, tolerance, refine)
+
+    with SlicePool(n_workers, pool_type) as pool:
+        refine = _TiledRefinement(source, reference, smoothing, tile_shape, pool, confidence_threshold)
+        return _estimatereg(source, reference, avecs_shape, levels, initial_avecs, tolerance, refine)
+
+def _estimatereg(source, reference, avecs_shape, levels, initial_avecs, tolerance, refine):
+    """
+    INTERNAL
+
+    Implementation of :py:func:`estimatereg` for features *source* and
+    *reference* where ``refine(avecs, est_levels)`` returns the update to
+    *avecs* from the levels *est_levels* or ``None`` if they give no estimate.
+
+    """
+    dtype = _real_dtype(source.level(levels[0][0]).subband)
+
+    if initial_avecs is not None:
+        initial_avecs = np.asanyarray(initial_avecs)
+        if initial_avecs.shape[2:] != (6,):
+            raise ValueError('Initial affine parameters must have shape NxMx6')
+        if len(levels) < 2:
+            raise ValueError('An initial estimate requires at least one refinement step in levels')
+        if initial_avecs.shape != avecs_shape:
+            initial_avecs = dtcwt.sampling.rescale(initial_avecs, avecs_shape[:2], method='bilinear')
+        avecs = initial_avecs.astype(dtype)
+
+        # If the initial estimate is already good at the finest scale, the
+        # global estimate and coarser refinement steps are unnecessary. The
+        # first update of even a converged estimate is at the level of the
+        # noise in the estimate and so all the steps at the finest levels
+        # which end the schedule are run before testing for convergence.
+        n_finest = 1
+        while n_finest < len(levels) - 1 and levels[-n_finest-1] == levels[-1]:
+            n_finest += 1
+
+        update = None
+        for est_levels in levels[-n_finest:]:
+            step = refine(avecs, est_levels)
+            if step is not None:
+                avecs += step
+                update = step
+
+        if update is None or tolerance is None or _rms_displacement(update) <= tolerance:
+            return avecs
+
+        # Otherwise continue refining through the whole schedule from the
+        # improved estimate, which is a better start than the global one.
+    else:
+        # Initialise matrix of 'a' vectors
+        avecs = np.zeros(avecs_shape, dtype=dtype)
 
-    a = solvetransform(Qt)
-    for idx in xrange(a.shape[0]):
-        avecs[:,:,idx] = a[idx]
+        # Compute initial global transform
+        Qt_mats = list(
+                np.sum(x, axis=(0, 1), dtype=np.float64)
+                for x in qtildematrices(source, reference, levels[0])
+        )
+        Qt = np.sum(Qt_mats, axis=0)
+
+        a = solvetransform(Qt)
+        for idx in xrange(a.shape[0]):
+            avecs[:,:,idx] = a[idx]
 
     # Refine estimate
     for est_levels in levels[1:]:
-        # Warp the levels we'll be looking at with the current best-guess transform
-        warped = warptransform(source, avecs, est_levels, method='bilinear')
-
-        # Rescale and sample all the Qtilde matrix results
-        all_qts = qtildematrices(warped, reference, est_levels)
-        if all_qts is None or len(all_qts) < 1:
+        update = refine(avecs, est_levels)
+        if update is None:
             continue
 
-        qts = np.zeros(avecs.shape[:2] + all_qts[0].shape[2:])
-        for x in all_qts:
-            qts += dtcwt.sampling.rescale(_boxfilter(x, 3), avecs.shape[:2], method='bilinear')
+        avecs += update
 
-        avecs += solvetransform(qts)
+        if tolerance is not None and _rms_displacement(update) <= tolerance:
+            break
 
     return avecs
 
+def _refinement_update(source, reference, avecs, est_levels, smoothing):
+    """
+    INTERNAL
+
+    Return the update to the affine parameters *avecs* estimated from the
+    levels *est_levels*, each smoothed with a box filter of width *smoothing*,
+    or ``None`` if they give no estimate.
+
+    """
+    # Warp the levels we'll be looking at with the current best-guess transform
+    warped = warptransform(source, avecs, est_levels, method='bilinear')
+
+    # Rescale and sample all the Qtilde matrix results
+    all_qts = qtildematrices(warped, reference, est_levels)
+    if all_qts is None or len(all_qts) < 1:
+        return None
+
+    # The matrices are smoothed and summed in double precision since their
+    # smallest eigenvalues, which determine the solution, are lost otherwise.
+    qts = np.zeros(avecs.shape[:2] + all_qts[0].shape[2:])
+    for x in all_qts:
+        x = x.astype(np.float64, copy=False)
+        qts += dtcwt.sampling.rescale(_boxfilter(x, smoothing, out=x), avecs.shape[:2], method='bilinear')
+
+    return solvetransform(qts).astype(avecs.dtype, copy=False)
+
+class _TiledRefinement(object):
+    """
+    INTERNAL
+
+    A callable computing the same update as :py:func:`_refinement_update`
+    for the features *source* and *reference* by splitting the blocks into
+    tiles of *tile_shape* blocks which are computed on the
+    :py:class:`dtcwt.utils.SlicePool` *pool*. If *threshold* is not `None`,
+    only blocks whose confidence is at least *threshold* times the mean are
+    refined as described in :py:func:`estimatereg`.
+
+    """
+    def __init__(self, source, reference, smoothing, tile_shape, pool, threshold=None):
+        self.source = source
+        self.reference = reference
+        self.smoothing = smoothing
+        self.tile_shape = tuple(int(x) for x in tile_shape)
+        self.pool = pool
+        self.threshold = threshold
+
+        if len(self.tile_shape) != 2 or min(self.tile_shape) < 1:
+            raise ValueError('Tile shape must be a pair of positive integers')
+
+        # The unwrapped source and the reference subbands for each level,
+        # shared with the workers.
+        self._levels = {}
+
+        # The confidence of each block for each level keyed by level and
+        # block grid shape.
+        self._confidences = {}
+
+    def _level(self, level):
+        try:
+            return self._levels[level]
+        except KeyError:
+            pass
+
+        Yh = self.source.highpasses[level]
+        h, w, nsubbands = Yh.shape
+        unwrapped = Yh * _unwrap_phase(np.arange(h), np.arange(w), nsubbands, Yh.dtype)
+        arrays = self._levels[level] = (
+            self.pool.asshared(unwrapped),
+            self.pool.asshared(np.asanyarray(self.reference.highpasses[level])),
+        )
+        return arrays
+
+    def _confidence(self, level, shape):
+        """Return the confidence of each block of a *shape* grid of blocks
+        from the reference subbands at *level*.
+
+        """
+        try:
+            return self._confidences[(level, shape)]
+        except KeyError:
+            pass
+
+        # The Q-tilde matrices weight each subband by the square of its
+        # confidence. That of the reference with itself is an upper bound on
+        # that with the warped source. It is smoothed and resampled to the
+        # blocks in the same way as the matrices.
+        f = self.reference.level(level)
+        weights = np.sum(_pow2(_confidence(f, f)), axis=2, dtype=np.float64)
+        _boxfilter(weights, self.smoothing, out=weights)
+
+        h, w = weights.shape
+        Wy = _interpolation_matrix(h, shape[0], 'bilinear')
+        Wx = _interpolation_matrix(w, shape[1], 'bilinear')
+        confidence = self._confidences[(level, shape)] = Wy.dot(weights).dot(Wx.T)
+        return confidence
+
+    def __call__(self, avecs, est_levels):
+        if len(est_levels) < 1:
+            return None
+
+        bh, bw = avecs.shape[:2]
+        th, tw = self.tile_shape
+        ntile_rows, ntile_cols = -(-bh // th), -(-bw // tw)
+
+        if self.threshold is None:
+            active = np.ones((bh, bw), dtype=bool)
+        else:
+            confidence = sum(self._confidence(level, (bh, bw)) for level in est_levels)
+            active = confidence >= self.threshold * np.mean(confidence)
+
+        # Tiles with at least one active block
+        padded = np.zeros((ntile_rows * th, ntile_cols * tw), dtype=bool)
+        padded[:bh, :bw] = active
+        tiles = np.flatnonzero(np.any(np.any(
+            padded.reshape(ntile_rows, th, ntile_cols, tw), axis=3), axis=1))
+
+        arrays = []
+        for level in est_levels:
+            arrays.extend(self._level(level))
+
+        qts = self.pool.zeros((bh, bw, 27), dtype=np.float64)
+        self.pool.map_slices(_refine_tiles, len(tiles), qts, self.pool.readonly(avecs),
+                             self.smoothing, self.tile_shape, self.pool.readonly(tiles),
+                             self.pool.readonly(active), *arrays)
+
+        if np.all(active):
+            return solvetransform(qts).astype(avecs.dtype, copy=False)
+
+        update = np.zeros(avecs.shape, dtype=avecs.dtype)
+        if np.any(active):
+            update[active] = solvetransform(qts[active])
+            _fill_from_neighbours(update, active)
+        return update
+
+def _refine_tiles(start, stop, qts, avecs, smoothing, tile_shape, tiles, active, *arrays):
+    """
+    INTERNAL
+
+    Accumulate into *qts* the smoothed :math:`\tilde{Q}` matrices for the
+    tiles with indices *tiles[start:stop]* of the blocks of *avecs* split
+    into tiles of *tile_shape* blocks. Within each tile, only the rows and
+    columns of blocks containing a block for which the boolean array
+    *active* is True are computed. *arrays* alternates the unwrapped source
+    and the reference subbands of each level.
+
+    """
+    bh, bw = avecs.shape[:2]
+    th, tw = tile_shape
+    ntile_cols = -(-bw // tw)
+
+    for tile in tiles[start:stop]:
+        r0, c0 = (tile // ntile_cols) * th, (tile % ntile_cols) * tw
+        tile_active = active[r0:r0+th, c0:c0+tw]
+        block_rows = r0 + np.flatnonzero(np.any(tile_active, axis=1))
+        block_cols = c0 + np.flatnonzero(np.any(tile_active, axis=0))
+        for unwrapped, reference in zip(arrays[0::2], arrays[1::2]):
+            qts[np.ix_(block_rows, block_cols)] += _tile_qtilde(
+                unwrapped, reference, avecs, smoothing, block_rows, block_cols)
+
+def _fill_from_neighbours(X, mask):
+    """
+    INTERNAL
+
+    Replace the elements of the NxMxK array *X* where the NxM boolean array
+    *mask* is False with the mean of the elements where it is True within
+    the smallest square window, centred on each, which contains any.
+
+    """
+    weights = mask.astype(np.float64)
+    values = X * weights[..., np.newaxis]
+    missing = np.logical_not(mask)
+
+    kernel_size = 3
+    while np.any(missing):
+        count = _boxfilter(weights, kernel_size)
+        filled = np.logical_and(missing, count > 0)
+        X[filled] = _boxfilter(values, kernel_size)[filled] / count[filled][:, np.newaxis]
+        missing[filled] = False
+        kernel_size = 2*kernel_size + 1
+
+def _tile_qtilde(unwrapped, reference, avecs, smoothing, block_rows, block_cols):
+    """
+    INTERNAL
+
+    Return the :math:`\tilde{Q}` matrices of one level smoothed with a box
+    filter of width *smoothing* and resampled to the blocks *block_rows* and
+    *block_cols* of *avecs*. The source subbands, unwrapped by
+    :py:func:`_unwrap_phase`, are warped by *avecs* and compared with the
+    *reference* subbands. Only the region of the level which contributes to
+    the blocks is used.
+
+    """
+    h, w, nsubbands = unwrapped.shape
+    Wy = _interpolation_matrix(h, avecs.shape[0], 'bilinear')[block_rows]
+    Wx = _interpolation_matrix(w, avecs.shape[1], 'bilinear')[block_cols]
+
+    # The region sampled by the resampling extended by the box filter and by
+    # one more pixel on which the features at the edges of the region depend.
+    halo = smoothing//2 + 1
+    rows = _support(Wy, halo)
+    cols = _support(Wx, halo)
+
+    grid = _warp_grid(avecs, (h, w), nsubbands, unwrapped.dtype, 'bilinear', rows, cols)
+    warped = _warp_highpass(unwrapped, grid, 'bilinear')
+    region = reference[rows[0]:rows[-1]+1, cols[0]:cols[-1]+1]
+
+    Qt = _level_qtilde(_subband_features(warped), _subband_features(region), rows, cols, (h, w))
+    Qt = Qt.astype(np.float64)
+    _boxfilter(Qt, smoothing, out=Qt)
+
+    Qt = np.tensordot(Wy[:, rows], Qt, axes=(1, 0))
+    return np.transpose(np.tensordot(Qt, Wx[:, cols], axes=(1, 1)), (0, 2, 1))
+
+def _support(W, halo):
+    """
+    INTERNAL
+
+    Return the contiguous range of columns of the interpolation matrix *W*
+    which have non-zero weights extended by *halo* on each side and clipped
+    to the columns of *W*.
+
+    """
+    used = np.flatnonzero(np.any(W != 0, axis=0))
+    return np.arange(max(used[0] - halo, 0), min(used[-1] + 1 + halo, W.shape[1]))
+
+def _rms_displacement(avecs):
+    """
+    INTERNAL
+
+    Return the root-mean-square displacement, in normalised units, of the
+    blocks given the affine parameters *avecs* for each block.
+
+    """
+    h, w = avecs.shape[:2]
+    pxs, pys = np.meshgrid(np.arange(0, w) / w, np.arange(0, h) / h)
+
+    vxs = avecs[:,:,0] + avecs[:,:,2] * pxs + avecs[:,:,4] * pys
+    vys = avecs[:,:,1] + avecs[:,:,3] * pxs + avecs[:,:,5] * pys
+
+    return np.sqrt(np.mean(vxs*vxs + vys*vys))
+
+def _default_levels(nlevels):
+    """
+    INTERNAL
+
+    Return the default sequence of sequences of level indices used by
+    :py:func:`estimatereg` for a transform with *nlevels* levels.
+
+    """
+    levels = []
+    levels.append(list(x for x in xrange(nlevels-1, nlevels-3, -1) if x>=0))
+    for s in np.arange(nlevels-1, 0, -0.5):
+        refine_levels = list(int(np.floor(s))-x for x in range(2) if s-x >= 2)
+        if len(refine_levels) < 2:
+            continue
+        levels.append(refine_levels)
+    return levels
+
+def register_sequence(frames, nlevels=6, transform=None, regshape=None, levels=None,
+                      n_workers=1, pool_type='thread', window=None, warm_start=False, tolerance=None,
+                      smoothing=3, confidence_threshold=None):
+    """
+    Estimate the registration between each pair of consecutive frames in
+    *frames*. This is a generator which yields a tuple *((i, i+1), avecs)* for
+    each pair where *avecs* is the result of :py:func:`estimatereg` with frame
+    *i* as the source and frame *i+1* as the reference. Pairs are yielded in
+    order.
+
+    :param frames: an iterable of 2D frames
+    :param nlevels: number of levels of wavelet decomposition
+    :param transform: the transform used or ``None`` for :py:class:`dtcwt.Transform2d`
+    :param regshape: passed to :py:func:`estimatereg`
+    :param levels: passed to :py:func:`estimatereg`
+    :param n_workers: the number of threads or processes used
+    :param pool_type: ``'thread'`` or ``'process'``
+    :param window: the maximum number of frames transformed ahead of the pair being registered
+    :param warm_start: True if each registration should start from that of the previous pair
+    :param tolerance: passed to :py:func:`estimatereg`
+    :param smoothing: passed to :py:func:`estimatereg`
+    :param confidence_threshold: passed to :py:func:`estimatereg`
+
+    Each frame is transformed once and its :py:class:`RegistrationFeatures`
+    are used for both pairs it belongs to. If *n_workers* is greater than 1,
+    upcoming frames are transformed while earlier pairs are registered. At most
+    *window* frames, by default twice *n_workers*, are read from *frames* ahead
+    of the pairs being registered and so memory use is bounded for long
+    sequences. If *pool_type* is ``'process'``, *transform* must be picklable
+    and the features of each frame are kept in shared memory, rather than
+    being copied between processes, until both its pairs are registered.
+
+    If *warm_start* is True, the result for each pair is passed to
+    :py:func:`estimatereg` as *initial_avecs* for the next pair. This is
+    usually much faster for smooth motion but pairs are then registered one at
+    a time. A *tolerance* is required so that pairs for which the previous
+    result is a poor estimate are refined through the whole schedule.
+
+    """
+    if warm_start and tolerance is None:
+        raise ValueError('A tolerance is required when warm starting')
+    check_pool(n_workers, pool_type)
+
+    n_workers = max(1, int(n_workers))
+    window = max(1, int(window if window is not None else 2*n_workers))
+    if transform is None:
+        transform = dtcwt.Transform2d()
+
+    # The features of every level used by estimatereg are computed as part of
+    # transforming each frame.
+    if levels is None:
+        levels = _default_levels(nlevels)
+    feature_levels = sorted(set(itertools.chain(*levels)))
+
+    if n_workers == 1:
+        prev, avecs = None, None
+        for idx, frame in enumerate(frames):
+            features = _frame_features(transform, frame, nlevels, feature_levels)
+            if prev is not None:
+                avecs = estimatereg(prev, features, regshape=regshape, levels=levels,
+                                    initial_avecs=avecs if warm_start else None, tolerance=tolerance,
+                                    smoothing=smoothing, confidence_threshold=confidence_threshold)
+                yield (idx-1, idx), avecs
+            prev = features
+        return
+
+    from concurrent.futures import ThreadPoolExecutor
+    if pool_type == 'thread':
+        executor = ThreadPoolExecutor(n_workers)
+        register = estimatereg
+    else:
+        # Worker processes keep the features of each frame in shared memory
+        # and are passed references to them rather than pickled copies.
+        executor = dtcwt.utils._process_pool(n_workers)
+        register = _estimatereg_shared
+    shared = pool_type == 'process'
+
+    with executor:
+        frames = enumerate(frames)
+        transforms = collections.deque()
+        registrations = collections.deque()
+        prev, exhausted = None, False
+
+        # The features of frames which may still be in use by registrations
+        held = collections.deque()
+
+        # The most recent registration submitted
+        avecs = None
+
+        try:
+            while True:
+                # Transform upcoming frames while the window has room
+                while not exhausted and len(transforms) < window:
+                    try:
+                        idx, frame = next(frames)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    transforms.append((idx, executor.submit(
+                        _frame_features, transform, frame, nlevels, feature_levels, shared)))
+
+                if len(transforms) == 0 and len(registrations) == 0:
+                    break
+
+                # Register the oldest transformed frame against its predecessor
+                if len(transforms) > 0:
+                    idx, features = transforms.popleft()
+                    features = features.result()
+                    held.append((idx, features))
+                    if prev is not None:
+                        initial_avecs = None
+                        if warm_start and avecs is not None:
+                            initial_avecs = avecs.result()
+                        avecs = executor.submit(
+                            register, prev, features, regshape=regshape, levels=levels,
+                            initial_avecs=initial_avecs, tolerance=tolerance, smoothing=smoothing,
+                            confidence_threshold=confidence_threshold)
+                        registrations.append(((idx-1, idx), avecs))
+                    prev = features
+
+                # Yield completed registrations in order. Block on the oldest
+                # once every worker has a registration or there is nothing left
+                # to transform.
+                while len(registrations) > 0 and (
+                        registrations[0][1].done() or len(registrations) >= n_workers
+                        or len(transforms) == 0):
+                    pair, result = registrations.popleft()
+                    result = result.result()
+
+                    # The source frame is not needed by later registrations
+                    while held[0][0] <= pair[0]:
+                        _release_features(held.popleft()[1])
+
+                    yield pair, result
+        finally:
+            for _, features in held:
+                _release_features(features)
+            for _, features in transforms:
+                if not features.cancel() and features.exception() is None:
+                    _release_features(features.result())
+
+# A reference to the features returned by _frame_features held in shared
+# memory called *name*. *levels* is a tuple of the level index and
+# references to the padded subband, cubed neighbours and horizontal and
+# vertical products of each level whose features were computed.
+_SharedFeatures = collections.namedtuple('_SharedFeatures', 'name lowpass highpasses levels')
+
+def _release_features(features):
+    """
+    INTERNAL
+
+    Release the shared memory holding *features* if they are a
+    :py:class:`_SharedFeatures` returned by :py:func:`_frame_features`.
+
+    """
+    if isinstance(features, _SharedFeatures):
+        dtcwt.utils._unlink_shared(features.name)
+
+def _frame_features(transform, frame, nlevels, levels, shared=False):
+    """
+    INTERNAL
+
+    Transform *frame* and return its :py:class:`RegistrationFeatures` with
+    the features of each level in *levels* computed. If *shared* is True, the
+    features are copied to shared memory and a :py:class:`_SharedFeatures`
+    referring to them is returned instead.
+
+    """
+    features = RegistrationFeatures(transform.forward(frame, nlevels=nlevels))
+    for level in levels:
+        features.level(level).compute()
+    if not shared:
+        return features
+
+    highpasses = list(features.highpasses)
+    present = list(idx for idx, Yh in enumerate(highpasses) if Yh is not None)
+    level_features = list(features.level(level) for level in levels)
+    refs = dtcwt.utils._share_arrays(
+        [features.lowpass] + list(highpasses[idx] for idx in present) +
+        list(a for f in level_features for a in (f.padded, f.cubed_neighbours, f.hprods, f.vprods))
+    )
+
+    lowpass, refs = refs[0], refs[1:]
+    for idx in present:
+        highpasses[idx], refs = refs[0], refs[1:]
+    return _SharedFeatures(lowpass.name, lowpass, tuple(highpasses), tuple(
+        (level,) + tuple(refs[4*idx:4*idx+4]) for idx, level in enumerate(levels)))
+
+def _attach_features(ref, handles):
+    """
+    INTERNAL
+
+    Return the :py:class:`RegistrationFeatures` referred to by the
+    :py:class:`_SharedFeatures` *ref* attaching to their shared memory as by
+    :py:func:`dtcwt.utils._attach_shared`.
+
+    """
+    attach = lambda a: dtcwt.utils._attach_shared(a, handles) if a is not None else None
+    features = RegistrationFeatures(dtcwt.numpy.Pyramid(
+        attach(ref.lowpass), tuple(attach(Yh) for Yh in ref.highpasses)))
+    for level, padded, cubed_neighbours, hprods, vprods in ref.levels:
+        f = features.level(level)
+        f._padded, f._cubed_neighbours = attach(padded), attach(cubed_neighbours)
+        f._hprods, f._vprods = attach(hprods), attach(vprods)
+    return features
+
+def _estimatereg_shared(source, reference, **kwargs):
+    """
+    INTERNAL
+
+    Worker process entry point for :py:func:`register_sequence` which calls
+    :py:func:`estimatereg` for the :py:class:`_SharedFeatures` *source* and
+    *reference*.
+
+    """
+    handles = {}
+    try:
+        return estimatereg(_attach_features(source, handles), _attach_features(reference, handles), **kwargs)
+    finally:
+        dtcwt.utils._close_shared(handles)
+
 def velocityfield(avecs, shape, method=None):
     """
     Given the affine distortion parameters returned from :py:func:`estimatereg`, return
@@ -419,28 +1360,39 @@ def warp(I, avecs, method=None):
     vxs, vys = velocityfield(avecs, I.shape, method=method)
     return normsample(I, X+vxs, Y+vys, method=method)
 
-def _boxfilter(X, kernel_size):
+def _boxfilter(X, kernel_size, out=None):
     """
     INTERNAL
 
-    A simple box filter implementation.
+    A box filter over the first two axes of *X* with symmetric boundaries.
+    The result is written to *out*, which may be *X* itself, if it is not
+    `None`.
+
+    The filter is computed from the integral image of the padded array and so
+    the cost is independent of *kernel_size*.
 
     """
     if kernel_size % 2 == 0:
         raise ValueError('Kernel size must be odd')
 
-    for axis_idx in xrange(2):
-        slices = [slice(None),] * len(X.shape)
-        out = X
-
-        for delta in xrange(1, 1+(kernel_size-1)//2):
-            slices[axis_idx] = dtcwt.utils.reflect(
-                    np.arange(X.shape[axis_idx]) + delta, -0.5, X.shape[axis_idx]-0.5)
-            out = out + X[slices]
-            slices[axis_idx] = dtcwt.utils.reflect(
-                    np.arange(X.shape[axis_idx]) - delta, -0.5, X.shape[axis_idx]-0.5)
-            out = out + X[slices]
-
-        X = out / kernel_size
-
-    return X
+    if out is None:
+        out = np.empty(X.shape, dtype=np.result_type(X.dtype, np.float32))
+
+    # Pad with an extra leading row and column which are then zeroed so that
+    # the integral image is zero along its top and left edges. The integral
+    # image is always accumulated in double precision.
+    radius = (kernel_size-1)//2
+    pad_width = [(radius+1, radius),] * 2 + [(0, 0),] * (len(X.shape) - 2)
+    sums = np.pad(X, pad_width, mode='symmetric').astype(np.float64, copy=False)
+    sums[0] = 0
+    sums[:, 0] = 0
+    np.cumsum(sums, axis=0, out=sums)
+    np.cumsum(sums, axis=1, out=sums)
+
+    k = kernel_size
+    np.subtract(sums[k:, k:], sums[:-k, k:], out=out)
+    out -= sums[k:, :-k]
+    out += sums[:-k, :-k]
+    out /= k * k
+
+    return out
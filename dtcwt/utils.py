@@ -5,6 +5,21 @@ from __future__ import absolute_import
 import functools
 import numpy as np
 
+from collections import namedtuple
+
+try:
+    from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+    _HAVE_FUTURES = True
+except ImportError:
+    _HAVE_FUTURES = False
+
+try:
+    from multiprocessing import resource_tracker
+    from multiprocessing.shared_memory import SharedMemory
+    _HAVE_SHARED_MEMORY = True
+except ImportError:
+    _HAVE_SHARED_MEMORY = False
+
 def drawedge(theta,r,w,N):
     """Generate an image of size N * N pels, of an edge going from 0 to 1
     in height at theta degrees to the horizontal (top of image = 1 if angle = 0).
@@ -115,6 +130,344 @@ def reflect(x, minx, maxx):
     out = np.where(normed_mod >= rng, rng_by_2 - normed_mod, normed_mod) + minx
     return np.array(out, dtype=x.dtype)
 
+def level2_extension(shape, ext_mode):
+    """Return the number of samples by which each end of the first three
+    dimensions of an input of shape *shape* to level 2 or greater of the 3d
+    transform is extended by repeating edges. Dimensions are extended to be
+    a multiple of 4 or 8 according to *ext_mode*.
+
+    """
+    if ext_mode == 4:
+        return tuple(1 if n % 4 != 0 else 0 for n in shape[:3])
+    elif ext_mode == 8:
+        return tuple(2 if n % 8 != 0 else 0 for n in shape[:3])
+    return (0, 0, 0)
+
+def remove_level2_extension(work, curr_level_size, prev_level_size, ext_mode):
+    """Remove any extension added by level 2 or greater of the 3d forward
+    transform to the previous level from the reconstructed previous level
+    lowpass *work*. *curr_level_size* is the size of the highpasses of the
+    current level and *prev_level_size* that of the previous level.
+
+    """
+    # Now check if the size of the previous level is exactly twice the size of
+    # the current level. If YES, this means we have not done the extension in
+    # the previous level. If NO, then we have to remove the appended row /
+    # column / frame from the previous level DTCWT coefs.
+
+    prev_level_size = np.asarray(prev_level_size)
+    curr_level_size = np.asarray(curr_level_size)
+
+    if ext_mode == 4:
+        if curr_level_size[0] * 2 != prev_level_size[0]:
+            # Discard the top and bottom rows
+            work = work[1:-1,:,:]
+        if curr_level_size[1] * 2 != prev_level_size[1]:
+            # Discard the top and bottom rows
+            work = work[:,1:-1,:]
+        if curr_level_size[2] * 2 != prev_level_size[2]:
+            # Discard the top and bottom rows
+            work = work[:,:,1:-1]
+    elif ext_mode == 8:
+        if curr_level_size[0] * 2 != prev_level_size[0]:
+        # Discard the top and bottom rows
+            work = work[2:-2,:,:]
+        if curr_level_size[1] * 2 != prev_level_size[1]:
+        # Discard the top and bottom rows
+            work = work[:,2:-2,:]
+        if curr_level_size[2] * 2 != prev_level_size[2]:
+        # Discard the top and bottom rows
+            work = work[:,:,2:-2]
+
+    return work
+
+def finer_level_size(Yl, Yh, level_sizes, level):
+    """Return the previous level size passed to
+    :py:func:`remove_level2_extension` when reconstructing the lowpass *Yl*
+    at the 0-based *level* of a 3d inverse transform, counting from the
+    coarsest of the highpasses *Yh*. The shape of the highpasses at the next
+    finer level is used if present. Otherwise it is half of the corresponding
+    entry of *level_sizes*, the shapes of the lowpass output by each level
+    of the forward transform, or, if that is `None`, the level is assumed not
+    to have been extended.
+
+    """
+    if Yh[-level-2] is not None:
+        return Yh[-level-2].shape[:3]
+    if level_sizes is not None:
+        return np.asarray(level_sizes[-level-2]) >> 1
+    return np.array(Yl.shape[:3])
+
+# A reference to an array allocated in shared memory, or to a view of one,
+# which may be passed to a worker process in place of the array itself.
+# *offset* is the offset in bytes of its first element within the memory.
+_SharedArrayRef = namedtuple('_SharedArrayRef', 'name shape dtype offset strides')
+
+def check_pool(n_workers, pool_type):
+    """Raise ValueError if *pool_type* is not ``'thread'`` or ``'process'`` and
+    RuntimeError if a pool of *n_workers* workers of that type cannot be
+    created by this version of Python.
+
+    """
+    if pool_type != 'thread' and pool_type != 'process':
+        raise ValueError("pool_type must be one of 'thread' or 'process'")
+
+    if int(n_workers) <= 1:
+        return
+
+    if not _HAVE_FUTURES:
+        raise RuntimeError('More than one worker requires concurrent.futures, '
+                           'which is part of Python 3.2 or later')
+    if pool_type == 'process' and not _HAVE_SHARED_MEMORY:
+        raise RuntimeError("pool_type 'process' requires multiprocessing.shared_memory, "
+                           'which is part of Python 3.8 or later')
+
+def _process_pool(n_workers):
+    """
+    INTERNAL
+
+    Return a process pool of *n_workers* workers which may share memory with
+    this process.
+
+    """
+    # Workers forked before the resource tracker is running start their own,
+    # which then report shared memory they attached to as leaked and unlink
+    # it when they exit. Start it now so that every process uses this one.
+    resource_tracker.ensure_running()
+    return ProcessPoolExecutor(n_workers)
+
+class SlicePool(object):
+    """
+    Run loops over independent slices of an array, such as the 2D slices of a
+    volume, on a pool of *n_workers* threads or processes depending on whether
+    *pool_type* is ``'thread'`` or ``'process'``. With a single worker, slices
+    are processed serially in the calling thread.
+
+    Use as a context manager. Any shared memory allocated by :py:meth:`zeros`
+    or :py:meth:`asshared` is released on exit and so results which are views
+    onto it should be passed through :py:meth:`detach` before then.
+
+    """
+    def __init__(self, n_workers=1, pool_type='thread'):
+        check_pool(n_workers, pool_type)
+
+        self.n_workers = max(1, int(n_workers))
+        self.pool_type = pool_type
+        self._executor = None
+
+        # Shared arrays keyed by id() along with their SharedMemory instance
+        self._shared = {}
+
+    def __enter__(self):
+        if self.n_workers > 1:
+            if self.pool_type == 'thread':
+                self._executor = ThreadPoolExecutor(self.n_workers)
+            else:
+                self._executor = _process_pool(self.n_workers)
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+        while len(self._shared) > 0:
+            _, (array, shm) = self._shared.popitem()
+            del array
+            try:
+                shm.close()
+            except BufferError:
+                # Some view onto the memory is still alive. The mapping will be
+                # released when it is garbage collected.
+                pass
+            shm.unlink()
+
+    def _uses_shared_memory(self):
+        return self._executor is not None and self.pool_type == 'process'
+
+    def zeros(self, shape, dtype):
+        """Return a zero-filled array which may be written to by workers."""
+        if not self._uses_shared_memory():
+            return np.zeros(shape, dtype=dtype)
+
+        shape = tuple(int(x) for x in shape)
+        dtype = np.dtype(dtype)
+        shm = SharedMemory(create=True, size=max(1, int(np.prod(shape)) * dtype.itemsize))
+        array = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        array[...] = 0
+        self._shared[id(array)] = (array, shm)
+        return array
+
+    def asshared(self, X):
+        """Return *X* or, if workers cannot see it, a copy which they can."""
+        if not self._uses_shared_memory() or self._find_shared(X)[0] is not None:
+            return X
+        out = self.zeros(X.shape, dtype=X.dtype)
+        out[...] = X
+        return out
+
+    def readonly(self, X):
+        """Return a read-only view of *X*. Arrays which workers only read
+        may be passed to them as such a view rather than being shared.
+
+        """
+        X = np.asanyarray(X).view()
+        X.setflags(write=False)
+        return X
+
+    def detach(self, X):
+        """Return *X* or, if it refers to shared memory, a private copy."""
+        for array, _ in self._shared.values():
+            if np.may_share_memory(X, array):
+                return X.copy()
+        return X
+
+    def map_slices(self, fn, n, *args):
+        """Call ``fn(start, stop, *args)`` for contiguous ranges of slice
+        indices which together cover ``range(n)``, waiting for all calls to
+        complete.
+
+        Arrays in *args* which workers write to must have been returned by
+        :py:meth:`zeros` or :py:meth:`asshared`, or be views of such arrays.
+        A process pool passes copies of other arrays to its workers and so
+        raises ValueError if any of them is writable. Use :py:meth:`readonly`
+        for arrays which workers only read.
+
+        """
+        if self._executor is None or n < 2:
+            fn(0, n, *args)
+            return
+
+        bounds = np.linspace(0, n, min(n, self.n_workers) + 1).astype(int)
+        if self._uses_shared_memory():
+            args = tuple(self._ref(a) for a in args)
+            for a in args:
+                if isinstance(a, np.ndarray) and a.flags.writeable:
+                    raise ValueError('Writable arrays passed to worker processes must be in shared memory')
+            futures = [
+                self._executor.submit(_call_with_shared, fn, start, stop, args)
+                for start, stop in zip(bounds[:-1], bounds[1:])
+            ]
+        else:
+            futures = [
+                self._executor.submit(fn, start, stop, *args)
+                for start, stop in zip(bounds[:-1], bounds[1:])
+            ]
+
+        for f in futures:
+            f.result()
+
+    def _find_shared(self, a):
+        """Return the shared memory holding the array *a*, if any, and the
+        offset in bytes of its first element within it.
+
+        """
+        if not isinstance(a, np.ndarray):
+            return None, None
+        address = a.__array_interface__['data'][0]
+        for array, shm in self._shared.values():
+            base = array.__array_interface__['data'][0]
+            if base <= address < base + array.nbytes:
+                return shm, address - base
+        return None, None
+
+    def _ref(self, a):
+        shm, offset = self._find_shared(a)
+        if shm is None:
+            return a
+        return _SharedArrayRef(shm.name, a.shape, a.dtype.str, offset, a.strides)
+
+def _call_with_shared(fn, start, stop, args):
+    """
+    INTERNAL
+
+    Worker process entry point for :py:meth:`SlicePool.map_slices`. Attaches
+    to any shared arrays in *args* before calling *fn*.
+
+    """
+    handles = {}
+    resolved = list(
+        _attach_shared(a, handles) if isinstance(a, _SharedArrayRef) else a
+        for a in args
+    )
+
+    try:
+        fn(start, stop, *resolved)
+    finally:
+        del resolved
+        _close_shared(handles)
+
+def _share_arrays(arrays):
+    """
+    INTERNAL
+
+    Copy the arrays in *arrays* into one new block of shared memory and return
+    a :py:class:`_SharedArrayRef` to each copy. The memory outlives this
+    process and must be released by passing its name to
+    :py:func:`_unlink_shared` once no longer needed.
+
+    """
+    arrays = list(np.ascontiguousarray(a) for a in arrays)
+
+    # Align each array to a cache line
+    offsets, size = [], 0
+    for a in arrays:
+        offsets.append(size)
+        size += -(-a.nbytes // 64) * 64
+
+    shm = SharedMemory(create=True, size=max(1, size))
+    refs = []
+    for a, offset in zip(arrays, offsets):
+        np.ndarray(a.shape, dtype=a.dtype, buffer=shm.buf, offset=offset)[...] = a
+        refs.append(_SharedArrayRef(shm.name, a.shape, a.dtype.str, offset, a.strides))
+    shm.close()
+    return refs
+
+def _attach_shared(ref, handles):
+    """
+    INTERNAL
+
+    Return the array referred to by the :py:class:`_SharedArrayRef` *ref*.
+    *handles* is a dictionary of the shared memory attached to so far keyed
+    by name which should be passed to :py:func:`_close_shared` once the array
+    is no longer used.
+
+    """
+    try:
+        shm = handles[ref.name]
+    except KeyError:
+        shm = handles[ref.name] = SharedMemory(name=ref.name)
+    return np.ndarray(ref.shape, dtype=ref.dtype, buffer=shm.buf,
+                      offset=ref.offset, strides=ref.strides)
+
+def _close_shared(handles):
+    """
+    INTERNAL
+
+    Detach from the shared memory in the dictionary *handles* filled by
+    :py:func:`_attach_shared`.
+
+    """
+    while len(handles) > 0:
+        _, shm = handles.popitem()
+        try:
+            shm.close()
+        except BufferError:
+            # Some view onto the memory is still alive. The mapping will be
+            # released when it is garbage collected.
+            pass
+
+def _unlink_shared(name):
+    """
+    INTERNAL
+
+    Release the shared memory *name* created by :py:func:`_share_arrays`.
+
+    """
+    shm = SharedMemory(name=name)
+    shm.close()
+    shm.unlink()
+
 # note that this decorator ignores **kwargs
 # From https://wiki.python.org/moin/PythonDecoratorLibrary#Alternate_memoize_as_nested_functions
 def memoize(obj):
@@ -18,7 +18,6 @@ import logging
 import cv2
 from docopt import docopt
 import dtcwt
-from dtcwt.numpy import Transform2d
 import dtcwt.registration as reg
 import dtcwt.sampling
 import numpy as np
@@ -63,23 +62,13 @@ def avecs_for_frames(frames):
         return [],[]
 
     avecs = []
-    trans = Transform2d()
-
-    idx, frame = frames[0]
-    t = trans.forward(frame, nlevels=5)
-
-    h_pair = (None, t)
-    idx_pair = (None, idx)
     idx_pairs = []
 
-    for idx, frame in frames[1:]:
-        t = trans.forward(frame, nlevels=5)
-
-        h_pair = (h_pair[1], t)
-        idx_pair = (idx_pair[1], idx)
-
+    # Each frame is transformed once and reused for both adjacent pairs
+    for (i, j), a in reg.register_sequence((frame for _, frame in frames), nlevels=5):
+        idx_pair = (frames[i][0], frames[j][0])
         idx_pairs.append(idx_pair)
-        avecs.append(reg.estimatereg(h_pair[0], h_pair[1]))
+        avecs.append(a)
         logging.info('Finished frame pair {0}'.format(idx_pair))
 
     return idx_pairs, avecs
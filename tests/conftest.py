@@ -0,0 +1,26 @@
+import pytest
+
+from dtcwt.opencl.lowlevel import _tuning_cache_for_device
+
+@pytest.fixture(scope='session')
+def opencl_session_cache_dir(tmpdir_factory):
+    """A temporary OpenCL cache directory shared by every test so that work
+    group sizes are tuned and programs compiled at most once per session.
+
+    """
+    return tmpdir_factory.mktemp('opencl-cache')
+
+@pytest.fixture(autouse=True)
+def opencl_cache_dir(monkeypatch, opencl_session_cache_dir):
+    """Keep the persistent OpenCL caches of tuned work group sizes and compiled
+    program binaries within a temporary directory rather than the user's cache
+    directory. The in-memory tuning caches loaded from it are reset before and
+    after each test.
+
+    """
+    monkeypatch.setenv('DTCWT_OPENCL_CACHE_DIR', str(opencl_session_cache_dir))
+    _tuning_cache_for_device.cache.clear()
+    yield
+    _tuning_cache_for_device.cache.clear()
+
+# vim:sw=4:sts=4:et
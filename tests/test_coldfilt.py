@@ -2,6 +2,7 @@ import os
 
 import numpy as np
 from dtcwt.numpy.lowlevel import coldfilt
+from dtcwt.coeffs import qshift
 
 from pytest import raises
 
@@ -39,4 +40,14 @@ def test_output_size():
     Y = coldfilt(mandrill, (-1,1), (1,-1))
     assert Y.shape == (mandrill.shape[0]/2, mandrill.shape[1])
 
+def test_pad_matches_extended_input():
+    h0a, h0b = qshift('qshift_d')[:2]
+    X = mandrill[:510,:]
+    Xe = np.concatenate((X[:1,:], X, X[-1:,:]), axis=0)
+    assert np.all(coldfilt(X, h0b, h0a, pad=1) == coldfilt(Xe, h0b, h0a))
+
+def test_bad_padded_input_size():
+    with raises(ValueError):
+        coldfilt(mandrill, (-1,1), (1,-1), pad=1)
+
 # vim:sw=4:sts=4:et
@@ -2,7 +2,7 @@ import os
 
 import numpy as np
 from dtcwt.coeffs import biort, qshift
-from dtcwt.opencl.lowlevel import colfilter
+from dtcwt.opencl.lowlevel import colfilter, get_default_queue, _filter_to_device
 from dtcwt.numpy.lowlevel import colfilter as colfilter_gold
 
 from .util import assert_almost_equal, skip_if_no_cl
@@ -83,4 +83,16 @@ def test_even_size_non_array():
     z = colfilter_gold(mandrill.tolist(), (-1,1))
     assert_almost_equal(y, z)
 
+@skip_if_no_cl
+def test_filter_uploaded_once():
+    queue = get_default_queue()
+    h = biort('near_sym_b')[0]
+    h_device = _filter_to_device(h, queue)
+    assert _filter_to_device(h.copy(), queue) is h_device
+    assert _filter_to_device(biort('near_sym_b')[2], queue) is not h_device
+
+    # Filtering must still give the correct result when the cached filter is used
+    y = colfilter(mandrill, h)
+    assert_almost_equal(y, colfilter_gold(mandrill, h))
+
 # vim:sw=4:sts=4:et
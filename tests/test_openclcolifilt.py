@@ -81,6 +81,16 @@ def test_qshift():
     z = colifilt_gold(mandrill, h1b, h1a)
     assert_almost_equal(y, z)
 
+@skip_if_no_cl
+def test_qshift_lowpass():
+    # ha.hb is positive for the lowpass filters and negative for the highpass
+    # filters. Both cases must match.
+    for name in ('qshift_a', 'qshift_d', 'qshift_b_bp'):
+        h0a, h0b, g0a, g0b = qshift(name)[:4]
+        y = colifilt(mandrill, g0b, g0a)
+        z = colifilt_gold(mandrill, g0b, g0a)
+        assert_almost_equal(y, z)
+
 # This test fails. I'm not sure if that's expected or not because it is using
 # colifilt in an odd way.
 #
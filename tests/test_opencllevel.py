@@ -0,0 +1,106 @@
+import numpy as np
+from dtcwt.coeffs import biort, qshift
+from dtcwt.numpy.lowlevel import colfilter, coldfilt
+from dtcwt.numpy.transform2d import q2c
+from dtcwt.opencl.lowlevel import column_filter_bank, row_filter_q2c, empty, to_array
+
+from pytest import raises
+
+from .util import skip_if_no_cl
+import tests.datasets as datasets
+
+TOLERANCE = 1e-5
+
+def setup():
+    global mandrill
+    mandrill = datasets.mandrill()
+
+def _rows(f, X, *h):
+    return f(X.T, *h).T
+
+def _q2c(X1, X2, X3):
+    Yh = np.zeros((X1.shape[0] >> 1, X1.shape[1] >> 1, 6), dtype=np.complex64)
+    Yh[:,:,[0, 5]] = q2c(X1)
+    Yh[:,:,[2, 3]] = q2c(X2)
+    Yh[:,:,[1, 4]] = q2c(X3)
+    return Yh
+
+def _level(X, h0, h1, decimate):
+    Lo, Hi = column_filter_bank(X, (h0, h1), decimate=decimate)
+    return row_filter_q2c(Lo, Hi, Hi, (h0, h1, h1), decimate=decimate)
+
+@skip_if_no_cl
+def test_level1_matches_numpy():
+    h0o, g0o, h1o, g1o = biort('near_sym_b')
+    Lo, Hi = column_filter_bank(mandrill, (h0o, h1o))
+    assert np.abs(to_array(Lo) - colfilter(mandrill, h0o)).max() < TOLERANCE
+    assert np.abs(to_array(Hi) - colfilter(mandrill, h1o)).max() < TOLERANCE
+
+    LoLo, Yh = row_filter_q2c(Lo, Hi, Hi, (h0o, h1o, h1o))
+    Lo, Hi = colfilter(mandrill, h0o), colfilter(mandrill, h1o)
+    assert np.abs(to_array(LoLo) - _rows(colfilter, Lo, h0o)).max() < TOLERANCE
+    assert np.abs(to_array(Yh) - _q2c(_rows(colfilter, Hi, h0o), _rows(colfilter, Lo, h1o),
+                                      _rows(colfilter, Hi, h1o))).max() < TOLERANCE
+
+@skip_if_no_cl
+def test_leveln_matches_numpy():
+    h0a, h0b, g0a, g0b, h1a, h1b, g1a, g1b, h2a, h2b = qshift('qshift_b_bp')[:10]
+    X = mandrill[:256,:128]
+    Lo, Hi, Ba = column_filter_bank(X, (h0b, h1b, h2b), decimate=True)
+    assert Lo.shape == (128, 128)
+    assert np.abs(to_array(Ba) - coldfilt(X, h2b, h2a)).max() < TOLERANCE
+
+    LoLo, Yh = row_filter_q2c(Lo, Hi, Ba, (h0b, h1b, h2b), decimate=True)
+    assert LoLo.shape == (128, 64)
+    assert Yh.shape == (64, 32, 6)
+
+    Lo, Hi, Ba = coldfilt(X, h0b, h0a), coldfilt(X, h1b, h1a), coldfilt(X, h2b, h2a)
+    assert np.abs(to_array(LoLo) - _rows(coldfilt, Lo, h0b, h0a)).max() < TOLERANCE
+    assert np.abs(to_array(Yh) - _q2c(_rows(coldfilt, Hi, h0b, h0a), _rows(coldfilt, Lo, h1b, h1a),
+                                      _rows(coldfilt, Ba, h2b, h2a))).max() < TOLERANCE
+
+@skip_if_no_cl
+def test_stack():
+    h0o, g0o, h1o, g1o = biort('near_sym_a')
+    h0a, h0b, g0a, g0b, h1a, h1b, g1a, g1b = qshift('qshift_a')
+    X = np.dstack((mandrill[:64,:64], mandrill[64:128,:64]))
+    LoLo, Yh = _level(X, h0o, h1o, False)
+    LoLo, Yh = _level(LoLo, h0b, h1b, True)
+    assert Yh.shape == (16, 16, 6, 2)
+
+    for idx in range(2):
+        LoLo1, Yh1 = _level(X[:,:,idx], h0o, h1o, False)
+        LoLo1, Yh1 = _level(LoLo1, h0b, h1b, True)
+        assert np.all(to_array(Yh)[...,idx] == to_array(Yh1))
+        assert np.all(to_array(LoLo)[...,idx] == to_array(LoLo1))
+
+@skip_if_no_cl
+def test_outputs():
+    h0o, g0o, h1o, g1o = biort('near_sym_a')
+    Lo, Hi = column_filter_bank(mandrill[:64,:64], (h0o, h1o))
+    LoLo, Yh = row_filter_q2c(Lo, Hi, Hi, (h0o, h1o, h1o))
+
+    outputs = (empty((64, 64), np.float32), empty((32, 32, 6), np.complex64))
+    assert row_filter_q2c(Lo, Hi, Hi, (h0o, h1o, h1o), outputs=outputs) == outputs
+    assert np.all(to_array(outputs[0]) == to_array(LoLo))
+    assert np.all(to_array(outputs[1]) == to_array(Yh))
+
+    with raises(ValueError):
+        row_filter_q2c(Lo, Hi, Hi, (h0o, h1o, h1o), outputs=(outputs[0], empty((32, 32), np.complex64)))
+
+@skip_if_no_cl
+def test_even_filter_without_decimation():
+    with raises(ValueError):
+        column_filter_bank(mandrill, (np.ones(4), np.ones(5)))
+
+@skip_if_no_cl
+def test_bad_decimated_shape():
+    with raises(ValueError):
+        column_filter_bank(mandrill[:510,:], (np.ones(4), np.ones(4)), decimate=True)
+
+@skip_if_no_cl
+def test_wrong_number_of_filters():
+    with raises(ValueError):
+        column_filter_bank(mandrill, (np.ones(5),))
+
+# vim:sw=4:sts=4:et
@@ -0,0 +1,41 @@
+import numpy as np
+from dtcwt.opencl.lowlevel import pad_edge, to_array, to_device
+
+from pytest import raises
+
+from .util import skip_if_no_cl
+import tests.datasets as datasets
+
+def setup():
+    global mandrill
+    mandrill = datasets.mandrill()
+
+def test_mandrill_loaded():
+    assert mandrill.shape == (512, 512)
+    assert mandrill.min() >= 0
+    assert mandrill.max() <= 1
+    assert mandrill.dtype == np.float32
+
+@skip_if_no_cl
+def test_matches_numpy():
+    for pad_width in (((1,1),(1,1)), ((0,1),(0,0)), ((2,0),(3,1))):
+        Y = to_array(pad_edge(to_device(mandrill[:509,:510]), pad_width))
+        assert np.all(Y == np.pad(mandrill[:509,:510], pad_width, mode='edge'))
+
+@skip_if_no_cl
+def test_no_padding():
+    Y = to_array(pad_edge(to_device(mandrill), ((0,0),(0,0))))
+    assert np.all(Y == mandrill)
+
+@skip_if_no_cl
+def test_view_input():
+    X = to_device(mandrill)[10:-10,:]
+    Y = to_array(pad_edge(X, ((1,1),(1,1))))
+    assert np.all(Y == np.pad(mandrill[10:-10,:], ((1,1),(1,1)), mode='edge'))
+
+@skip_if_no_cl
+def test_bad_pad_width():
+    with raises(ValueError):
+        pad_edge(to_device(mandrill), ((1,1),))
+
+# vim:sw=4:sts=4:et
@@ -0,0 +1,49 @@
+import os
+
+from dtcwt.opencl.lowlevel import get_default_queue
+from dtcwt.opencl.lowlevel import _build_program, _program_cache_path, CL_ARRAY_HEADER, PAD_EDGE_KERNEL
+
+from .util import skip_if_no_cl
+
+SOURCE = CL_ARRAY_HEADER + PAD_EDGE_KERNEL
+
+def test_program_cache_disabled(monkeypatch):
+    monkeypatch.setenv('DTCWT_OPENCL_CACHE_DIR', '')
+    assert _program_cache_path(SOURCE, None) is None
+
+@skip_if_no_cl
+def test_binary_kept_out_of_user_cache(opencl_session_cache_dir):
+    # The test suite must not write programs to the user's cache directory
+    context = get_default_queue().context
+    path = _program_cache_path(SOURCE, context.devices[0])
+    assert path.startswith(str(opencl_session_cache_dir))
+
+@skip_if_no_cl
+def test_binary_written_and_reused(monkeypatch, tmpdir):
+    monkeypatch.setenv('DTCWT_OPENCL_CACHE_DIR', str(tmpdir))
+    context = get_default_queue().context
+    path = _program_cache_path(SOURCE, context.devices[0])
+
+    assert not os.path.exists(path)
+    _build_program(context, SOURCE)
+    assert os.path.getsize(path) > 0
+
+    mtime = os.path.getmtime(path)
+    assert _build_program(context, SOURCE).pad_edge_kernel is not None
+    assert os.path.getmtime(path) == mtime
+
+@skip_if_no_cl
+def test_corrupt_binary_is_rebuilt(monkeypatch, tmpdir):
+    monkeypatch.setenv('DTCWT_OPENCL_CACHE_DIR', str(tmpdir))
+    context = get_default_queue().context
+    path = _program_cache_path(SOURCE, context.devices[0])
+    _build_program(context, SOURCE)
+
+    with open(path, 'wb') as f:
+        f.write(b'not a program binary')
+
+    assert _build_program(context, SOURCE).pad_edge_kernel is not None
+    with open(path, 'rb') as f:
+        assert f.read() != b'not a program binary'
+
+# vim:sw=4:sts=4:et
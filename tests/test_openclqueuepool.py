@@ -0,0 +1,168 @@
+import numpy as np
+import dtcwt
+from dtcwt.opencl import Transform2d, Transform3d
+from dtcwt.opencl.lowlevel import QueuePool, get_default_queue, queue_pool_for_devices, queue_pool_for_subdevices
+from dtcwt.opencl.lowlevel import to_array, to_device, to_queue
+
+from pytest import raises
+
+from .util import skip_if_no_cl
+import tests.datasets as datasets
+
+try:
+    import pyopencl as cl
+except ImportError:
+    pass
+
+TOLERANCE = 1e-6
+
+def setup():
+    global mandrill
+    mandrill = datasets.mandrill()
+
+def _pool(n=3, policy='round-robin'):
+    queue = get_default_queue()
+    return QueuePool(list(cl.CommandQueue(queue.context, queue.device) for _ in range(n)), policy=policy)
+
+def test_empty_pool():
+    with raises(ValueError):
+        QueuePool([])
+
+@skip_if_no_cl
+def test_bad_policy():
+    with raises(ValueError):
+        _pool(policy='random')
+
+@skip_if_no_cl
+def test_round_robin():
+    pool = _pool()
+    assert list(pool.next_queue() for _ in range(6)) == list(pool.queues) * 2
+
+@skip_if_no_cl
+def test_load_aware():
+    pool = _pool(policy='load')
+
+    # A user event which never completes keeps a queue busy
+    busy = cl.UserEvent(pool.queues[0].context)
+    pool.submit(lambda queue: cl.enqueue_barrier(queue, wait_for=[busy]), queue=pool.queues[0])
+    assert pool.outstanding(pool.queues[0]) == 1
+    assert pool.queues[0] not in list(pool.next_queue() for _ in range(4))
+
+    busy.set_status(cl.command_execution_status.COMPLETE)
+    pool.finish()
+    assert pool.outstanding(pool.queues[0]) == 0
+
+@skip_if_no_cl
+def test_map_in_order():
+    pool = _pool()
+    items = list(range(7))
+    results = pool.map(lambda item, queue: (item, queue), items)
+    assert list(r[0] for r in results) == items
+    assert list(r[1] for r in results) == list(pool.queues) * 2 + [pool.queues[0]]
+
+@skip_if_no_cl
+def test_pool_for_devices():
+    pool = queue_pool_for_devices()
+    assert len(pool) >= 1
+    assert to_array(pool.map(lambda X, queue: to_device(X, queue=queue), [mandrill])[0]).shape == mandrill.shape
+
+@skip_if_no_cl
+def test_pool_for_subdevices():
+    try:
+        pool = queue_pool_for_subdevices(compute_units=1)
+    except ValueError:
+        # Device fission is optional
+        return
+    assert len(pool) == get_default_queue().device.max_compute_units
+
+@skip_if_no_cl
+def test_transform2d_with_pool():
+    pool = _pool()
+    t = Transform2d(queue=pool)
+    t_single = Transform2d()
+    frames = list(mandrill[i:i+64,i:i+64] for i in range(0, 256, 64))
+
+    pyramids = list(t.forward(X, nlevels=3) for X in frames)
+    assert list(p.cl_lowpass.queue for p in pyramids) == list(pool.queues) + [pool.queues[0]]
+
+    for X, p in zip(frames, pyramids):
+        ref = t_single.forward(X, nlevels=3)
+        assert np.abs(p.lowpass - ref.lowpass).max() < TOLERANCE
+        for h, ref_h in zip(p.highpasses, ref.highpasses):
+            assert np.abs(h - ref_h).max() < TOLERANCE
+
+        # The inverse runs on the queue holding the pyramid
+        assert t.cl_inverse(p).queue is p.cl_lowpass.queue
+        assert np.abs(t.inverse(p) - X).max() < 1e-3
+
+@skip_if_no_cl
+def test_transform2d_async_with_pool():
+    pool = _pool()
+    t = Transform2d(queue=pool)
+    futures = list(t.forward_async(mandrill[:64,:64], copy_to_host=True) for _ in range(3))
+    assert len(set(f.result().cl_lowpass.queue for f in futures)) == 3
+
+@skip_if_no_cl
+def test_transform2d_pool_with_transfer_queue():
+    pool = _pool()
+    with raises(ValueError):
+        Transform2d(queue=pool, transfer_queue=pool.queues[0])
+
+def _assert_batch_matches_single(pool, X):
+    t = Transform2d(queue=pool)
+    p = t.forward_batch(X, nlevels=3, include_scale=True)
+    ref = Transform2d().forward_batch(X, nlevels=3, include_scale=True)
+    assert p.cl_lowpass.queue is pool.queues[0]
+    assert np.abs(p.lowpass - ref.lowpass).max() < TOLERANCE
+    for h, ref_h in zip(p.highpasses, ref.highpasses):
+        assert h.shape == ref_h.shape
+        assert np.abs(h - ref_h).max() < TOLERANCE
+    for s, ref_s in zip(p.scales, ref.scales):
+        assert np.abs(s - ref_s).max() < TOLERANCE
+
+@skip_if_no_cl
+def test_transform2d_batch_with_pool():
+    X = np.stack(list(mandrill[i:i+32,i:i+32] for i in range(0, 160, 32)))
+    _assert_batch_matches_single(_pool(), X)
+    _assert_batch_matches_single(_pool(), X[:2])
+
+@skip_if_no_cl
+def test_transform2d_batch_with_pool_of_contexts():
+    # Queues in different contexts cannot share device arrays
+    device = get_default_queue().device
+    pool = QueuePool(list(cl.CommandQueue(cl.Context([device]), device) for _ in range(2)))
+    X = np.stack(list(mandrill[i:i+32,i:i+32] for i in range(0, 96, 32)))
+    _assert_batch_matches_single(pool, X)
+
+@skip_if_no_cl
+def test_transform2d_batch_on_pool_queue():
+    pool = _pool()
+    X = np.stack((mandrill[:32,:32], mandrill[32:64,:32]))
+    p = Transform2d(queue=pool).forward_batch(to_device(X, queue=pool.queues[1]), nlevels=2)
+    assert p.cl_lowpass.queue is pool.queues[1]
+
+@skip_if_no_cl
+def test_transform3d_with_pool():
+    pool = _pool(2)
+    t = Transform3d(queue=pool)
+    X = np.random.rand(16, 16, 16).astype(np.float32)
+    pyramids = list(t.forward(X, nlevels=2) for _ in range(2))
+    assert pyramids[0].cl_lowpass.queue is not pyramids[1].cl_lowpass.queue
+    assert np.all(pyramids[0].lowpass == pyramids[1].lowpass)
+    assert np.abs(t.inverse(pyramids[1]) - X).max() < 1e-3
+
+@skip_if_no_cl
+def test_backend_stack_selects_pool():
+    pool = _pool()
+    with dtcwt.preserve_backend_stack():
+        dtcwt.push_backend('opencl', queue=pool)
+        assert dtcwt.Transform2d().queue_pool is pool
+        assert to_queue(None) in pool.queues
+        dtcwt.pop_backend()
+    assert to_queue(None) is get_default_queue()
+
+def test_numpy_backend_rejects_queue():
+    with raises(ValueError):
+        dtcwt.push_backend('numpy', queue=object())
+
+# vim:sw=4:sts=4:et
@@ -0,0 +1,147 @@
+import json
+import os
+
+import numpy as np
+from dtcwt.opencl.lowlevel import axis_convolve_dfilter, get_default_queue, to_array, to_device
+from dtcwt.opencl.lowlevel import _autotune_enabled, _cache_dir, _is_writable, _shape_class, _load_json, _write_cache_file
+from dtcwt.opencl.lowlevel import _MAX_TUNING_CANDIDATES
+from dtcwt.opencl.lowlevel import _tuning_cache_for_device, _tuning_cache_path, _candidate_local_shapes
+from dtcwt.opencl.lowlevel import _dfilter_kernel_for_queue, _pad_edge_kernel_for_queue
+from dtcwt.opencl.lowlevel import _kernel_source_hash, _max_local_size, _tuned_local_shape
+from dtcwt.coeffs import qshift
+
+from .util import skip_if_no_cl
+
+def test_cache_dir_from_environment(monkeypatch, tmpdir):
+    monkeypatch.setenv('DTCWT_OPENCL_CACHE_DIR', str(tmpdir))
+    assert _cache_dir() == str(tmpdir)
+
+def test_cache_dir_disabled(monkeypatch):
+    monkeypatch.setenv('DTCWT_OPENCL_CACHE_DIR', '')
+    assert _cache_dir() is None
+
+def test_cache_dir_default(monkeypatch, tmpdir):
+    monkeypatch.delenv('DTCWT_OPENCL_CACHE_DIR', raising=False)
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmpdir))
+    assert _cache_dir() == os.path.join(str(tmpdir), 'dtcwt')
+
+def test_shape_class():
+    assert _shape_class((64, 64, 1)) == '6x6x0'
+    assert _shape_class((33, 64, 1)) == _shape_class((64, 40, 1))
+    assert _shape_class((65, 64, 1)) != _shape_class((64, 64, 1))
+
+def test_cache_file_round_trip(tmpdir):
+    path = os.path.join(str(tmpdir), 'a', 'b.json')
+    _write_cache_file(path, json.dumps({'x': [1, 2, 1]}))
+    assert _load_json(path) == {'x': [1, 2, 1]}
+    assert os.listdir(os.path.dirname(path)) == ['b.json']
+
+def test_load_missing_or_corrupt_cache(tmpdir):
+    path = os.path.join(str(tmpdir), 'c.json')
+    assert _load_json(path) == {}
+    with open(path, 'w') as f:
+        f.write('{ not json')
+    assert _load_json(path) == {}
+
+@skip_if_no_cl
+def test_candidates_fit_device():
+    queue = get_default_queue()
+    kern = _dfilter_kernel_for_queue(queue.context)
+    candidates = _candidate_local_shapes(queue.device, kern, (128, 64, 1))
+    assert None in candidates
+    assert len(candidates) <= _MAX_TUNING_CANDIDATES
+    for c in candidates:
+        if c is not None:
+            assert len(c) == 3
+            assert int(np.prod(c)) <= queue.device.max_work_group_size
+
+def test_autotune_is_opt_in(monkeypatch):
+    monkeypatch.delenv('DTCWT_OPENCL_AUTOTUNE', raising=False)
+    assert not _autotune_enabled()
+    monkeypatch.setenv('DTCWT_OPENCL_AUTOTUNE', '1')
+    assert _autotune_enabled()
+
+def test_is_writable(tmpdir):
+    assert _is_writable(os.path.join(str(tmpdir), 'a', 'b', 'c.json'))
+    os.chmod(str(tmpdir), 0o500)
+    try:
+        if os.access(str(tmpdir), os.W_OK):
+            # Permissions are not enforced, e.g. for the superuser
+            return
+        assert not _is_writable(os.path.join(str(tmpdir), 'a', 'c.json'))
+    finally:
+        os.chmod(str(tmpdir), 0o700)
+
+@skip_if_no_cl
+def test_no_tuning_without_persistent_cache(monkeypatch):
+    monkeypatch.setenv('DTCWT_OPENCL_CACHE_DIR', '')
+    monkeypatch.setenv('DTCWT_OPENCL_AUTOTUNE', '1')
+    queue = get_default_queue()
+    _tuning_cache_for_device.cache.clear()
+
+    X = np.random.rand(96, 80).astype(np.float32)
+    axis_convolve_dfilter(to_device(X), qshift('qshift_a')[0], axis=0)
+    assert _tuning_cache_for_device(queue.device) == {}
+
+@skip_if_no_cl
+def test_no_tuning_by_default(monkeypatch, tmpdir):
+    monkeypatch.setenv('DTCWT_OPENCL_CACHE_DIR', str(tmpdir))
+    monkeypatch.delenv('DTCWT_OPENCL_AUTOTUNE', raising=False)
+    queue = get_default_queue()
+    _tuning_cache_for_device.cache.clear()
+
+    X = np.random.rand(96, 80).astype(np.float32)
+    axis_convolve_dfilter(to_device(X), qshift('qshift_a')[0], axis=0)
+    assert _tuning_cache_for_device(queue.device) == {}
+    assert not os.path.exists(_tuning_cache_path(queue.device))
+
+@skip_if_no_cl
+def test_tuned_launch_is_recorded(monkeypatch, tmpdir):
+    monkeypatch.setenv('DTCWT_OPENCL_CACHE_DIR', str(tmpdir))
+    monkeypatch.setenv('DTCWT_OPENCL_AUTOTUNE', '1')
+    queue = get_default_queue()
+    _tuning_cache_for_device.cache.clear()
+
+    X = np.random.rand(96, 80).astype(np.float32)
+    h = qshift('qshift_a')[0]
+    Y = to_array(axis_convolve_dfilter(to_device(X), h, axis=0))
+    assert Y.shape == (48, 80)
+
+    entries = _load_json(_tuning_cache_path(queue.device))
+    source_hash = _kernel_source_hash(_dfilter_kernel_for_queue(queue.context))
+    assert any(k.startswith('dfilter-axis0:{0}:'.format(source_hash)) for k in entries)
+
+    # The result must not depend on the tuned work group size
+    _tuning_cache_for_device.cache.clear()
+    monkeypatch.setenv('DTCWT_OPENCL_AUTOTUNE', '0')
+    monkeypatch.setenv('DTCWT_OPENCL_CACHE_DIR', '')
+    assert np.all(to_array(axis_convolve_dfilter(to_device(X), h, axis=0)) == Y)
+
+@skip_if_no_cl
+def test_kernel_source_hash():
+    queue = get_default_queue()
+    dfilter_hash = _kernel_source_hash(_dfilter_kernel_for_queue(queue.context))
+    assert dfilter_hash != ''
+    assert dfilter_hash == _kernel_source_hash(_dfilter_kernel_for_queue(queue.context))
+    assert dfilter_hash != _kernel_source_hash(_pad_edge_kernel_for_queue(queue.context))
+
+@skip_if_no_cl
+def test_oversized_cached_size_is_discarded(monkeypatch):
+    monkeypatch.setenv('DTCWT_OPENCL_CACHE_DIR', '')
+    queue = get_default_queue()
+    kern = _dfilter_kernel_for_queue(queue.context)
+    work_shape = (64, 64, 1)
+    _tuning_cache_for_device.cache.clear()
+    cache = _tuning_cache_for_device(queue.device)
+
+    key = 'dfilter-axis0:{0}:{1}'.format(_kernel_source_hash(kern), _shape_class(work_shape))
+    cache[key] = [1, _max_local_size(queue.device, kern) + 1, 1]
+    local_shape = _tuned_local_shape(queue, kern, 'dfilter-axis0', work_shape)
+    assert local_shape is None or int(np.prod(local_shape)) <= _max_local_size(queue.device, kern)
+    assert key not in cache
+
+    cache[key] = [1, 1, 1]
+    assert _tuned_local_shape(queue, kern, 'dfilter-axis0', work_shape) == (1, 1, 1)
+    _tuning_cache_for_device.cache.clear()
+
+# vim:sw=4:sts=4:et
@@ -5,6 +5,10 @@ import numpy as np
 from dtcwt.coeffs import biort, qshift
 from dtcwt.compat import dtwavexfm2 as dtwavexfm2_np, dtwaveifm2
 from dtcwt.opencl.transform2d import dtwavexfm2 as dtwavexfm2_cl
+from dtcwt.numpy import Transform2d as Transform2d_np
+from dtcwt.opencl import Transform2d as Transform2d_cl
+
+from dtcwt.opencl.lowlevel import to_array, to_device
 
 from .util import assert_almost_equal, skip_if_no_cl
 import tests.datasets as datasets
@@ -89,4 +93,108 @@ def test_modified():
     b = dtwavexfm2_cl(mandrill, biort=biort('near_sym_b_bp'), qshift=qshift('qshift_b_bp'))
     _compare_transforms(a, b)
 
+def _compare_inverses(X, nlevels=3, gain_mask=None, **kwargs):
+    p = Transform2d_np(**kwargs).forward(X, nlevels=nlevels)
+    a = Transform2d_np(**kwargs).inverse(p, gain_mask=gain_mask)
+    b = Transform2d_cl(**kwargs).inverse(p, gain_mask=gain_mask)
+    assert_almost_equal(a, b, tolerance=GOLD_TOLERANCE)
+
+@skip_if_no_cl
+def test_inverse():
+    _compare_inverses(mandrill)
+
+@skip_if_no_cl
+def test_inverse_odd_rows_and_cols():
+    _compare_inverses(mandrill[:509,:509], nlevels=4)
+
+@skip_if_no_cl
+def test_inverse_gain_mask():
+    gain_mask = np.ones((6,3))
+    gain_mask[2,1] = 0
+    gain_mask[5,0] = 0.5
+    _compare_inverses(mandrill, gain_mask=gain_mask)
+
+@skip_if_no_cl
+def test_inverse_modified():
+    _compare_inverses(mandrill, biort='near_sym_b_bp', qshift='qshift_b_bp')
+
+@skip_if_no_cl
+def test_inverse_on_device():
+    t = Transform2d_cl()
+    p = t.forward(mandrill, nlevels=3)
+    Z = t.cl_inverse(p)
+    assert Z.shape == mandrill.shape
+    assert_almost_equal(to_array(Z), mandrill, tolerance=GOLD_TOLERANCE)
+
+def _compare_batch(X, nlevels=3, on_device=False, **kwargs):
+    t = Transform2d_cl(**kwargs)
+    p = t.forward_batch(to_device(X) if on_device else X, nlevels=nlevels, include_scale=True)
+    assert p.lowpass.shape[0] == X.shape[0]
+    for i in range(X.shape[0]):
+        ref = Transform2d_np(**kwargs).forward(X[i], nlevels=nlevels, include_scale=True)
+        assert_almost_equal(p.lowpass[i], ref.lowpass, tolerance=GOLD_TOLERANCE)
+        for x, y in zip(p.highpasses, ref.highpasses):
+            assert_almost_equal(x[i], y, tolerance=GOLD_TOLERANCE)
+        for x, y in zip(p.scales, ref.scales):
+            assert_almost_equal(x[i], y, tolerance=GOLD_TOLERANCE)
+
+@skip_if_no_cl
+def test_forward_batch():
+    X = np.stack((mandrill[:64,:64], mandrill[64:128,:64], mandrill[:64,64:128]))
+    _compare_batch(X)
+
+@skip_if_no_cl
+def test_forward_batch_odd_rows_and_cols():
+    X = np.stack((mandrill[:61,:63], mandrill[61:122,:63]))
+    _compare_batch(X)
+    _compare_batch(X, nlevels=0)
+
+@skip_if_no_cl
+def test_forward_batch_modified():
+    X = np.stack((mandrill[:64,:64], mandrill[64:128,:64]))
+    _compare_batch(X, biort='near_sym_b_bp', qshift='qshift_b_bp')
+
+@skip_if_no_cl
+def test_forward_batch_on_device():
+    X = np.stack((mandrill[:64,:64], mandrill[64:128,:64]))
+    _compare_batch(X, on_device=True)
+    _compare_batch(X, nlevels=0, on_device=True)
+
+@skip_if_no_cl
+def test_forward_batch_requires_3d():
+    with raises(ValueError):
+        Transform2d_cl().forward_batch(mandrill)
+
+@skip_if_no_cl
+def test_forward_async():
+    t = Transform2d_cl()
+    futures = [t.forward_async(mandrill, nlevels=3, copy_to_host=True) for _ in range(3)]
+    ref = t.forward(mandrill, nlevels=3)
+    for f in futures:
+        p = f.result()
+        assert f.done()
+        _compare_transforms((p.lowpass, p.highpasses), (ref.lowpass, ref.highpasses))
+
+@skip_if_no_cl
+def test_forward_async_on_device():
+    t = Transform2d_cl()
+    f = t.forward_async(mandrill, nlevels=3)
+    ref = dtwavexfm2_np(mandrill, nlevels=3)
+    p = f.result()
+    _compare_transforms((p.lowpass, p.highpasses), ref)
+
+@skip_if_no_cl
+def test_inverse_async():
+    p = Transform2d_np().forward(mandrill, nlevels=3)
+    a = Transform2d_np().inverse(p)
+    f = Transform2d_cl().inverse_async(p)
+    assert_almost_equal(a, f.result(), tolerance=GOLD_TOLERANCE)
+
+@skip_if_no_cl
+def test_inverse_async_on_device():
+    t = Transform2d_cl()
+    p = t.forward_async(mandrill, nlevels=3).result()
+    Z = t.inverse_async(p, copy_to_host=False).result()
+    assert_almost_equal(to_array(Z), mandrill, tolerance=GOLD_TOLERANCE)
+
 # vim:sw=4:sts=4:et
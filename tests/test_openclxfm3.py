@@ -0,0 +1,81 @@
+import numpy as np
+from pytest import raises
+
+from dtcwt.numpy import Transform3d as Transform3d_np
+from dtcwt.opencl import Transform3d as Transform3d_cl
+from dtcwt.opencl.lowlevel import to_array
+
+from .util import assert_almost_equal, skip_if_no_cl
+
+GRID_SIZE=32
+SPHERE_RAD=0.4 * GRID_SIZE
+GOLD_TOLERANCE = 1e-5
+
+def setup():
+    global ellipsoid
+
+    grid = slice(-(GRID_SIZE>>1), (GRID_SIZE>>1))
+    X, Y, Z = np.mgrid[grid,grid,grid]
+
+    Y = Y * 1.2
+    Z = Z * 1.4
+
+    r = np.sqrt(X*X + Y*Y + Z*Z)
+    ellipsoid = np.where(r <= SPHERE_RAD, 1.0, 0.0).astype(np.float64)
+
+def _compare_transforms(A, B):
+    assert_almost_equal(A.lowpass, B.lowpass, tolerance=GOLD_TOLERANCE)
+    for x, y in zip(A.highpasses, B.highpasses):
+        assert (x is None) == (y is None)
+        if x is not None:
+            assert_almost_equal(x, y, tolerance=GOLD_TOLERANCE)
+
+def _compare(X, nlevels=3, ext_mode=4, **kwargs):
+    a = Transform3d_np(ext_mode=ext_mode).forward(X, nlevels=nlevels, **kwargs)
+    b = Transform3d_cl(ext_mode=ext_mode).forward(X, nlevels=nlevels, **kwargs)
+    _compare_transforms(a, b)
+
+    Za = Transform3d_np(ext_mode=ext_mode).inverse(a)
+    Zb = Transform3d_cl(ext_mode=ext_mode).inverse(b)
+    assert Za.shape == Zb.shape
+    assert_almost_equal(Za, Zb, tolerance=GOLD_TOLERANCE)
+
+@skip_if_no_cl
+def test_simple():
+    _compare(ellipsoid)
+
+@skip_if_no_cl
+def test_ext_mode_4():
+    _compare(ellipsoid[:30,:26,:28], nlevels=4)
+
+@skip_if_no_cl
+def test_ext_mode_8():
+    _compare(ellipsoid[:28,:24,:32], nlevels=4, ext_mode=8)
+
+@skip_if_no_cl
+def test_discard_level_1():
+    _compare(ellipsoid, discard_level_1=True)
+
+@skip_if_no_cl
+def test_discard_highpasses():
+    _compare(ellipsoid, discard_highpasses=True)
+
+@skip_if_no_cl
+def test_discard_extended():
+    for kwargs in (dict(discard_level_1=True), dict(discard_highpasses=True)):
+        _compare(ellipsoid[:30,:26,:28], nlevels=4, **kwargs)
+        _compare(ellipsoid[:28,:24,:20], nlevels=4, ext_mode=8, **kwargs)
+
+@skip_if_no_cl
+def test_perfect_reconstruction():
+    t = Transform3d_cl()
+    Z = t.cl_inverse(t.forward(ellipsoid, nlevels=3))
+    assert_almost_equal(to_array(Z), ellipsoid, tolerance=GOLD_TOLERANCE)
+
+@skip_if_no_cl
+def test_even_length_level_1_filters():
+    h0o, g0o, h1o, g1o = Transform3d_np().biort
+    with raises(ValueError):
+        Transform3d_cl(biort=(h0o[1:], g0o, h1o, g1o)).forward(ellipsoid)
+
+# vim:sw=4:sts=4:et
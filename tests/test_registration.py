@@ -3,10 +3,14 @@ import os
 import numpy as np
 
 import dtcwt
+from pytest import raises
 from dtcwt.numpy import Transform2d
 from dtcwt.registration import *
+from dtcwt.registration import EXPECTED_SHIFTS, Q_TRIU_INDICES, _boxfilter, _fill_from_neighbours, QTILDE_ROWS, QTILDE_COLS, RegistrationFeatures
+from dtcwt.registration import confidence, phasegradient, qtildematrices, solvetransform, warphighpass
 
 import tests.datasets as datasets
+from .util import skip_if_no_futures, skip_if_no_shared_memory
 
 def setup():
     global f1, f2
@@ -23,6 +27,107 @@ def test_frames_loaded():
     assert f2.max() <= 1
     assert f2.dtype == np.float64
 
+def test_qtildematrices_matches_per_subband():
+    trans = Transform2d()
+    t1 = trans.forward(f1[:128,:128], nlevels=3)
+    t2 = trans.forward(f2[:128,:128], nlevels=3)
+    Qt_mats = qtildematrices(t1, t2, (1, 2))
+
+    for level, Qt in zip((1, 2), Qt_mats):
+        h1, h2 = t1.highpasses[level], t2.highpasses[level]
+        assert Qt.shape == h1.shape[:2] + (27,)
+
+        xs, ys = np.meshgrid(np.arange(0,1,1/h1.shape[1]), np.arange(0,1,1/h1.shape[0]))
+        expected = np.zeros_like(Qt)
+        for subband in range(6):
+            C_d = confidence(h1[:,:,subband], h2[:,:,subband])
+            dy, dx, dt = phasegradient(h1[:,:,subband], h2[:,:,subband], EXPECTED_SHIFTS[subband,:])
+            dx *= h1.shape[1]
+            dy *= h1.shape[0]
+            tmp = (dx, dy, xs*dx, xs*dy, ys*dx, ys*dy, -dt)
+            prods = list(tmp[r] * tmp[c] for r, c in Q_TRIU_INDICES) + list(tmp[r] * tmp[6] for r in range(6))
+            expected += np.dstack(prods) * (C_d**2)[:,:,np.newaxis]
+
+        assert np.allclose(Qt, expected, rtol=1e-10, atol=1e-10 * np.abs(expected).max())
+
+def test_stacked_subbands():
+    trans = Transform2d()
+    h1 = trans.forward(f1[:64,:64], nlevels=2).highpasses[1]
+    h2 = trans.forward(f2[:64,:64], nlevels=2).highpasses[1]
+
+    C_d = confidence(h1, h2)
+    dy, dx, dt = phasegradient(h1, h2, EXPECTED_SHIFTS.T)
+    for subband in range(6):
+        assert np.allclose(C_d[:,:,subband], confidence(h1[:,:,subband], h2[:,:,subband]))
+        for a, b in zip((dy, dx, dt), phasegradient(h1[:,:,subband], h2[:,:,subband], EXPECTED_SHIFTS[subband,:])):
+            assert np.allclose(a[:,:,subband], b)
+
+def test_registration_features():
+    trans = Transform2d()
+    t1 = trans.forward(f1[:128,:128], nlevels=4)
+    t2 = trans.forward(f2[:128,:128], nlevels=4)
+    F1, F2 = RegistrationFeatures(t1), RegistrationFeatures(t2)
+
+    assert F1.highpasses is t1.highpasses
+    assert F1.level(2) is F1.level(2)
+
+    for a, b in zip(qtildematrices(t1, t2, (2, 3)), qtildematrices(F1, F2, (2, 3))):
+        assert np.all(a == b)
+    for a, b in zip(qtildematrices(t1, t2, (2, 3)), qtildematrices(F1, t2, (2, 3))):
+        assert np.all(a == b)
+
+def _sequence():
+    return list(f1[i:i+128,2*i:2*i+128] for i in range(0, 40, 8))
+
+def _assert_register_sequence_matches_pairs(**kwargs):
+    trans = Transform2d()
+    frames = _sequence()
+    expected = list(
+        estimatereg(trans.forward(a, nlevels=5), trans.forward(b, nlevels=5), levels=[[4, 3]])
+        for a, b in zip(frames[:-1], frames[1:])
+    )
+
+    results = list(register_sequence(iter(frames), nlevels=5, levels=[[4, 3]], **kwargs))
+    assert list(pair for pair, _ in results) == list((i, i+1) for i in range(len(frames)-1))
+    for (_, avecs), e in zip(results, expected):
+        assert np.all(avecs == e)
+
+def test_register_sequence():
+    _assert_register_sequence_matches_pairs()
+
+@skip_if_no_futures
+def test_register_sequence_pool():
+    for kwargs in (dict(n_workers=3), dict(n_workers=2, window=1), dict(n_workers=2, pool_type='process')):
+        _assert_register_sequence_matches_pairs(**kwargs)
+
+@skip_if_no_shared_memory
+def test_register_sequence_process_pool_releases_features(monkeypatch):
+    released = []
+    def recording_unlink(name):
+        released.append(name)
+        unlink_shared(name)
+    unlink_shared = dtcwt.utils._unlink_shared
+    monkeypatch.setattr(dtcwt.utils, '_unlink_shared', recording_unlink)
+
+    # The features of each frame are passed to workers in shared memory which
+    # is released once both pairs it belongs to are registered
+    frames = _sequence()
+    list(register_sequence(frames, nlevels=5, levels=[[4, 3]], n_workers=2, pool_type='process'))
+    assert len(set(released)) == len(released) == len(frames)
+
+@skip_if_no_futures
+def test_register_sequence_short():
+    assert list(register_sequence([], nlevels=5)) == []
+    assert list(register_sequence(_sequence()[:1], nlevels=5, n_workers=2)) == []
+
+def test_register_sequence_bad_pool_type():
+    with raises(ValueError):
+        next(register_sequence(_sequence(), pool_type='fibre'))
+
+def test_register_sequence_warm_start_requires_tolerance():
+    with raises(ValueError):
+        next(register_sequence(_sequence(), warm_start=True))
+
 def test_estimatereg():
     nlevels = 6
     trans = Transform2d()
@@ -34,3 +139,268 @@ def test_estimatereg():
     warped_f1 = warp(f1, avecs, method='bilinear')
     assert np.mean(np.abs(warped_f1 - f2)) < np.mean(np.abs(f1-f2))
 
+def test_estimatereg_warm_start():
+    trans = Transform2d()
+    t1 = trans.forward(f1, nlevels=6)
+    t2 = trans.forward(f2, nlevels=6)
+    avecs = estimatereg(t1, t2)
+
+    # A converged initial estimate is only refined at the finest scale
+    warm = estimatereg(t1, t2, initial_avecs=avecs, tolerance=1)
+    assert warm.shape == avecs.shape
+    assert np.mean(np.abs(warp(f1, warm, method='bilinear') - f2)) < np.mean(np.abs(f1-f2))
+
+    # An unconverged one is refined through the whole schedule
+    refined = estimatereg(t1, t2, initial_avecs=avecs, tolerance=0)
+    assert np.all(np.isfinite(refined))
+    assert np.mean(np.abs(warp(f1, refined, method='bilinear') - f2)) < np.mean(np.abs(f1-f2))
+
+    # The initial estimate is rescaled to the output shape
+    assert estimatereg(t1, t2, initial_avecs=avecs[::2,::2]).shape == avecs.shape
+
+def test_estimatereg_warm_start_precision():
+    trans = Transform2d()
+    t1 = trans.forward(f1.astype(np.float32), nlevels=6)
+    t2 = trans.forward(f2.astype(np.float32), nlevels=6)
+    avecs = estimatereg(t1, t2)
+    assert avecs.dtype == np.float32
+    assert estimatereg(t1, t2, initial_avecs=avecs.astype(np.float64)).dtype == np.float32
+
+def test_estimatereg_bad_initial_avecs():
+    trans = Transform2d()
+    t1 = trans.forward(f1, nlevels=6)
+    t2 = trans.forward(f2, nlevels=6)
+    with raises(ValueError):
+        estimatereg(t1, t2, initial_avecs=np.zeros((4, 4, 5)))
+
+    # There is no refinement step to apply to the initial estimate
+    with raises(ValueError):
+        estimatereg(t1, t2, levels=[[5, 4]], initial_avecs=np.zeros((4, 4, 6)))
+
+@skip_if_no_futures
+def test_register_sequence_warm_start():
+    frames = _sequence()
+    levels = [[4, 3], [3, 2]]
+    expected = list(register_sequence(frames, nlevels=5, levels=levels, warm_start=True, tolerance=2.5e-3))
+    cold = list(register_sequence(frames[:2], nlevels=5, levels=levels))
+    assert np.all(expected[0][1] == cold[0][1])
+
+    results = list(register_sequence(frames, nlevels=5, levels=levels, warm_start=True, tolerance=2.5e-3,
+                                     n_workers=3))
+    assert list(pair for pair, _ in results) == list(pair for pair, _ in expected)
+    for (_, avecs), (_, e) in zip(results, expected):
+        assert np.all(avecs == e)
+
+def test_register_sequence_warm_start_skips_steps(monkeypatch):
+    counts = []
+    def counting_update(*args):
+        counts[-1] += 1
+        return refinement_update(*args)
+    refinement_update = dtcwt.registration._refinement_update
+    monkeypatch.setattr(dtcwt.registration, '_refinement_update', counting_update)
+
+    # The small frames of this smooth sequence give noisier estimates and so
+    # need a larger tolerance than the default levels would otherwise
+    frames = _sequence()
+    for kwargs in (dict(), dict(warm_start=True, tolerance=1e-2)):
+        counts.append(0)
+        list(register_sequence(frames, nlevels=6, **kwargs))
+    assert counts[1] < counts[0]
+
+def _random_qtilde(shape, rank=4):
+    v = np.random.RandomState(0).randn(*(shape + (7, rank)))
+    return np.matmul(v, np.swapaxes(v, -1, -2))[..., QTILDE_ROWS, QTILDE_COLS]
+
+def test_solvetransform():
+    Qtilde_vec = _random_qtilde((8, 9), rank=10)
+    avecs = solvetransform(Qtilde_vec, regularisation=0)
+    assert avecs.shape == (8, 9, 6)
+
+    Q = np.zeros((8, 9, 6, 6))
+    for idx, (r, c) in enumerate(Q_TRIU_INDICES):
+        Q[..., r, c] = Q[..., c, r] = Qtilde_vec[..., idx]
+    assert np.allclose(np.matmul(Q, avecs[..., np.newaxis])[..., 0], -Qtilde_vec[..., -6:])
+
+    # A single vector gives a single solution
+    assert np.allclose(solvetransform(Qtilde_vec[3, 4], regularisation=0), avecs[3, 4])
+
+def test_solvetransform_singular():
+    Qtilde_vec = _random_qtilde((4, 5))
+    Qtilde_vec[0, 0] = 0
+    avecs = solvetransform(Qtilde_vec)
+    assert np.all(np.isfinite(avecs))
+    assert np.all(avecs[0, 0] == 0)
+
+    # Without regularisation there is no solution
+    with raises(np.linalg.LinAlgError):
+        solvetransform(Qtilde_vec, regularisation=0)
+
+def test_solvetransform_negative_regularisation():
+    with raises(ValueError):
+        solvetransform(_random_qtilde((4, 5)), regularisation=-1e-6)
+
+def test_warptransform_matches_warphighpass():
+    trans = Transform2d()
+    t = trans.forward(f1, nlevels=6)
+    avecs = np.random.RandomState(0).randn(8, 10, 6) * 0.01
+    for method in ('nearest', 'bilinear', 'lanczos'):
+        warped = warptransform(t, avecs, [2, 4], method=method)
+        for l in range(6):
+            if l in (2, 4):
+                expected = warphighpass(t.highpasses[l], avecs, method=method)
+                assert np.abs(warped.highpasses[l] - expected).max() < 1e-4 * np.abs(expected).max()
+            else:
+                assert warped.highpasses[l] is t.highpasses[l]
+        assert warped.lowpass is t.lowpass
+
+def _reflect_boxfilter(X, kernel_size):
+    for axis_idx in range(2):
+        out = np.zeros_like(X)
+        for delta in range(-(kernel_size//2), 1+kernel_size//2):
+            idxs = dtcwt.utils.reflect(np.arange(X.shape[axis_idx]) + delta, -0.5, X.shape[axis_idx]-0.5)
+            out += np.take(X, idxs.astype(int), axis=axis_idx)
+        X = out / kernel_size
+    return X
+
+def test_boxfilter():
+    X = np.random.RandomState(0).rand(12, 17, 27)
+    for kernel_size in (1, 3, 7, 31):
+        expected = _reflect_boxfilter(X, kernel_size)
+        assert np.allclose(_boxfilter(X, kernel_size), expected)
+
+        Y = X.copy()
+        assert _boxfilter(Y, kernel_size, out=Y) is Y
+        assert np.allclose(Y, expected)
+
+    with raises(ValueError):
+        _boxfilter(X, 4)
+
+def test_estimatereg_smoothing():
+    trans = Transform2d()
+    t1 = trans.forward(f1, nlevels=6)
+    t2 = trans.forward(f2, nlevels=6)
+    avecs = estimatereg(t1, t2, smoothing=9)
+    assert np.mean(np.abs(warp(f1, avecs, method='bilinear') - f2)) < np.mean(np.abs(f1-f2))
+
+    with raises(ValueError):
+        estimatereg(t1, t2, smoothing=2)
+
+def test_single_precision():
+    trans = Transform2d()
+    t1 = trans.forward(f1.astype(np.float32), nlevels=6)
+    t2 = trans.forward(f2.astype(np.float32), nlevels=6)
+    assert t1.highpasses[2].dtype == np.complex64
+
+    assert qtildematrices(t1, t2, [2])[0].dtype == np.float32
+    assert warptransform(t1, np.zeros((4, 4, 6)), [2], method='bilinear').highpasses[2].dtype == np.complex64
+
+    avecs = estimatereg(t1, t2)
+    assert avecs.dtype == np.float32
+
+    # Single precision registration is as good as double precision
+    expected = estimatereg(trans.forward(f1, nlevels=6), trans.forward(f2, nlevels=6))
+    error = np.mean(np.abs(warp(f1, avecs, method='bilinear') - f2))
+    assert np.abs(error - np.mean(np.abs(warp(f1, expected, method='bilinear') - f2))) < 1e-4
+
+def _assert_tiled_matches_untiled(**kwargs):
+    trans = Transform2d()
+    t1 = RegistrationFeatures(trans.forward(f1, nlevels=6))
+    t2 = RegistrationFeatures(trans.forward(f2, nlevels=6))
+    expected = estimatereg(t1, t2)
+
+    # Tiles give the same result as the untiled registration, with no seams
+    avecs = estimatereg(t1, t2, **kwargs)
+    assert avecs.shape == expected.shape
+    assert np.abs(avecs - expected).max() < 1e-6
+
+def test_estimatereg_tiled():
+    _assert_tiled_matches_untiled(tile_shape=(8, 8))
+
+@skip_if_no_futures
+def test_estimatereg_tiled_thread_pool():
+    _assert_tiled_matches_untiled(tile_shape=(7, 13), n_workers=3)
+
+@skip_if_no_shared_memory
+def test_estimatereg_tiled_process_pool():
+    _assert_tiled_matches_untiled(n_workers=2, pool_type='process')
+
+def test_estimatereg_sparse():
+    # The frames in a noisy, featureless surround four times their area
+    rng = np.random.RandomState(0)
+    h, w = f1.shape
+    frames = []
+    for f in (f1, f2):
+        X = np.mean(f) + 5e-3 * rng.randn(2*h, 2*w)
+        X[:h, :w] = f
+        frames.append(X)
+
+    trans = Transform2d()
+    t1 = RegistrationFeatures(trans.forward(frames[0], nlevels=6))
+    t2 = RegistrationFeatures(trans.forward(frames[1], nlevels=6))
+
+    # A threshold of 0 refines every block
+    expected = estimatereg(t1, t2, tile_shape=(16, 32))
+    assert np.abs(estimatereg(t1, t2, tile_shape=(16, 32), confidence_threshold=0) - expected).max() < 1e-6
+
+    avecs = estimatereg(t1, t2, confidence_threshold=0.05)
+    assert avecs.shape == expected.shape
+    assert np.all(np.isfinite(avecs))
+
+    def error(avecs):
+        warped = warp(frames[0], avecs, method='bilinear')
+        return np.mean(np.abs(warped[:h, :w] - frames[1][:h, :w]))
+
+    assert error(avecs) < 1.05 * error(expected)
+
+def test_estimatereg_sparse_skips_blocks(monkeypatch):
+    # Frames whose upper half is featureless
+    h, w = f1.shape
+    frames = []
+    for f in (f1, f2):
+        X = f.copy()
+        X[:h//2] = np.mean(f)
+        frames.append(X)
+
+    trans = Transform2d()
+    t1 = RegistrationFeatures(trans.forward(frames[0], nlevels=6))
+    t2 = RegistrationFeatures(trans.forward(frames[1], nlevels=6))
+
+    import dtcwt.registration
+    tile_qtilde = dtcwt.registration._tile_qtilde
+    computed = []
+    def counting_tile_qtilde(unwrapped, reference, avecs, smoothing, block_rows, block_cols):
+        computed.append(len(block_rows) * len(block_cols))
+        return tile_qtilde(unwrapped, reference, avecs, smoothing, block_rows, block_cols)
+    monkeypatch.setattr(dtcwt.registration, '_tile_qtilde', counting_tile_qtilde)
+
+    estimatereg(t1, t2, confidence_threshold=0)
+    n_dense = sum(computed)
+
+    del computed[:]
+    avecs = estimatereg(t1, t2, confidence_threshold=0.2)
+    assert np.all(np.isfinite(avecs))
+    assert sum(computed) < 0.7 * n_dense
+
+def test_fill_from_neighbours():
+    X = np.zeros((10, 12, 2))
+    mask = np.zeros((10, 12), dtype=bool)
+    X[2, 3] = (1, 2)
+    X[7, 9] = (3, 6)
+    mask[2, 3] = mask[7, 9] = True
+
+    _fill_from_neighbours(X, mask)
+    assert np.all(X[2, 3] == (1, 2))
+    assert np.all(X[7, 9] == (3, 6))
+    assert np.allclose(X[1, 2], (1, 2))
+    assert np.allclose(X[8, 10], (3, 6))
+    assert np.allclose(X[:, :, 1], 2 * X[:, :, 0])
+    assert np.all(X[:, :, 0] >= 1) and np.all(X[:, :, 0] <= 3)
+
+def test_estimatereg_tiled_bad_arguments():
+    trans = Transform2d()
+    t1 = trans.forward(f1, nlevels=6)
+    t2 = trans.forward(f2, nlevels=6)
+    with raises(ValueError):
+        estimatereg(t1, t2, tile_shape=(0, 8))
+    with raises(ValueError):
+        estimatereg(t1, t2, n_workers=2, pool_type='fibre')
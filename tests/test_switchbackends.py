@@ -35,6 +35,7 @@ class TestSwitchBackends(TestCase):
         assert dtcwt.backend_name == 'numpy'
         dtcwt.push_backend('opencl')
         assert dtcwt.Transform2d is clbackend.Transform2d
+        assert dtcwt.Transform3d is clbackend.Transform3d
         assert dtcwt.Pyramid is clbackend.Pyramid
         assert dtcwt.backend_name == 'opencl'
         dtcwt.pop_backend()
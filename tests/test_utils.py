@@ -1,9 +1,12 @@
 import itertools
 import numpy as np
 from six.moves import xrange
+from pytest import raises
 
 from dtcwt.utils import *
 
+from .util import skip_if_no_futures, skip_if_no_shared_memory
+
 def test_complex_type_for_complex():
     assert np.issubsctype(appropriate_complex_type_for(np.zeros((2,3), np.complex64)), np.complex64)
     assert np.issubsctype(appropriate_complex_type_for(np.zeros((2,3), np.complex128)), np.complex128)
@@ -106,3 +109,53 @@ def test_stacked_2d_matrix_matrix_product():
         max_delta = np.abs(gold - o).max()
         assert max_delta < 1e-8
 
+
+def _fill_rows(start, stop, X):
+    X[start:stop] = np.arange(start, stop)[:,np.newaxis]
+
+def _assert_slice_pool_covers_rows(**kwargs):
+    with SlicePool(**kwargs) as pool:
+        X = pool.zeros((7, 3), np.float32)
+        pool.map_slices(_fill_rows, X.shape[0], X)
+        X = pool.detach(X)
+    assert np.all(X == np.arange(7)[:,np.newaxis])
+
+def test_slice_pool():
+    _assert_slice_pool_covers_rows()
+
+@skip_if_no_futures
+def test_slice_pool_threads():
+    _assert_slice_pool_covers_rows(n_workers=3)
+
+@skip_if_no_shared_memory
+def test_slice_pool_processes():
+    _assert_slice_pool_covers_rows(n_workers=3, pool_type='process')
+
+def _add_rows(start, stop, X, Y):
+    X[start:stop] += Y[start:stop]
+
+@skip_if_no_shared_memory
+def test_slice_pool_process_views():
+    with SlicePool(n_workers=2, pool_type='process') as pool:
+        X = pool.zeros((8, 6), np.float64)
+        pool.map_slices(_fill_rows, 4, X[2:6, ::-2])
+        Y = pool.readonly(np.ones((4, 3)))
+        pool.map_slices(_add_rows, 4, X[2:6, ::-2], Y)
+        assert np.may_share_memory(pool.asshared(X[2:6]), X)
+        X = pool.detach(X)
+
+    expected = np.zeros((8, 6))
+    expected[2:6, 1::2] = np.arange(1, 5)[:,np.newaxis]
+    assert np.all(X == expected)
+
+@skip_if_no_shared_memory
+def test_slice_pool_process_rejects_private_arrays():
+    with SlicePool(n_workers=2, pool_type='process') as pool:
+        with raises(ValueError):
+            pool.map_slices(_fill_rows, 4, np.zeros((4, 3)))
+
+def test_check_pool():
+    check_pool(1, 'thread')
+    check_pool(1, 'process')
+    with raises(ValueError):
+        check_pool(2, 'fibre')
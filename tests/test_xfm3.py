@@ -1,8 +1,12 @@
 import os
 
 import numpy as np
+import pytest
 from dtcwt.compat import dtwavexfm3, dtwaveifm3
 from dtcwt.coeffs import biort, qshift
+from dtcwt.numpy import Transform3d, Pyramid
+
+from .util import skip_if_no_futures, skip_if_no_shared_memory
 
 GRID_SIZE=32
 SPHERE_RAD=0.4 * GRID_SIZE
@@ -167,4 +171,124 @@ def test_level_4_discarding_level_1():
     for a, b in zip(Yh1[1:], Yh2[1:]):
         assert np.abs(a-b).max() < TOLERANCE
 
+def _assert_parallel_matches_serial(pool_type):
+    crop_ellipsoid = ellipsoid[:30,:26,:28]
+    serial = Transform3d()
+    parallel = Transform3d(n_workers=3, pool_type=pool_type)
+
+    Yl1, Yh1 = dtwavexfm3(crop_ellipsoid, 3)
+    t = parallel.forward(crop_ellipsoid, 3)
+
+    assert np.abs(t.lowpass-Yl1).max() < TOLERANCE
+    for a, b in zip(t.highpasses, Yh1):
+        assert np.abs(a-b).max() < TOLERANCE
+
+    recon = parallel.inverse(t)
+    assert np.max(np.abs(crop_ellipsoid - recon)) < TOLERANCE
+
+    t = parallel.forward(crop_ellipsoid, 3, discard_level_1=True)
+    assert np.abs(parallel.inverse(t) - serial.inverse(t)).max() < TOLERANCE
+
+@skip_if_no_futures
+def test_thread_pool():
+    _assert_parallel_matches_serial('thread')
+
+@skip_if_no_shared_memory
+def test_process_pool():
+    _assert_parallel_matches_serial('process')
+
+def test_unsupported_pool(monkeypatch):
+    with pytest.raises(ValueError):
+        Transform3d(n_workers=2, pool_type='fibre')
+
+    import dtcwt.utils
+    monkeypatch.setattr(dtcwt.utils, '_HAVE_SHARED_MEMORY', False)
+    with pytest.raises(RuntimeError):
+        Transform3d(n_workers=2, pool_type='process')
+
+    # Serial transforms and thread pools do not need shared memory
+    Transform3d(pool_type='process')
+    Transform3d(n_workers=2)
+
+def test_batch_matches_single_volumes():
+    crop_ellipsoid = ellipsoid[:30,:26,:28]
+    volumes = np.concatenate([
+        crop_ellipsoid[np.newaxis], 0.5 * crop_ellipsoid[np.newaxis], crop_ellipsoid[np.newaxis]**2
+    ], axis=0)
+
+    trans = Transform3d()
+    t = trans.forward_batch(volumes, 3)
+    assert t.lowpass.shape[0] == volumes.shape[0]
+
+    for idx, volume in enumerate(volumes):
+        Yl, Yh = dtwavexfm3(volume, 3)
+        assert np.abs(t.lowpass[idx]-Yl).max() < TOLERANCE
+        for a, b in zip(t.highpasses, Yh):
+            assert np.abs(a[idx]-b).max() < TOLERANCE
+
+    recon = trans.inverse_batch(t)
+    assert recon.shape == volumes.shape
+    assert np.max(np.abs(volumes - recon)) < TOLERANCE
+
+def test_level_4_discarding_highpasses():
+    # Test that lowpasses are identical to those of the full transform
+    trans = Transform3d()
+    t1 = trans.forward(ellipsoid, 4, include_scale=True, discard_highpasses=True)
+    t2 = trans.forward(ellipsoid, 4, include_scale=True)
+
+    assert np.all(list(x is None for x in t1.highpasses))
+    assert np.abs(t1.lowpass-t2.lowpass).max() < TOLERANCE
+    for a, b in zip(t1.scales, t2.scales):
+        assert np.abs(a-b).max() < TOLERANCE
+
+def test_level_4_recon_discarding_highpasses():
+    # Test that reconstruction is identical to that with zero highpasses
+    trans = Transform3d()
+    t = trans.forward(ellipsoid, 4)
+    zeroed = Pyramid(t.lowpass, tuple(np.zeros_like(x) for x in t.highpasses))
+
+    recon = trans.inverse(trans.forward(ellipsoid, 4, discard_highpasses=True))
+    assert recon.shape == ellipsoid.shape
+    assert np.abs(recon - trans.inverse(zeroed)).max() < TOLERANCE
+
+def test_recon_discarding_extended_levels():
+    # Discarded highpasses do not lose the size of levels which were extended
+    for ext_mode, volume in ((4, ellipsoid[:30,:26,:28]), (8, ellipsoid[:28,:24,:20])):
+        trans = Transform3d(ext_mode=ext_mode)
+        t = trans.forward(volume, 4)
+        assert np.abs(trans.inverse(t) - volume).max() < TOLERANCE
+
+        for kwargs in (dict(discard_level_1=True), dict(discard_highpasses=True)):
+            discarded = trans.forward(volume, 4, **kwargs)
+            zeroed = Pyramid(t.lowpass, tuple(
+                np.zeros_like(x) if y is None else x for x, y in zip(t.highpasses, discarded.highpasses)))
+            recon = trans.inverse(discarded)
+            assert recon.shape == volume.shape
+            assert np.abs(recon - trans.inverse(zeroed)).max() < TOLERANCE
+
+            batch = trans.forward_batch(np.stack((volume, volume)), 4, **kwargs)
+            assert trans.inverse_batch(batch).shape == (2,) + volume.shape
+
+def _assert_roi_matches_full(trans, volume, roi, nlevels):
+    full = trans.forward(volume, nlevels)
+    t = trans.forward_roi(volume, roi, nlevels)
+    lowpass_slices, highpass_slices = trans.roi_coefficient_slices(volume.shape, roi, nlevels)
+
+    assert np.abs(full.lowpass[lowpass_slices] - t.lowpass).max() < TOLERANCE
+    for a, b, slices in zip(full.highpasses, t.highpasses, highpass_slices):
+        assert np.abs(a[slices] - b).max() < TOLERANCE
+
+    recon = trans.inverse_roi(t, volume.shape, roi)
+    assert np.abs(volume[tuple(slice(*r) for r in roi)] - recon).max() < TOLERANCE
+
+def test_roi_ext_mode_4():
+    crop_ellipsoid = ellipsoid[:30,:26,:28]
+    trans = Transform3d(ext_mode=4)
+    _assert_roi_matches_full(trans, crop_ellipsoid, ((10,14), (0,5), (20,28)), 3)
+
+def test_roi_ext_mode_8():
+    crop_ellipsoid = ellipsoid[:28,:24,:32]
+    trans = Transform3d(ext_mode=8)
+    _assert_roi_matches_full(trans, crop_ellipsoid, ((10,14), (0,5), (20,32)), 3)
+
 # vim:sw=4:sts=4:et
@@ -3,6 +3,8 @@ import numpy as np
 import pytest
 
 from dtcwt.opencl.lowlevel import _HAVE_CL as HAVE_CL
+from dtcwt.utils import _HAVE_FUTURES as HAVE_FUTURES
+from dtcwt.utils import _HAVE_SHARED_MEMORY as HAVE_SHARED_MEMORY
 
 from six.moves import xrange
 
@@ -65,4 +67,6 @@ def summarise_cube(M, apron=4):
     )
 
 skip_if_no_cl = pytest.mark.skipif(not HAVE_CL, reason="OpenCL not present")
+skip_if_no_futures = pytest.mark.skipif(not HAVE_FUTURES, reason="concurrent.futures not present")
+skip_if_no_shared_memory = pytest.mark.skipif(not HAVE_SHARED_MEMORY, reason="shared memory requires Python 3.8")
 